@@ -26,6 +26,7 @@ FIT_METHODS = {'Leastsq': 'leastsq', 'Least_squares': 'least_squares',
                'Nelder-Mead': 'nelder', 'SLSQP': 'slsqp'}
 FIT_PARAMS = {'method': 'leastsq', 'fit_negative': False, 'fit_outliers': False,
               'max_ite': 200, 'coef_noise': 1, 'xtol': 1.e-4, 'independent_models': False,
+              'analytic_jac': False, 'varpro': False, 'varpro_refine': True,
               'ncpus': 'auto'}  # 'ncpus' for apps.tkinter
 
 FITSPY_DIR = Path.home() / "Fitspy"
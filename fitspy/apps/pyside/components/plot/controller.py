@@ -19,8 +19,9 @@ class PlotController(QObject):
     baselinePointsChanged = Signal(list)
     PeaksChanged = Signal(object)
     BkgsChanged = Signal(object)
-    progressUpdated = Signal(object, int, int)
+    progressUpdated = Signal(int, int, int)
     colorizeFromFitStatus = Signal(dict)
+    fitFinished = Signal(bool)
     exportCSV = Signal(object)
 
     def __init__(self, spectra_plot, map2d_plot, toolbar):
@@ -84,6 +85,11 @@ class PlotController(QObject):
         self.model.BkgsChanged.connect(self.BkgsChanged)
         self.model.progressUpdated.connect(self.progressUpdated)
         self.model.colorizeFromFitStatus.connect(self.colorizeFromFitStatus)
+        self.model.fitStarted.connect(
+            lambda fnames: self.map2d_plot.start_live_map(self.model.current_map, fnames))
+        self.model.spectrumFitted.connect(self.map2d_plot.add_fitted)
+        self.model.fitFinished.connect(lambda _: self.map2d_plot.stop_live_map())
+        self.model.fitFinished.connect(self.fitFinished)
         self.model.askConfirmation.connect(self.askConfirmation)
 
         self.toolbar.click_mode_combo.currentTextChanged.connect(self.on_click_mode_changed)
@@ -294,5 +300,8 @@ class PlotController(QObject):
         fnames = [spectrum.fname for spectrum in self.model.current_spectra]
         self.model.apply_model(model_dict=model_dict, fnames=fnames, ncpus=ncpus)
 
+    def cancel_fit(self):
+        self.model.cancel_fit()
+
     def save_models(self, fname_json, fnames):
         self.model.save_models(fname_json, fnames)
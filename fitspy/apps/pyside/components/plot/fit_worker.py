@@ -0,0 +1,61 @@
+"""
+Class dedicated to the fit of spectra in a QThread
+"""
+from PySide6.QtCore import QObject, Signal, Slot
+
+
+class FitWorker(QObject):
+    """
+    Class dedicated to the fit of spectra, to be moved in a QThread
+
+    The fit is submitted to the core (see fitspy.core.spectra.Spectra.submit_model()) and the
+    fitted spectra are reported through Qt signals as soon as they are completed, the
+    connected slots being executed in the GUI thread.
+
+    Signals
+    -------
+    progress: (int, int)
+        Number of fitted spectra and total number of spectra
+    spectrumFitted: (str, object)
+        Fname and fit result of a fitted spectrum
+    finished: bool
+        Emitted at the end of the fit, with True if the fit has been cancelled
+    failed: str
+        Emitted if an error occurred during the fit
+    """
+    progress = Signal(int, int)
+    spectrumFitted = Signal(str, object)
+    finished = Signal(bool)
+    failed = Signal(str)
+
+    def __init__(self, spectra, model_dict, fnames, ncpus):
+        super().__init__()
+        self.spectra = spectra
+        self.model_dict = model_dict
+        self.fnames = fnames
+        self.ncpus = ncpus
+        self.handle = None
+        self._cancelled = False
+
+    @Slot()
+    def run(self):
+        """Fit the spectra and report the results"""
+        try:
+            self.handle = self.spectra.submit_model(self.model_dict, fnames=self.fnames,
+                                                    ncpus=self.ncpus)
+            if self._cancelled:
+                self.handle.cancel()
+            for fname, result in self.handle:
+                self.spectrumFitted.emit(fname, result)
+                self.progress.emit(self.handle.ndone, self.handle.ntot)
+        except Exception as error:  # pylint:disable=broad-except
+            self.failed.emit(str(error))
+        finally:
+            # always emitted so that the thread is stopped (even if the submission failed)
+            self.finished.emit(self.handle.cancelled if self.handle is not None else False)
+
+    def cancel(self):
+        """Cancel the spectra not fitted yet (to be called directly from the GUI thread)"""
+        self._cancelled = True
+        if self.handle is not None:
+            self.handle.cancel()
@@ -2,7 +2,7 @@ import numpy as np
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_qtagg import FigureCanvas
 
-from PySide6.QtCore import Qt, Signal
+from PySide6.QtCore import Qt, Signal, QTimer
 from PySide6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QLabel, QHBoxLayout,
                                QPushButton, QTabWidget, QDockWidget)
 
@@ -11,6 +11,10 @@ from superqt import QLabeledDoubleRangeSlider as QRangeSlider
 from fitspy.apps.pyside.components.custom_widgets import ComboBox
 from fitspy.apps.pyside import DEFAULTS
 
+LIVE_REFRESH_INTERVAL = 200  # ms, i.e. 5 Hz maximum for the map redraws during a fit
+PENDING_COLOR = (0.5, 0.5, 0.5, 0.6)  # RGBA color of the pixels not fitted yet
+FAILED_COLOR = (1., 0., 0., 0.6)  # RGBA color of the pixels whose fit failed
+
 
 class CommonTab(QWidget):
     def __init__(self, parent=None):
@@ -103,6 +107,15 @@ class Map2DPlot(QMainWindow):
         self.initUI()
         self.colorbar = None
 
+        # live map updating during a fit
+        self.live_map = None
+        self.live_mask = None  # 0: not concerned or fitted, 1: pending, 2: failed
+        self.live_fitted = []
+        self.mask_img = None
+        self.live_timer = QTimer(self)
+        self.live_timer.setInterval(LIVE_REFRESH_INTERVAL)
+        self.live_timer.timeout.connect(self.refresh_live_map)
+
     def initUI(self):
         self.dock_widget = QDockWidget("Measurement sites (Drag to undock)", self)
         self.dock_widget.setFeatures(
@@ -192,6 +205,89 @@ class Map2DPlot(QMainWindow):
                 current_tab.vrange_slider.setRange(rvmin, rvmax)
                 current_tab.vrange_slider.setValue((rvmin, rvmax))
 
+    # Live Map Functions
+    def start_live_map(self, spectramap, fnames):
+        """Start the live updating of 'spectramap' during the fit of 'fnames'"""
+        self.stop_live_map()
+        if not spectramap:
+            return
+        pids = [spectramap.pixel_id(fname) for fname in fnames]
+        pids = [pid for pid in pids if pid is not None]
+        if not pids:
+            return
+
+        self.live_map = spectramap
+        self.live_mask = np.zeros(spectramap.shape_map[0] * spectramap.shape_map[1], dtype=int)
+        self.live_mask[spectramap.inds_flat[pids]] = 1
+        self.live_fitted = []
+        self.plot_live_mask()
+        self.live_timer.start()
+
+    def add_fitted(self, fname, result):
+        """Register a fitted spectrum, displayed at the next refresh"""
+        if self.live_map is not None:
+            self.live_fitted.append((fname, bool(getattr(result, "success", False))))
+
+    def stop_live_map(self):
+        """Stop the live updating and remove the fitted/pending mask"""
+        self.live_timer.stop()
+        self.live_map = self.live_mask = None
+        self.live_fitted = []
+        if self.mask_img is not None:
+            if self.mask_img in self.ax.images:
+                self.mask_img.remove()
+                self.canvas.draw_idle()
+            self.mask_img = None
+
+    def is_live_map_displayed(self):
+        return self.live_map is not None and self.live_map.img in self.ax.images
+
+    def refresh_live_map(self):
+        """Display the parameters of the spectra fitted since the last refresh"""
+        if not self.live_fitted or not self.is_live_map_displayed():
+            return
+
+        spectramap = self.live_map
+        items, self.live_fitted = self.live_fitted, []
+        fnames = [fname for fname, _ in items]
+        for fname, success in items:
+            pid = spectramap.pixel_id(fname)
+            if pid is not None:
+                self.live_mask[spectramap.inds_flat[pid]] = 0 if success else 2
+
+        var = self.get_current_title()
+        current_tab = self.tab_widget.currentWidget()
+        if "Intensity" not in var and spectramap.arr is not None:
+            if hasattr(current_tab, "combo") and not current_tab.combo.currentText():
+                self.update_labels(spectramap)  # first labels issued from the fit
+            label = current_tab.combo.currentText() if hasattr(current_tab, "combo") else ""
+            inds, values = spectramap.get_param_values(fnames, label, var)
+            spectramap.arr = np.asarray(spectramap.arr, dtype=float)
+            spectramap.arr.flat[inds] = values
+            spectramap.img.set_data(spectramap.arr)
+            if not np.all(np.isnan(spectramap.arr)):
+                spectramap.img.set_clim(np.nanmin(spectramap.arr), np.nanmax(spectramap.arr))
+                self.update_vrange_slider(spectramap, current_tab)
+            if self.colorbar:
+                self.colorbar.update_normal(spectramap.img)
+
+        self.plot_live_mask()
+
+    def plot_live_mask(self):
+        """Plot the pending and failed pixels mask over the map"""
+        if not self.is_live_map_displayed():
+            return
+        rgba = np.zeros((self.live_mask.size, 4))
+        rgba[self.live_mask == 1] = PENDING_COLOR
+        rgba[self.live_mask == 2] = FAILED_COLOR
+        rgba = rgba.reshape(tuple(self.live_map.shape_map) + (4,))
+        if self.mask_img is None or self.mask_img not in self.ax.images:
+            self.mask_img = self.ax.imshow(rgba, extent=self.live_map.img.get_extent(),
+                                           origin='lower', interpolation='nearest', zorder=3)
+        else:
+            self.mask_img.set_data(rgba)
+        self.canvas.draw_idle()
+
     # Colorbar Functions
     def add_colorbar(self):
         if not self.colorbar and self.ax.images:
@@ -212,8 +308,7 @@ class Map2DPlot(QMainWindow):
 
     # Utility Functions
     def collect_unique_labels(self, spectramap):
-        return sorted(list(set([label for spectrum in spectramap
-                                for label in spectrum.peak_labels])))
+        return spectramap.get_peak_labels()
 
     def update_labels(self, spectramap):
         labels = self.collect_unique_labels(spectramap)
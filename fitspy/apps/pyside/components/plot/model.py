@@ -1,21 +1,21 @@
 import os
-from threading import Thread
 from collections import defaultdict
 from pathlib import Path
 import numpy as np
 import matplotlib
 
-from PySide6.QtCore import QObject, Signal
+from PySide6.QtCore import QObject, Signal, QThread, QCoreApplication, QEventLoop
 from PySide6.QtWidgets import QMessageBox
 
 # import fitspy
 from fitspy.core.spectra import Spectra
-from fitspy.core.spectrum import Spectrum, empty_expr
+from fitspy.core.spectrum import empty_expr
 from fitspy.core.spectra_map import SpectraMap
 from fitspy.core.utils import closest_index, closest_item
 from fitspy.core.baseline_methods import get_baseline_method_meta
 from fitspy.apps.interactive_bounds_pg import InteractiveBounds
 from fitspy.apps.pyside import DEFAULTS
+from fitspy.apps.pyside.components.plot.fit_worker import FitWorker
 
 CMAP = matplotlib.colormaps['tab10']
 LABEL_OFFSET_RATIO = 0.005  # Ratio to offset label above the peak
@@ -33,8 +33,11 @@ class Model(QObject):
     askConfirmation = Signal(str, object, tuple, dict)
     PeaksChanged = Signal(object)
     BkgsChanged = Signal(object)
-    progressUpdated = Signal(object, int, int)
+    progressUpdated = Signal(int, int, int)
     colorizeFromFitStatus = Signal(dict)
+    fitStarted = Signal(list)
+    spectrumFitted = Signal(str, object)
+    fitFinished = Signal(bool)
     showToast = Signal(str, str, str)
 
     def __init__(self):
@@ -53,6 +56,9 @@ class Model(QObject):
         self.peak_label_items = []  # scene items of the peak-label annotations
         self._ax = None  # last axes used, for live (drag-time) label refresh
         self._view_options = {}  # last view options, for live label refresh
+        self.fit_thread = None
+        self.fit_worker = None
+        self.fit_ncpus = 1
 
     def set_spectrum_attr(self, fname, attr, value):
         # .json model's "dummy spectrum" is not stored in self.spectra
@@ -72,6 +78,8 @@ class Model(QObject):
 
     def load_spectra(self, models):
         """ Load spectra from 'models' related to a .json file """
+        if self.is_locked("reload the spectra"):
+            return
         self._spectra = Spectra.load(dict_spectra=models, preprocess=True)
 
         for spectrum in self.spectra:
@@ -79,20 +87,18 @@ class Model(QObject):
 
         for spectra_map in self.spectra.spectra_maps:
             fname = spectra_map.fname
-            fnames = [spectrum.fname for spectrum in spectra_map]
+            fnames = spectra_map.fnames
             self.decodedSpectraMap.emit(fname, fnames)
 
     def load_spectrum(self, fnames):
         """Load the given list of file names as spectra"""
+        fnames = [os.path.normpath(fname) for fname in fnames]
+        failures = self.spectra.load_profiles(fnames)
         for fname in fnames:
-            fname = os.path.normpath(fname)
-            try:
-                spectrum = Spectrum()
-                spectrum.load_profile(fname)
-                self.spectra.append(spectrum)
-                self.spectrumLoaded.emit(fname)
-            except Exception:
+            if fname in failures:
                 self.showToast.emit("ERROR", "Failed to load spectrum", fname)
+            else:
+                self.spectrumLoaded.emit(fname)
 
     def del_spectrum(self, items):
         """
@@ -104,6 +110,8 @@ class Model(QObject):
             Dictionary where keys can be None or a spectramap fname,
             and values are always a list of fname.
         """
+        if self.is_locked("delete spectra"):
+            return
         deleted_spectra = defaultdict(list)
 
         for _, fnames in items.items():
@@ -125,13 +133,15 @@ class Model(QObject):
             spectra_map = SpectraMap.load_map(fname)
             self.spectra.spectra_maps.append(spectra_map)
 
-            fnames = [spectrum.fname for spectrum in spectra_map]
+            fnames = spectra_map.fnames
             self.decodedSpectraMap.emit(fname, fnames)
         except Exception:
             QMessageBox.warning(None, "Warning", f"FAILED to load: {Path(fname).name}")
 
     def del_map(self, fname):
         """Remove the spectramap with the given file name"""
+        if self.is_locked("delete a map"):
+            return
         for spectramap in self.spectra.spectra_maps:
             if spectramap.fname == fname:
                 self.spectra.spectra_maps.remove(spectramap)
@@ -139,6 +149,8 @@ class Model(QObject):
                 break
 
     def reinit_spectra(self, fnames):
+        if self.is_locked("reinitialize spectra"):
+            return
         fit_status_dict = {}
         for fname in fnames:
             spectrum = self.spectra.get_objects(fname)[0]
@@ -503,30 +515,72 @@ class Model(QObject):
         self._ax.draw_idle()
 
     def apply_model(self, model_dict=None, fnames=None, ncpus=None):
-        """Apply model to the selected spectra"""
+        """Apply model to the selected spectra in a QThread (see FitWorker)"""
         if model_dict is None:
-            self.showToast("error", "No model has been loaded", "")
+            self.showToast.emit("ERROR", "No model has been loaded", "")
+            return
+        if self.is_fitting():
+            self.showToast.emit("WARNING", "A fit is already running", "")
             return
 
         nfiles = len(fnames)
-        fit_status = {fname: None for fname in fnames}
-        for fname in fnames:
-            spectrum, _ = self.spectra.get_objects(fname)
-            # spectrum.set_attributes(model_dict)
-            fit_status[fname] = spectrum
-        self.spectra.pbar_index = 0
-        show_progressbar = False
-
-        args = (model_dict, fnames, ncpus, show_progressbar)
-        thread = Thread(target=self.spectra.apply_model, args=args)
-        thread.start()
-        self.progressUpdated.emit(self.spectra, nfiles, ncpus)
-        thread.join()
-
-        fit_status = {fname: spectrum.result_fit for fname, spectrum in fit_status.items()}
-        self.colorizeFromFitStatus.emit(fit_status)
-        self.PeaksChanged.emit(self.current_spectra[0])
+        self.fit_thread = QThread()
+        self.fit_worker = FitWorker(self.spectra, model_dict, fnames, ncpus or 1)
+        self.fit_worker.moveToThread(self.fit_thread)
+        self.fit_thread.started.connect(self.fit_worker.run)
+        self.fit_worker.progress.connect(self.on_fit_progress)
+        self.fit_worker.spectrumFitted.connect(self.on_spectrum_fitted)
+        self.fit_worker.failed.connect(self.on_fit_failed)
+        self.fit_worker.finished.connect(self.on_fit_finished)
+        self.fit_worker.finished.connect(self.fit_thread.quit)
+        self.fit_thread.finished.connect(self.on_fit_thread_finished)
+
+        self.fit_ncpus = ncpus or 1
+        self.progressUpdated.emit(0, nfiles, self.fit_ncpus)
+        self.fitStarted.emit(list(fnames))
+        self.fit_thread.start()
+
+    def on_fit_progress(self, ndone, ntot):
+        self.progressUpdated.emit(ndone, ntot, self.fit_ncpus)
+
+    def on_spectrum_fitted(self, fname, result):
+        self.colorizeFromFitStatus.emit({fname: result})
+        self.spectrumFitted.emit(fname, result)
+
+    def on_fit_failed(self, msg):
+        self.showToast.emit("ERROR", "Fit failed", msg)
+
+    def on_fit_finished(self, cancelled):
+        """Update the views once the fit is over"""
+        if self.current_spectra:
+            self.PeaksChanged.emit(self.current_spectra[0])
         self.refreshPlot.emit()
+        self.fitFinished.emit(cancelled)
+
+    def on_fit_thread_finished(self):
+        # references kept up to the thread end
+        self.fit_thread = self.fit_worker = None
+
+    def is_fitting(self):
+        """Return True if a fit is running"""
+        return self.fit_thread is not None
+
+    def is_locked(self, action):
+        """Return True (with a warning) if 'action' is rejected because a fit is running"""
+        if self.is_fitting():
+            self.showToast.emit("WARNING", f"Unable to {action} while a fit is running", "")
+            return True
+        return False
+
+    def cancel_fit(self):
+        """Cancel the spectra not fitted yet"""
+        if self.fit_worker is not None:
+            self.fit_worker.cancel()
+
+    def wait_fit(self):
+        """Wait for the end of the running fit while processing the Qt events"""
+        while self.is_fitting():
+            QCoreApplication.processEvents(QEventLoop.AllEvents, 50)
 
     def save_models(self, fname_json, fnames=None):
         self.spectra.save(fname_json, fnames=fnames)
@@ -1,6 +1,7 @@
 import os
 from PySide6.QtCore import QSize
-from PySide6.QtWidgets import QVBoxLayout, QHBoxLayout, QLabel, QProgressBar, QWidget
+from PySide6.QtWidgets import (QVBoxLayout, QHBoxLayout, QLabel, QProgressBar, QPushButton,
+                               QWidget)
 from fitspy.apps.pyside.components.custom_widgets import ComboBox
 
 class StatusBox(QWidget):
@@ -57,4 +58,9 @@ class StatusBox(QWidget):
         self.progressBar.setMaximumSize(QSize(16777215, 20))
         rightAlignedLayout.addWidget(self.progressBar, 10)
 
+        self.cancelButton = QPushButton("Cancel", hbox2)
+        self.cancelButton.setToolTip("Cancel the spectra not fitted yet")
+        self.cancelButton.setEnabled(False)
+        rightAlignedLayout.addWidget(self.cancelButton)
+
         vbox.addWidget(hbox2)
@@ -44,6 +44,7 @@ class Appli:
         self.controller.files_controller.set_selection(self.view.spectrum_list.list, fnames)
         self.view.fit_model_editor.model_selector.set.click()
         self.view.fit_model_editor.model_settings.fit.click()
+        self.controller.plot_controller.model.wait_fit()  # fit running in a QThread
 
     def apply_model_to_all(self, ncpus=None):
         """Apply the model to all the spectra considering 'ncpu' as the number of threads
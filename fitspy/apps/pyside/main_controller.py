@@ -100,6 +100,8 @@ class MainController(QObject):
         self.plot_controller.PeaksChanged.connect(self.settings_controller.update_peaks_table)
         self.plot_controller.BkgsChanged.connect(self.settings_controller.update_bkgs_table)
         self.plot_controller.progressUpdated.connect(self.update_progress)
+        self.plot_controller.fitFinished.connect(self.on_fit_finished)
+        self.view.statusBox.cancelButton.clicked.connect(self.plot_controller.cancel_fit)
         self.plot_controller.colorizeFromFitStatus.connect(
             self.files_controller.colorize_from_fit_status)
         self.plot_controller.exportCSV.connect(self.export_to_csv)
@@ -344,6 +346,12 @@ class MainController(QObject):
         nfiles = len(self.files_controller.get_selected_fnames())
         ncpus = self.get_ncpus(nfiles=nfiles)
         self.plot_controller.fit(model_dict, ncpus)
+
+    def on_fit_finished(self, cancelled):
+        """ Refresh the views once the fit (running in a QThread) is over """
+        self.view.statusBox.cancelButton.setEnabled(False)
+        if cancelled:
+            self.show_toast("WARNING", "Fit cancelled", "")
         self.update_fit_stats()
         self.update_measurement_sites()
 
@@ -353,20 +361,15 @@ class MainController(QObject):
         if current_map:
             self.view.measurement_sites.onTabWidgetCurrentChanged(current_map)
 
-    def update_progress(self, spectra, nfiles, ncpu=None):
+    def update_progress(self, ndone, nfiles, ncpu=None):
         if ncpu:
             max_cpus = os.cpu_count()
             self.view.statusBox.cpuCountLabel.setText(
                 f"CPUs: {ncpu}/{max_cpus}"
             )
-        percent = 0
-        while percent < 100:
-            percent = 100 * spectra.pbar_index / nfiles
-            self.view.statusBox.progressLabel.setText(
-                f"{spectra.pbar_index}/{nfiles}"
-            )
-            self.view.statusBox.progressBar.setValue(percent)
-            QApplication.processEvents()
+        self.view.statusBox.cancelButton.setEnabled(ndone < nfiles)
+        self.view.statusBox.progressLabel.setText(f"{ndone}/{nfiles}")
+        self.view.statusBox.progressBar.setValue(int(100 * ndone / max(nfiles, 1)))
 
     def export_to_csv(self, spectramap):
         from pathlib import Path
@@ -425,7 +428,7 @@ class MainController(QObject):
         )
         if directory:
             self.plot_controller.model.spectra.save_figures(
-                directory, selected_items
+                directory, selected_items, ncpus=self.get_ncpus(len(selected_items))
             )
             # self.show_toast("SUCCESS", "Saved", f"Figures saved into {directory}")
 
@@ -3,6 +3,7 @@ from PySide6.QtCore import QSize, Qt
 from PySide6.QtWidgets import (QMainWindow, QFrame, QGridLayout, QHBoxLayout, QSplitter, QTabWidget,
                                QVBoxLayout, QWidget, QMessageBox)
 
+from fitspy.core.utils_mp import shutdown_pool
 from fitspy.apps.pyside.components import MenuBar, About
 from fitspy.apps.pyside.components.plot import SpectraPlot, Map2DPlot, Toolbar
 from fitspy.apps.pyside.components.settings import StatusBox, ModelBuilder, MoreSettings
@@ -144,6 +145,7 @@ class MainView(QMainWindow):
                                      QMessageBox.Yes)
 
         if reply == QMessageBox.Yes:
+            shutdown_pool()
             event.accept()
         else:
             event.ignore()
@@ -13,7 +13,6 @@ from copy import deepcopy
 import numpy as np
 
 from fitspy.core.spectra import Spectra
-from fitspy.core.spectrum import Spectrum
 from fitspy.core.spectra_map import SpectraMap
 from fitspy.core.utils import get_dim, closest_index, check_or_rename, auto_ncpus
 from fitspy.core.utils import load_models_from_txt, load_models_from_py
@@ -912,37 +911,36 @@ class Callbacks:
                     self.fileselector.add_items(filenames=[fname])
 
         # create Spectrum or SpectramMap objects associated to the new items
-        fname_first_item = None
-        fnames = self.spectra.fnames
+        # (the 1D profiles being loaded by blocks, concurrently)
+        fnames_1d = []
+        fnames = set(self.spectra.fnames)
         for fname in self.fileselector.filenames:
             if fname not in fnames:
 
                 dim = get_dim(fname)
 
                 if dim is None:
+                    self.load_profiles(fnames_1d)
                     msg = "The file {} can not be interpreted by fitspy"
                     showerror(message=msg.format(Path(fname).name))
                     return
 
                 elif dim == 2:
+                    self.load_profiles(fnames_1d)
                     self.create_map(fname)
                     return
 
                 else:  # dim == 1
-                    try:
-                        spectrum = Spectrum()
-                        spectrum.fname = fname
+                    fnames_1d.append(fname)
 
-                        spectrum.preprocess()
-                        self.spectra.append(spectrum)
+        fnames_1d = self.load_profiles(fnames_1d)
+        if len(fnames_1d) > 0:
+            self.update(fname=fnames_1d[0])
 
-                        if fname_first_item is None:
-                            fname_first_item = fname
-                    except:
-                        pass
-
-        if fname_first_item is not None:
-            self.update(fname=fname_first_item)
+    def load_profiles(self, fnames):
+        """ Load and preprocess the 'fnames' 1D profiles and return the loaded fnames """
+        failures = self.spectra.load_profiles(fnames, preprocess=True)
+        return [fname for fname in fnames if fname not in failures]
 
     def update_markers(self, fname):
         """  Markers management in 2D-maps """
@@ -1020,7 +1018,7 @@ class Callbacks:
         self.fileselector.filenames.pop(ind)
 
         # add each spectra related to the 2D-map
-        fnames = [spectrum.fname for spectrum in spectra_map]
+        fnames = spectra_map.fnames
         self.add_items(fnames=fnames)
 
         # force cursor location at the first item
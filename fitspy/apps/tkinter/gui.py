@@ -26,6 +26,7 @@ except:
 
 from fitspy import PEAK_MODELS, BKG_MODELS, PEAK_PARAMS, SETTINGS_FNAME
 from fitspy.core.utils import closest_index, save_to_json, load_from_json
+from fitspy.core.utils_mp import shutdown_pool
 
 from fitspy.apps.tkinter.utils import add, interactive_entry as entry
 from fitspy.apps.tkinter.utils import ToggleFrame, FilesSelector, ProgressBar
@@ -365,8 +366,7 @@ class GUI(Callbacks):
         setattr(spectra_map, 'vmax', DoubleVar(value=vmax))
 
         def update_labels():
-            labels = sorted(list(set([label for spectrum in spectra_map
-                                      for label in spectrum.peak_labels])))
+            labels = spectra_map.get_peak_labels()
             cbox1['values'] = labels
             if len(labels) > 0:
                 spectra_map.label.set(labels[0])
@@ -547,6 +547,7 @@ class Appli(GUI):
     def on_closing(self):
         """ To quit 'properly' the application """
         if messagebox.askokcancel("Quit", "Would you like to quit ?"):
+            shutdown_pool()
             self.root.destroy()
 
 
@@ -14,6 +14,7 @@ from lmfit.model import ModelResult
 from fitspy.apps.tkinter.utils import add, add_entry
 from fitspy.apps.tkinter import CMAP, NCPUS
 from fitspy import PEAK_MODELS, BKG_MODELS, PEAK_PARAMS, FIT_METHODS, FIT_PARAMS
+from fitspy.core.fit_results import CompactResult
 
 
 class ResultView:
@@ -295,7 +296,7 @@ class StatsView(ResultView):
         """ Update the statistics """
         self.text.delete(1.0, END)
         if self.spectrum is not None:
-            if isinstance(self.spectrum.result_fit, ModelResult):
+            if isinstance(self.spectrum.result_fit, (ModelResult, CompactResult)):
                 self.text.insert(END, fit_report(self.spectrum.result_fit))
                 self.text.pack()
 
@@ -0,0 +1,377 @@
+"""
+Batched Levenberg-Marquardt engine dedicated to spectra sharing the same support and model
+
+notes:
+The spectra are stacked in a (N, n) array and damped Gauss-Newton iterations are performed for
+all of them at once, with a damping factor and a convergence status per spectrum. Converged
+spectra are dropped from the active set, as well as the spectra whose damping factor blows up
+(no descent step found) that are reported as failed. Bounds are handled with the same variables
+transformation as in lmfit and the models are evaluated with their analytic jacobian
+(see fitspy.core.jacobian).
+The batched engine being a Levenberg-Marquardt solver fitting the composite model as a whole,
+it only stands for the 'leastsq' fit method without 'independent_models'.
+"""
+import numpy as np
+from lmfit import Parameters
+from lmfit.model import ModelResult
+from lmfit.models import ExponentialModel
+
+from fitspy.core.jacobian import get_model_jacobian
+
+MAX_CHUNK_SIZE = 2e7  # maximum number of values in the (N, n, nparams) jacobian array
+MAX_DAMPING = 1e12  # damping factor beyond which no descent step can be found anymore
+
+# fit status codes and related messages
+MAX_NFEV, CONVERGED, STALLED = 0, 1, 2
+MESSAGES = {MAX_NFEV: 'Fit aborted (max_nfev reached).',
+            CONVERGED: 'Fit succeeded.',
+            STALLED: 'Fit aborted (damping factor blow-up, no descent step found).'}
+
+
+def exponential(x, amplitude=1, decay=1):
+    """ Vectorized version of lmfit.lineshapes.exponential """
+    return amplitude * np.exp(-x / decay)
+
+
+BKG_FUNCTIONS = {ExponentialModel: exponential}
+
+
+def to_internal(values, vmin, vmax):
+    """ Return the unbounded 'internal' values (same transformation as in lmfit) """
+    has_min, has_max = np.isfinite(vmin), np.isfinite(vmax)
+    both, only_min, only_max = has_min & has_max, has_min & ~has_max, ~has_min & has_max
+    internal = values.copy()
+    with np.errstate(all='ignore'):
+        internal[both] = np.arcsin(np.clip(2 * (values[both] - vmin[both]) /
+                                           (vmax[both] - vmin[both]) - 1, -1, 1))
+        internal[only_min] = np.sqrt((values[only_min] - vmin[only_min] + 1) ** 2 - 1)
+        internal[only_max] = np.sqrt((vmax[only_max] - values[only_max] + 1) ** 2 - 1)
+    return internal
+
+
+def from_internal(internal, vmin, vmax):
+    """ Return the bounded values and their derivatives wrt the 'internal' values """
+    has_min, has_max = np.isfinite(vmin), np.isfinite(vmax)
+    both, only_min, only_max = has_min & has_max, has_min & ~has_max, ~has_min & has_max
+    values, scale = internal.copy(), np.ones_like(internal)
+    u = internal[both]
+    values[both] = vmin[both] + (np.sin(u) + 1) * (vmax[both] - vmin[both]) / 2
+    scale[both] = np.cos(u) * (vmax[both] - vmin[both]) / 2
+    u = internal[only_min]
+    values[only_min] = vmin[only_min] - 1 + np.sqrt(u ** 2 + 1)
+    scale[only_min] = u / np.sqrt(u ** 2 + 1)
+    u = internal[only_max]
+    values[only_max] = vmax[only_max] + 1 - np.sqrt(u ** 2 + 1)
+    scale[only_max] = -u / np.sqrt(u ** 2 + 1)
+    return values, scale
+
+
+def check_fit_params(fit_params):
+    """ Raise a ValueError if the 'fit_params' can not be handled by the batched solver """
+    method = fit_params.get('method', 'leastsq')
+    if method != 'leastsq':
+        msg = f"fit method '{method}' not handled by the 'batch' solver (only 'leastsq')"
+        raise ValueError(msg)
+    if fit_params.get('independent_models', False):
+        raise ValueError("'independent_models' not handled by the 'batch' solver")
+
+
+class BatchFit:
+    """
+    Class dedicated to the batched fit of spectra sharing the same support and model
+
+    Attributes
+    ----------
+    fit_plan: FitPlan object
+        Plan providing the composite model and the parameters layout
+    param_names: list of str
+        Parameters names of the composite model
+    components: list of tuple
+        Model, function, jacobian function, parameters basenames and related parameters
+        indices for each component of the composite model
+    xtol: float
+        Relative error desired in the solution
+    ftol: float
+        Relative error desired in the sum of squares
+    max_ite: int
+        Maximum number of iterations per spectrum
+
+    Parameters
+    ----------
+    fit_plan: FitPlan object
+        Plan providing the composite model and the parameters layout
+    xtol: float, optional
+        Relative error desired in the solution.
+        If None, consider the 'xtol' value of the plan fit parameters
+    ftol: float, optional
+        Relative error desired in the sum of squares. Default value is 1.5e-8
+    max_ite: int, optional
+        Maximum number of iterations per spectrum.
+        If None, consider the 'max_ite' value of the plan fit parameters
+    """
+
+    def __init__(self, fit_plan, xtol=None, ftol=1.5e-8, max_ite=None):
+        fit_params = fit_plan.model_dict.get('fit_params', {})
+        check_fit_params(fit_params)
+        self.fit_plan = fit_plan
+        self.param_names = fit_plan.param_names
+        self.xtol = xtol or fit_params.get('xtol', 1.e-4)
+        self.ftol = ftol
+        self.max_ite = max_ite or fit_params.get('max_ite', 200)
+
+        self.components = []
+        if fit_plan.comp_model is not None:
+            for model in fit_plan.comp_model.components:
+                func = BKG_FUNCTIONS.get(type(model), model.func)
+                basenames = [name[len(model.prefix):] for name in model.param_names]
+                inds = [self.param_names.index(name) for name in model.param_names]
+                self.components.append((model, func, get_model_jacobian(model), basenames, inds))
+
+    def is_supported(self):
+        """ Return True if all the components have an analytic jacobian and no expression """
+        if len(self.components) == 0:
+            return False
+        if any(jac_func is None for _, _, jac_func, _, _ in self.components):
+            return False
+        for model in self.fit_plan.peak_models + self.fit_plan.bkg_models:
+            for hint in model.param_hints.values():
+                if hint.get('expr'):
+                    return False
+        return True
+
+    def eval(self, x, values):
+        """ Return the composite model evaluated over 'x' for the (N, nparams) 'values' """
+        y = np.zeros((values.shape[0], len(x)))
+        for _, func, _, basenames, inds in self.components:
+            kwargs = {name: values[:, [ind]] for name, ind in zip(basenames, inds)}
+            y += func(x[np.newaxis, :], **kwargs)
+        return y
+
+    def jacobian(self, x, values):
+        """ Return the (N, n, nparams) jacobian of the composite model """
+        jac = np.zeros((values.shape[0], len(x), values.shape[1]))
+        for _, _, jac_func, basenames, inds in self.components:
+            kwargs = {name: values[:, [ind]] for name, ind in zip(basenames, inds)}
+            derivs = jac_func(x[np.newaxis, :], **kwargs)
+            for name, ind in zip(basenames, inds):
+                jac[:, :, ind] = derivs[name]
+        return jac
+
+    def fit(self, spectra, queue_incr=None):
+        """
+        Fit the (preprocessed) 'spectra' in a batched way
+
+        Parameters
+        ----------
+        spectra: list of Spectrum objects
+            Spectra to fit, with models set from the 'fit_plan'
+        queue_incr: multiprocessing.Queue, optional
+            Queue used to increment the progress bar
+
+        Returns
+        -------
+        spectra_left: list of Spectrum objects
+            Spectra that can not be handled by the batched solver (different support or model
+            layout) and that have to be fitted with the standard (lmfit) approach
+        """
+        if not self.is_supported():
+            return list(spectra)
+
+        spectra_left = []
+        groups = {}
+        for spectrum in spectra:
+            if not self.fit_plan.is_compatible(spectrum):
+                spectra_left.append(spectrum)
+                continue
+            key = (len(spectrum.x), spectrum.x[0], spectrum.x[-1])
+            groups.setdefault(key, []).append(spectrum)
+
+        nparams = max(1, len(self.param_names))
+        for group in groups.values():
+            x = group[0].x
+            batch = []
+            for spectrum in group:
+                if np.array_equal(spectrum.x, x):
+                    batch.append(spectrum)
+                else:
+                    spectra_left.append(spectrum)
+            chunk_size = max(1, int(MAX_CHUNK_SIZE / (len(x) * nparams)))
+            for i in range(0, len(batch), chunk_size):
+                chunk = batch[i:i + chunk_size]
+                self.fit_chunk(x, chunk)
+                if queue_incr is not None:
+                    queue_incr.put(len(chunk))
+
+        return spectra_left
+
+    def fit_chunk(self, x, spectra):
+        """ Fit 'spectra' sharing the same support 'x' """
+        nspectra, nparams = len(spectra), len(self.param_names)
+
+        values = np.zeros((nspectra, nparams))
+        vmin = np.full((nspectra, nparams), -np.inf)
+        vmax = np.full((nspectra, nparams), np.inf)
+        vary = np.zeros((nspectra, nparams), dtype=bool)
+        y = np.zeros((nspectra, len(x)))
+        weights = np.zeros((nspectra, len(x)))
+        masks, varys_init = [], []
+
+        for k, spectrum in enumerate(spectra):
+            mask, vary_init = spectrum.prepare_fit()
+            masks.append(mask)
+            varys_init.append(vary_init)
+            y[k] = spectrum.y
+            weights[k] = mask if spectrum.weights is None else mask * spectrum.weights
+            for model in spectrum.peak_models + spectrum.bkg_models:
+                for basename, hint in model.param_hints.items():
+                    name = f"{model.prefix}{basename}"
+                    if name in self.param_names:
+                        ind = self.param_names.index(name)
+                        values[k, ind] = hint.get('value', 0)
+                        vmin[k, ind] = hint.get('min', -np.inf)
+                        vmax[k, ind] = hint.get('max', np.inf)
+                        vary[k, ind] = hint.get('vary', True) and not hint.get('expr')
+
+        values = np.clip(values, vmin, vmax)
+        internal = to_internal(values, vmin, vmax)
+        values, scale = from_internal(internal, vmin, vmax)
+        init_values = values.copy()
+
+        nvarys = vary.sum(axis=1)
+        max_nfev = max(2, self.max_ite) * nparams
+        nfev = np.ones(nspectra, dtype=int)
+        lambdas = np.full(nspectra, 1.)
+        nus = np.full(nspectra, 2.)
+        status = np.full(nspectra, MAX_NFEV)
+        residual = (self.eval(x, values) - y) * weights
+        cost = np.sum(residual ** 2, axis=1)
+
+        inds = np.arange(nparams)
+        active = np.where(nvarys > 0)[0]
+        status[nvarys == 0] = CONVERGED
+        while len(active) > 0:
+            fixed = ~vary[active]
+            res, w = residual[active], weights[active]
+            lbounds, ubounds = vmin[active], vmax[active]
+
+            # jacobian wrt the internal variables (fixed parameters are discarded)
+            jac = self.jacobian(x, values[active]) * w[:, :, np.newaxis]
+            jac *= np.where(fixed, 0., scale[active])[:, np.newaxis, :]
+            jtj = np.einsum('anp,anq->apq', jac, jac)
+            grad = np.einsum('anp,an->ap', jac, res)
+
+            # damped normal equations (Marquardt scaling)
+            diag = np.maximum(jtj[:, inds, inds], 1e-12)
+            diag[fixed] = 1.
+            jtj[:, inds, inds] += lambdas[active, np.newaxis] * diag
+            try:
+                delta = -np.linalg.solve(jtj, grad[:, :, np.newaxis])[:, :, 0]
+            except np.linalg.LinAlgError:
+                delta = -(np.linalg.pinv(jtj) @ grad[:, :, np.newaxis])[:, :, 0]
+
+            internal_new = internal[active] + delta
+            values_new, scale_new = from_internal(internal_new, lbounds, ubounds)
+            res_new = (self.eval(x, values_new) - y[active]) * w
+            cost_new = np.sum(res_new ** 2, axis=1)
+            nfev[active] += 1
+
+            # gain ratio between the actual and the predicted cost reductions
+            predicted = np.einsum('ap,ap->a', delta, lambdas[active, np.newaxis] * diag * delta - grad)
+            with np.errstate(all='ignore'):
+                rho = (cost[active] - cost_new) / predicted
+            accepted = np.isfinite(cost_new) & (cost_new <= cost[active])
+            dnorm = np.sqrt(diag)
+            xconv = np.linalg.norm(dnorm * delta, axis=1) <= \
+                self.xtol * np.linalg.norm(dnorm * internal[active], axis=1)
+            fconv = accepted & (cost[active] - cost_new <= self.ftol * cost[active]) & \
+                (predicted <= self.ftol * cost[active])
+
+            inds_acc = active[accepted]
+            internal[inds_acc] = internal_new[accepted]
+            values[inds_acc] = values_new[accepted]
+            scale[inds_acc] = scale_new[accepted]
+            residual[inds_acc] = res_new[accepted]
+            cost[inds_acc] = cost_new[accepted]
+            # damping update (Nielsen strategy)
+            coefs = np.maximum(1 / 3., 1 - (2 * np.nan_to_num(rho[accepted]) - 1) ** 3)
+            lambdas[inds_acc] = np.maximum(lambdas[inds_acc] * coefs, 1e-12)
+            nus[inds_acc] = 2.
+            inds_rej = active[~accepted]
+            lambdas[inds_rej] *= nus[inds_rej]
+            nus[inds_rej] *= 2.
+
+            # (small steps due to a strong damping are not considered as converged)
+            xconv &= lambdas[active] < 1.
+            converged = accepted & (xconv | fconv)
+            stalled = ~converged & (lambdas[active] > MAX_DAMPING)
+            status[active[converged]] = CONVERGED
+            status[active[stalled]] = STALLED
+            active = active[~converged & ~stalled & (nfev[active] < max_nfev)]
+
+        jac = self.jacobian(x, values) * weights[:, :, np.newaxis]
+        for k, spectrum in enumerate(spectra):
+            self.set_result(spectrum, k, x, values, init_values, vary, jac[k], residual[k],
+                            masks[k], nfev[k], status[k])
+            spectrum.restore_vary(varys_init[k])
+
+    def set_result(self, spectrum, k, x, values, init_values, vary, jac, residual, mask, nfev,
+                   status):
+        """ Reassign the fitted values to the 'spectrum' models and create its 'result_fit' """
+        for model in spectrum.peak_models + spectrum.bkg_models:
+            for name in model.param_names:
+                if name in self.param_names:
+                    model.set_param_hint(name[len(model.prefix):],
+                                         value=float(values[k, self.param_names.index(name)]))
+
+        ndata = int(mask.sum())
+        var_inds = np.where(vary[k])[0]
+        nvarys = len(var_inds)
+        chisqr = float(np.sum(residual ** 2))
+        nfree = max(1, ndata - nvarys)
+        redchi = chisqr / nfree
+
+        covar = None
+        if nvarys > 0:
+            jac_var = jac[:, var_inds]
+            try:
+                covar = np.linalg.inv(jac_var.T @ jac_var) * redchi
+            except np.linalg.LinAlgError:
+                covar = None
+
+        params, init_params = Parameters(), Parameters()
+        for ind, name in enumerate(self.param_names):
+            params.add(name, value=float(values[k, ind]), vary=bool(vary[k, ind]))
+            init_params.add(name, value=float(init_values[k, ind]), vary=bool(vary[k, ind]))
+        if covar is not None:
+            for i, ind in enumerate(var_inds):
+                params[self.param_names[ind]].stderr = np.sqrt(abs(covar[i, i]))
+
+        best_fit = self.eval(x, values[[k]])[0]
+        data = spectrum.y[mask]
+        sstot = np.sum((data - data.mean()) ** 2) if ndata > 0 else 0.
+        result = ModelResult(self.fit_plan.comp_model, params, method='batch_lm')
+        result.params = params
+        result.init_params = init_params
+        result.init_values = {name: par.value for name, par in init_params.items()}
+        result.best_values = {name: par.value for name, par in params.items()}
+        result.var_names = [self.param_names[ind] for ind in var_inds]
+        result.covar = covar
+        result.errorbars = covar is not None
+        result.nfev = int(nfev)
+        result.ndata = ndata
+        result.nvarys = nvarys
+        result.nfree = nfree
+        result.chisqr = chisqr
+        result.redchi = redchi
+        _neg2_log_likel = ndata * np.log(max(chisqr, 1e-250) / ndata)
+        result.aic = _neg2_log_likel + 2 * nvarys
+        result.bic = _neg2_log_likel + np.log(ndata) * nvarys
+        result.rsquared = 1. - np.sum((data - best_fit[mask]) ** 2) / max(sstot, 1e-250)
+        result.success = bool(status == CONVERGED)
+        result.aborted = not result.success
+        result.message = MESSAGES[status]
+        result.residual = residual[mask]
+        result.userkws = {'x': x[mask]}
+        result.best_fit = mask.astype(float)
+        result.best_fit[mask] = best_fit[mask]
+        spectrum.result_fit = result
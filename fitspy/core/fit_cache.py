@@ -0,0 +1,160 @@
+"""
+Module related to the on-disk cache of the fit results
+
+notes:
+The fit results are cached in a directory, content-addressed by a key hashing the spectrum raw
+data (x0, y0, weights0 and outliers limit), the preprocessing settings, the models, the fit
+parameters, the fit options and the fitspy version (see make_key()). Each entry is a JSON file
+named after its key and containing the fit result record (see
+fitspy.core.fit_results.make_record()).
+The cache size is bounded: once 'max_bytes' is exceeded, the least recently used entries are
+removed.
+The cache is used by Spectrum.fit() and Spectra.apply_model() when a FitCache object is passed
+through their 'cache' argument.
+"""
+import os
+import json
+from pathlib import Path
+from collections import OrderedDict
+from threading import Lock
+
+from fitspy import VERSION, FITSPY_DIR
+from fitspy.core.fit_journal import hash_model, hash_data, encode_default
+
+DEFAULT_DIRNAME = FITSPY_DIR / "fits_cache"
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+
+
+def make_key(spectrum, **options):
+    """ Return the key related to the 'spectrum' raw data, its preprocessing settings, its
+        models and its fit parameters and to the fit 'options'. The key is computed on the
+        spectrum ready to be fitted (preprocessed, see Spectrum.fit()) """
+    model_dict = spectrum.save()
+    for key in ['fname', 'result_fit_success']:
+        model_dict.pop(key, None)
+    model_dict['baseline'] = {key: val for key, val in model_dict['baseline'].items()
+                              if key not in ['y_eval', 'is_subtracted']}  # issued from x0, y0
+    return hash_model({'version': VERSION, 'data': hash_data(spectrum), 'model': model_dict,
+                       'options': options})
+
+
+class FitCache:
+    """
+    Class dedicated to the on-disk cache of the fit results
+
+    Attributes
+    ----------
+    dirname: pathlib.Path
+        Dirname of the cache
+    max_bytes: int
+        Maximum size (in bytes) of the cache entries
+    hits: int
+        Number of fit results returned from the cache
+    misses: int
+        Number of fit results not found in the cache
+
+    Parameters
+    ----------
+    dirname: str or pathlib.Path, optional
+        Dirname of the cache. If None, use DEFAULT_DIRNAME
+    max_bytes: int, optional
+        Maximum size (in bytes) of the cache entries
+    """
+
+    def __init__(self, dirname=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.dirname = Path(dirname if dirname is not None else DEFAULT_DIRNAME)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = None  # entries sizes per key, from the least recently used
+        self._nbytes = 0  # running total of the entries sizes
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def entries(self):
+        """ Return the entries sizes per key, from the least to the most recently used (read
+            from the cache directory at the first request) """
+        if self._entries is None:
+            items = []
+            for fname in self.dirname.glob("*/*.json"):
+                try:
+                    stat = fname.stat()
+                except OSError:
+                    continue
+                items.append((stat.st_mtime, fname.stem, stat.st_size))
+            self._entries = OrderedDict((key, size) for _, key, size in sorted(items))
+            self._nbytes = sum(self._entries.values())
+        return self._entries
+
+    @property
+    def nbytes(self):
+        """ Return the size (in bytes) of the cache entries """
+        _ = self.entries
+        return self._nbytes
+
+    def set_entry(self, key, size):
+        """ Set the 'key' entry 'size' as the most recently used entry """
+        self.pop_entry(key)
+        self.entries[key] = size
+        self._nbytes += size
+
+    def pop_entry(self, key):
+        """ Remove 'key' from the entries """
+        self._nbytes -= self.entries.pop(key, 0)
+
+    def entry_fname(self, key):
+        """ Return the pathname of the entry related to 'key' """
+        return self.dirname / key[:2] / f"{key}.json"
+
+    def get(self, key):
+        """ Return the record related to 'key' or None """
+        fname = self.entry_fname(key)
+        try:
+            record = tuple(json.loads(fname.read_bytes()))
+            os.utime(fname)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self.set_entry(key, self.entries.get(key) or fname.stat().st_size)
+        return record
+
+    def put(self, key, record):
+        """ Store the 'record' related to 'key', the least recently used entries being removed
+            if the cache size exceeds 'max_bytes' """
+        fname = self.entry_fname(key)
+        data = json.dumps(record, default=encode_default).encode()
+        fname.parent.mkdir(parents=True, exist_ok=True)
+        fname_tmp = fname.with_suffix(f".{os.getpid()}.tmp")
+        fname_tmp.write_bytes(data)
+        os.replace(fname_tmp, fname)
+        with self._lock:
+            self.set_entry(key, len(data))
+            self.evict()
+
+    def evict(self):
+        """ Remove the least recently used entries while the cache size exceeds 'max_bytes' """
+        while self.nbytes > self.max_bytes and len(self.entries) > 0:
+            key = next(iter(self.entries))
+            self.pop_entry(key)
+            self.entry_fname(key).unlink(missing_ok=True)
+
+    def clear(self):
+        """ Remove all the cache entries and reset the statistics """
+        with self._lock:
+            for key in list(self.entries):
+                self.entry_fname(key).unlink(missing_ok=True)
+            self._entries = OrderedDict()
+            self._nbytes = 0
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """ Return the cache statistics: 'hits', 'misses', 'entries' and 'bytes' """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries),
+                    'bytes': self.nbytes}
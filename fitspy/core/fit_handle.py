@@ -0,0 +1,118 @@
+"""
+Module related to the fits running in the background
+
+notes:
+Spectra.submit_model() applies a model in a background thread and returns a 'FitHandle'.
+The fitted spectra are reported as soon as they are completed (one by one with a single CPU,
+tile by tile with multiprocessing and chunk by chunk with the 'batch' solver), through the
+iteration on the handle and through the callbacks. The results are the spectra 'result_fit'
+(CompactResult objects, see fitspy.core.fit_results).
+"""
+import queue
+from threading import Thread, Event, Lock
+
+DONE = object()  # sentinel put in the results queue at the end of the fit
+
+
+class FitHandle:
+    """
+    Class dedicated to the follow-up of a fit running in the background
+
+    Attributes
+    ----------
+    ntot: int
+        Number of spectra to fit
+    ndone: int
+        Number of fitted spectra
+    nsuccess: int
+        Number of spectra successfully fitted
+    cancel_event: threading.Event
+        Event set to cancel the spectra not fitted yet
+    error: Exception
+        Exception raised during the fit (if any)
+    """
+
+    def __init__(self, ntot):
+        self.ntot = ntot
+        self.ndone = 0
+        self.nsuccess = 0
+        self.cancel_event = Event()
+        self.error = None
+        self._callbacks = []
+        self._results = queue.Queue()
+        self._lock = Lock()
+        self._thread = None
+
+    def __iter__(self):
+        """ Yield the (fname, result) items as the spectra are fitted (to be iterated once) """
+        while True:
+            item = self._results.get()
+            if item is DONE:
+                break
+            yield item
+        self.wait()
+
+    @property
+    def nfailed(self):
+        """ Return the number of spectra for which the fit failed """
+        return self.ndone - self.nsuccess
+
+    @property
+    def npending(self):
+        """ Return the number of spectra not fitted yet """
+        return self.ntot - self.ndone
+
+    @property
+    def done(self):
+        """ Return True if the fit is over (completed, cancelled or aborted) """
+        return self._thread is not None and not self._thread.is_alive()
+
+    @property
+    def cancelled(self):
+        """ Return True if the fit has been cancelled """
+        return self.cancel_event.is_set()
+
+    def start(self, target, *args):
+        """ Start 'target(*args)' (the fit) in a background thread """
+        self._thread = Thread(target=self._run, args=(target, *args), daemon=True)
+        self._thread.start()
+
+    def _run(self, target, *args):
+        try:
+            target(*args)
+        except Exception as error:  # pylint:disable=broad-except
+            self.error = error
+        finally:
+            self._results.put(DONE)
+
+    def add_callback(self, callback):
+        """ Add a function called as callback(fname, result) each time a spectrum is fitted
+            (from the fitting thread) """
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def report(self, spectra):
+        """ Report the fitted 'spectra' """
+        with self._lock:
+            callbacks = list(self._callbacks)
+            for spectrum in spectra:
+                self.ndone += 1
+                self.nsuccess += bool(spectrum.result_fit.success)
+        for spectrum in spectra:
+            item = (spectrum.fname, spectrum.result_fit)
+            self._results.put(item)
+            for callback in callbacks:
+                callback(*item)
+
+    def cancel(self):
+        """ Cancel the fit of the spectra not started yet """
+        self.cancel_event.set()
+
+    def wait(self, timeout=None):
+        """ Wait for the end of the fit and return True if the fit is over. The exception
+            raised during the fit (if any) is raised again """
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.done
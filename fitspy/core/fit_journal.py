@@ -0,0 +1,123 @@
+"""
+Module related to the checkpointing of the fits
+
+notes:
+When a checkpoint directory is given to Spectra.apply_model(), the fit results are appended
+to an append-only journal ('journal.jsonl') and synchronized on disk as soon as the spectra
+are fitted. Each line contains the spectrum fname, the hash of the applied model, the hash of
+the spectrum raw data (profile, weights and outliers limit) and the fit result record (see
+fitspy.core.fit_results.make_record()).
+In resume mode, the spectra already recorded in the journal for the same model hash and the
+same raw data hash are restored from their records instead of being fitted again.
+A line truncated by a crash is ignored when reading the journal.
+"""
+import os
+import json
+import hashlib
+from pathlib import Path
+import numpy as np
+
+from fitspy.core.fit_results import make_record
+
+JOURNAL_NAME = "journal.jsonl"
+
+
+def encode_default(obj):
+    """ Return the JSON-compatible form of the numpy objects """
+    if isinstance(obj, (np.generic, np.ndarray)):
+        return obj.tolist()
+    return str(obj)
+
+
+def hash_model(model_dict):
+    """ Return the hash of a 'model_dict' """
+    dump = json.dumps(model_dict, sort_keys=True, default=encode_default)
+    return hashlib.sha256(dump.encode()).hexdigest()
+
+
+def hash_arrays(*arrays):
+    """ Return the hash of the 'arrays' contents """
+    sha = hashlib.sha256()
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr if arr is not None else [], dtype=float)
+        sha.update(str(arr.shape).encode())
+        sha.update(arr.tobytes())
+    return sha.hexdigest()
+
+
+def hash_data(spectrum):
+    """ Return the hash of the 'spectrum' raw data: profile, weights and outliers limit (the
+        other inputs of the fit mask being part of the model) """
+    return hash_arrays(spectrum.x0, spectrum.y0, spectrum.weights0, spectrum.outliers_limit)
+
+
+class FitJournal:
+    """
+    Class dedicated to the journal of the fit results related to a model (to be used as a
+    context manager)
+
+    Attributes
+    ----------
+    fname: pathlib.Path
+        Pathname of the journal file
+    model_hash: str
+        Hash of the applied model (see hash_model())
+    entries: dict
+        (data_hash, record) items per fname read from the journal (see load())
+    """
+
+    def __init__(self, dirname, model_dict):
+        Path(dirname).mkdir(parents=True, exist_ok=True)
+        self.fname = Path(dirname) / JOURNAL_NAME
+        self.model_hash = hash_model(model_dict)
+        self.entries = {}
+        self._fid = None
+
+    def __enter__(self):
+        self._fid = open(self.fname, 'a+b')
+        if self._fid.tell() > 0:
+            self._fid.seek(-1, os.SEEK_END)
+            if self._fid.read(1) != b'\n':
+                self._fid.write(b'\n')  # line truncated by a crash
+        return self
+
+    def __exit__(self, *args):
+        self._fid.flush()
+        os.fsync(self._fid.fileno())
+        self._fid.close()
+        self._fid = None
+
+    def load(self):
+        """ Read and return the (data_hash, record) items related to the model, per fname
+            (the last recorded one) """
+        self.entries = entries = {}
+        if not self.fname.is_file():
+            return entries
+        with open(self.fname, 'rb') as fid:
+            for line in fid:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # line truncated by a crash
+                if entry['model'] == self.model_hash:
+                    entries[entry['fname']] = (entry['data'], tuple(entry['record']))
+        return entries
+
+    def get_record(self, spectrum):
+        """ Return the record related to 'spectrum' if recorded with the same raw data, or
+            None (see Spectra.restore_fits()) """
+        if spectrum.fname not in self.entries:
+            return None
+        data_hash, record = self.entries[spectrum.fname]
+        return record if data_hash == hash_data(spectrum) else None
+
+    def write(self, spectra):
+        """ Append the fit results of 'spectra' to the journal """
+        lines = []
+        for spectrum in spectra:
+            entry = {'fname': spectrum.fname, 'model': self.model_hash,
+                     'data': hash_data(spectrum), 'record': make_record(spectrum)}
+            lines.append(json.dumps(entry, default=encode_default) + '\n')
+        self._fid.write(''.join(lines).encode())
+        self._fid.flush()
+        os.fsync(self._fid.fileno())
@@ -0,0 +1,134 @@
+"""
+Class dedicated to the fit of a batch of spectra sharing the same model
+"""
+import copy
+import itertools
+import threading
+import numpy as np
+
+from fitspy.core.spectrum import Spectrum
+from fitspy.core.migrations import migrate_model_dict
+
+HINT_NAMES = ('value', 'vary', 'min', 'max', 'expr')
+MODELS_KEYS = ['peak_models', 'bkg_models', 'bkg_model']
+
+
+class FitPlan:
+    """
+    Class dedicated to the fit of a batch of spectra sharing the same model.
+
+    The model dictionary is migrated once, the lmfit composite model and its
+    'Parameters' are built once and then reused for every spectrum of the
+    batch (the 'Parameters' being copied once per thread). Only the data and
+    the initial guesses (param_hints) are swapped per spectrum.
+
+    Attributes
+    ----------
+    model_dict: dict
+        Migrated model dictionary (see Spectrum.save())
+    peak_models: list of lmfit.Model
+        Template peak models
+    peak_labels: list of str
+        Labels associated to the template peak models
+    bkg_models: list of lmfit.Model
+        Template background models
+    comp_model: lmfit.CompositeModel or lmfit.Model
+        Composite model (peak models + background models) shared by the batch
+    params: lmfit.Parameters
+        Parameters related to 'comp_model' (template left unchanged, see
+        make_params())
+    param_names: list of str
+        Parameters names (layout) of 'comp_model'
+    nvarys: int
+        Number of parameters used to evaluate the maximum function evaluations
+
+    Parameters
+    ----------
+    model_dict: dict
+        Dictionary related to the Spectrum object attributes (obtained from
+        Spectrum.save() for instance)
+    """
+
+    def __init__(self, model_dict):
+        self.model_dict = migrate_model_dict(model_dict)
+        self.attrs_dict = {key: val for key, val in self.model_dict.items()
+                           if key not in MODELS_KEYS}
+
+        template = Spectrum()
+        template.set_attributes(self.model_dict)
+        self.peak_models = template.peak_models
+        self.peak_labels = template.peak_labels
+        self.bkg_models = template.bkg_models
+
+        self.comp_model = None
+        for model in self.peak_models + self.bkg_models:
+            if self.comp_model is None:
+                self.comp_model = model
+            else:
+                self.comp_model += model
+
+        self.params = None
+        self.param_names = []
+        if self.comp_model is not None:
+            self.params = self.comp_model.make_params()
+            self.param_names = list(self.params.keys())
+        self.nvarys = len(self.param_names)
+        self._local = threading.local()  # params copied per thread
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_local']  # not picklable
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def set_attributes(self, spectrum):
+        """ Set the plan attributes and (copied) models to 'spectrum' """
+        spectrum.set_attributes(self.attrs_dict)
+
+        spectrum.peak_models = [self.copy_model(model) for model in self.peak_models]
+        spectrum.peak_labels = list(self.peak_labels)
+        spectrum.peak_index = itertools.count(start=len(self.peak_models) + 1)
+        spectrum.bkg_models = [self.copy_model(model) for model in self.bkg_models]
+
+    @staticmethod
+    def copy_model(model):
+        """ Return a shallow copy of 'model' with its own 'param_hints' """
+        model_copy = copy.copy(model)
+        model_copy.param_hints = {key: dict(hints) for key, hints in model.param_hints.items()}
+        return model_copy
+
+    def is_compatible(self, spectrum):
+        """ Return True if the 'spectrum' models have the same layout as the plan """
+        models = spectrum.peak_models + spectrum.bkg_models
+        if self.comp_model is None or len(models) != len(self.comp_model.components):
+            return False
+        for model, model_ref in zip(models, self.comp_model.components):
+            if model.param_names != model_ref.param_names:
+                return False
+        return True
+
+    def make_params(self, spectrum):
+        """ Return the plan params (copied once per thread) reset from the template 'params'
+            and updated from the 'spectrum' models param_hints """
+        params = getattr(self._local, 'params', None)
+        if params is None:
+            params = self._local.params = copy.deepcopy(self.params)
+        for par, par_ref in zip(params.values(), self.params.values()):
+            par._delay_asteval = True
+            par.expr = None
+            par.min, par.max = -np.inf, np.inf
+            par.value, par.vary = par_ref.value, True
+        for model in spectrum.peak_models + spectrum.bkg_models:
+            for basename, hint in model.param_hints.items():
+                name = f"{model.prefix}{basename}"
+                if name in params:
+                    par = params[name]
+                    for item in HINT_NAMES:
+                        if item in hint:
+                            setattr(par, item, hint[item])
+        for par in params.values():
+            par._delay_asteval = False
+        return params
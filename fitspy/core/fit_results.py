@@ -0,0 +1,340 @@
+"""
+Module related to the compact storage of the fit results
+
+notes:
+The results of the spectra fitted by 'apply_model' are gathered in structured arrays (see
+'FitResults') owned by the Spectra/SpectraMap objects, instead of keeping for each spectrum a
+full lmfit.ModelResult (with its copies of data, weights, best_fit, covariance, ...).
+Each spectrum refers to its record through a lightweight 'CompactResult', the full
+ModelResult being rebuilt on demand (fit_report for instance) from the current spectrum data.
+"""
+import numpy as np
+import pandas as pd
+from lmfit import Parameters
+from lmfit.model import ModelResult
+
+STATS_FIELDS = [('chisqr', float), ('redchi', float), ('nfev', int), ('ndata', int),
+                ('nvarys', int), ('success', bool), ('method', 'U16')]
+
+
+def make_dtype(nparams):
+    """ Return the structured dtype of the records related to 'nparams' parameters """
+    return np.dtype([('values', float, (nparams,)), ('stderr', float, (nparams,))]
+                    + STATS_FIELDS)
+
+
+def make_record(spectrum):
+    """
+    Return the compact record related to the 'spectrum' fit result as a tuple:
+    (values, stderr, chisqr, redchi, nfev, ndata, nvarys, success, method), 'values' and
+    'stderr' being dictionaries. The values are issued from the models when the fit result has
+    no parameters (independent models fit)
+    """
+    result_fit = spectrum.result_fit
+    if isinstance(result_fit, CompactResult):
+        return result_fit.record()
+
+    params = getattr(result_fit, 'params', None)
+    if params is not None:
+        values = {name: par.value for name, par in params.items()}
+        stderr = {name: par.stderr for name, par in params.items() if par.stderr is not None}
+    else:
+        values, stderr = {}, {}
+        for model in spectrum.peak_models + spectrum.bkg_models:
+            for name in model.param_names:
+                values[name] = model.param_hints[name[len(model.prefix):]]['value']
+
+    return (values, stderr,
+            float(getattr(result_fit, 'chisqr', np.nan)),
+            float(getattr(result_fit, 'redchi', np.nan)),
+            int(getattr(result_fit, 'nfev', 0)),
+            int(getattr(result_fit, 'ndata', 0)),
+            int(getattr(result_fit, 'nvarys', 0)),
+            bool(result_fit.success),
+            getattr(result_fit, 'method', spectrum.fit_params['method']))
+
+
+class FitResults:
+    """
+    Class dedicated to the fit results of spectra stored in structured arrays
+
+    Attributes
+    ----------
+    param_names: list of str
+        Parameters names related to the 'values' and 'stderr' columns
+    data: numpy.ndarray
+        Structured array with the 'values', 'stderr', 'chisqr', 'redchi', 'nfev', 'ndata',
+        'nvarys', 'success' and 'method' fields (one row per spectrum). The parameters not
+        related to a spectrum are set to NaN
+    index: dict
+        Rows indices related to the spectra fnames
+    """
+
+    def __init__(self):
+        self.param_names = []
+        self.data = np.zeros(0, dtype=make_dtype(0))
+        self.index = {}
+        self._buffer = None
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, fname):
+        return fname in self.index
+
+    def update(self, spectra, records=None):
+        """
+        Store the fit results of 'spectra' and replace their 'result_fit' by a CompactResult
+
+        Parameters
+        ----------
+        spectra: list of Spectrum objects
+            Spectra to handle. The spectra without fit result are ignored
+        records: dict, optional
+            Records (see make_record()) related to the spectra fnames, considered instead of the
+            spectra 'result_fit'
+        """
+        records = records or {}
+        items = []
+        for spectrum in spectra:
+            result_fit = spectrum.result_fit
+            if spectrum.fname in records:
+                items.append((spectrum, records[spectrum.fname]))
+            elif isinstance(result_fit, CompactResult) and result_fit.results is self:
+                continue
+            elif hasattr(result_fit, 'success'):
+                items.append((spectrum, make_record(spectrum)))
+
+        self.store([spectrum.fname for spectrum, _ in items], [record for _, record in items])
+
+        for spectrum, _ in items:
+            spectrum.result_fit = CompactResult(self, spectrum)
+
+    def store(self, fnames, records):
+        """ Store the 'records' (see make_record()) related to 'fnames' """
+        if len(records) == 0:
+            return
+
+        # new parameters columns
+        names = dict.fromkeys(name for record in records for name in record[0])
+        new_names = [name for name in names if name not in self.param_names]
+        if len(new_names) > 0:
+            self.resize(len(self.data), self.param_names + new_names)
+
+        # new rows
+        new_fnames = dict.fromkeys(fname for fname in fnames if fname not in self.index)
+        if len(new_fnames) > 0:
+            nrows = len(self.data)
+            self.resize(nrows + len(new_fnames), self.param_names)
+            self.index.update({fname: nrows + i for i, fname in enumerate(new_fnames)})
+
+        rows = np.array([self.index[fname] for fname in fnames])
+        inds = {name: i for i, name in enumerate(self.param_names)}
+        values = np.full((len(records), len(self.param_names)), np.nan)
+        stderr = np.full_like(values, np.nan)
+        for k, record in enumerate(records):
+            values[k, [inds[name] for name in record[0]]] = list(record[0].values())
+            stderr[k, [inds[name] for name in record[1]]] = list(record[1].values())
+        self.data['values'][rows] = values
+        self.data['stderr'][rows] = stderr
+        for i, (name, _) in enumerate(STATS_FIELDS):
+            self.data[name][rows] = [record[2 + i] for record in records]
+
+    def resize(self, nrows, param_names):
+        """ Resize 'data' to 'nrows' rows and the 'param_names' columns. The rows are allocated
+            by blocks (doubling the capacity) to store the records one by one at low cost """
+        buffer = getattr(self, '_buffer', None)
+        buffer = buffer if buffer is not None else self.data
+        if list(param_names) == self.param_names and nrows <= len(buffer):
+            self.data = buffer[:nrows]
+            return
+
+        capacity = nrows
+        if len(param_names) == len(self.param_names):
+            capacity = max(nrows, 2 * len(buffer))
+        data = np.zeros(capacity, dtype=make_dtype(len(param_names)))
+        data['values'] = data['stderr'] = np.nan
+        nrows0, ncols0 = len(self.data), len(self.param_names)
+        for name in self.data.dtype.names:
+            if name in ['values', 'stderr']:
+                data[name][:nrows0, :ncols0] = self.data[name]
+            else:
+                data[name][:nrows0] = self.data[name]
+        self._buffer = data
+        self.data = data[:nrows]
+        self.param_names = list(param_names)
+
+    def get(self, fname):
+        """ Return the 'values' and 'stderr' dictionaries related to 'fname' (without NaN) """
+        row = self.data[self.index[fname]]
+        values, stderr = {}, {}
+        for name, value, err in zip(self.param_names, row['values'], row['stderr']):
+            if not np.isnan(value):
+                values[name] = float(value)
+                if not np.isnan(err):
+                    stderr[name] = float(err)
+        return values, stderr
+
+    def to_dataframe(self, fnames):
+        """ Return the 'success' status and the parameters values related to 'fnames' as a
+            pandas.DataFrame (the parameters columns not related to 'fnames' being removed) """
+        rows = [self.index[fname] for fname in fnames]
+        values = self.data['values'][rows]
+        keep = ~np.all(np.isnan(values), axis=0)
+        dfr = pd.DataFrame(values[:, keep], columns=np.array(self.param_names)[keep])
+        dfr['success'] = self.data['success'][rows]
+        return dfr
+
+
+class CompactResult:
+    """
+    Class dedicated to the fit result of a spectrum stored in a FitResults object.
+
+    The main ModelResult attributes ('success', 'method', 'nfev', 'chisqr', 'redchi',
+    'ndata', 'nvarys', 'best_values', 'params') are issued from the FitResults record, the others
+    ('best_fit', 'residual', 'fit_report()', ...) from a ModelResult rebuilt at the first
+    request.
+
+    Attributes
+    ----------
+    results: FitResults object
+        Object storing the record
+    spectrum: Spectrum object
+        Spectrum related to the fit result
+    fname: str
+        Filename (key) of the record
+    """
+
+    def __init__(self, results, spectrum):
+        self.results = results
+        self.spectrum = spectrum
+        self.fname = spectrum.fname
+        self._model_result = None
+
+    def __getattr__(self, name):
+        # the private attributes are excluded to avoid recursions when (un)pickling
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.model_result(), name)
+
+    def _get(self, field):
+        return self.results.data[field][self.results.index[self.fname]]
+
+    @property
+    def success(self):
+        """ Return the fit success status """
+        return bool(self._get('success'))
+
+    @property
+    def method(self):
+        """ Return the fitting method """
+        return str(self._get('method'))
+
+    @property
+    def nfev(self):
+        """ Return the number of function evaluations """
+        return int(self._get('nfev'))
+
+    @property
+    def ndata(self):
+        """ Return the number of fitted points """
+        return int(self._get('ndata'))
+
+    @property
+    def nvarys(self):
+        """ Return the number of varying parameters """
+        return int(self._get('nvarys'))
+
+    @property
+    def chisqr(self):
+        """ Return the chi-square """
+        return float(self._get('chisqr'))
+
+    @property
+    def redchi(self):
+        """ Return the reduced chi-square """
+        return float(self._get('redchi'))
+
+    @property
+    def best_values(self):
+        """ Return the fitted values as a dictionary """
+        return self.results.get(self.fname)[0]
+
+    @property
+    def params(self):
+        """ Return the fitted values and their standard errors as lmfit.Parameters """
+        if self._model_result is not None:
+            return self._model_result.params
+        values, stderr = self.results.get(self.fname)
+        params = Parameters()
+        for name, value in values.items():
+            params.add(name, value=value)
+            params[name].stderr = stderr.get(name)
+        return params
+
+    def record(self):
+        """ Return the record (see make_record()) """
+        values, stderr = self.results.get(self.fname)
+        return (values, stderr, self.chisqr, self.redchi, self.nfev, self.ndata, self.nvarys,
+                self.success, self.method)
+
+    def model_result(self):
+        """ Return the full lmfit.ModelResult, rebuilt from the record and the spectrum data """
+        if self._model_result is None:
+            self._model_result = self.rebuild()
+        return self._model_result
+
+    def rebuild(self):
+        """ Return a lmfit.ModelResult related to the record and the spectrum data """
+        spectrum = self.spectrum
+        models = spectrum.peak_models + spectrum.bkg_models
+        comp_model = models[0]
+        for model in models[1:]:
+            comp_model += model
+
+        values, stderr = self.results.get(self.fname)
+        params = comp_model.make_params()
+        for name, par in params.items():
+            par.value = values.get(name, par.value)
+            par.stderr = stderr.get(name)
+            par.init_value = None
+
+        x, y, weights = spectrum.x, spectrum.y, spectrum.weights
+        mask, _ = spectrum.fit_mask()
+        weights = weights[mask] if weights is not None else None
+        data = y[mask]
+
+        independent_vars = {var for model in models for var in model.independent_vars}
+        independent_vars.discard('x')
+        userkws = {'x': x[mask], **{var: None for var in independent_vars}}
+
+        result = ModelResult(comp_model, params, data=data, weights=weights,
+                             method=self.method)
+        result.params = result.init_params = params
+        result.init_values = {}
+        result.best_values = values
+        result.var_names = [name for name, par in params.items() if par.vary and not par.expr]
+        result.covar = None
+        result.errorbars = len(stderr) > 0
+        result.nfev = self.nfev
+        result.ndata = self.ndata
+        result.nvarys = self.nvarys
+        result.nfree = max(1, self.ndata - self.nvarys)
+        result.chisqr = self.chisqr
+        result.redchi = self.redchi
+        _neg2_log_likel = self.ndata * np.log(max(self.chisqr, 1e-250) / max(1, self.ndata))
+        result.aic = _neg2_log_likel + 2 * self.nvarys
+        result.bic = _neg2_log_likel + np.log(max(1, self.ndata)) * self.nvarys
+        result.success = self.success
+        result.message = 'Fit succeeded.' if self.success else 'Fit aborted.'
+        result.userkws = userkws
+
+        best_fit = comp_model.eval(params, **userkws)
+        residual = best_fit - data
+        result.residual = residual * weights if weights is not None else residual
+        sstot = ((data - data.mean()) ** 2).sum() if len(data) > 0 else 0.
+        result.rsquared = 1. - (residual ** 2).sum() / max(1e-250, sstot)
+        result.best_fit = mask.astype(float)
+        result.best_fit[mask] = best_fit
+
+        return result
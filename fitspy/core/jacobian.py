@@ -0,0 +1,98 @@
+"""
+Module related to the analytic jacobian of the composite models used when fitting
+"""
+import numpy as np
+from lmfit.models import ConstantModel, LinearModel, ParabolicModel, ExponentialModel
+from lmfit.models import PowerLawModel
+
+
+def constant_jac(x, c):
+    """ Return the ConstantModel partial derivatives """
+    return {'c': np.ones_like(x)}
+
+
+def linear_jac(x, slope, intercept):
+    """ Return the LinearModel partial derivatives """
+    return {'slope': x, 'intercept': np.ones_like(x)}
+
+
+def parabolic_jac(x, a, b, c):
+    """ Return the ParabolicModel partial derivatives """
+    return {'a': x ** 2, 'b': x, 'c': np.ones_like(x)}
+
+
+def exponential_jac(x, amplitude, decay):
+    """ Return the ExponentialModel partial derivatives """
+    expo = np.exp(-x / decay)
+    return {'amplitude': expo, 'decay': amplitude * expo * x / decay ** 2}
+
+
+def powerlaw_jac(x, amplitude, exponent):
+    """ Return the PowerLawModel partial derivatives """
+    power = x ** exponent
+    return {'amplitude': power, 'exponent': amplitude * power * np.log(x)}
+
+
+BKG_JACOBIANS = {ConstantModel: constant_jac,
+                 LinearModel: linear_jac,
+                 ParabolicModel: parabolic_jac,
+                 ExponentialModel: exponential_jac,
+                 PowerLawModel: powerlaw_jac}
+
+
+def get_model_jacobian(model):
+    """ Return the analytic jacobian function related to 'model' (or None) """
+    if type(model) in BKG_JACOBIANS:
+        return BKG_JACOBIANS[type(model)]
+    return getattr(model.func, 'jacobian', None)
+
+
+def make_jacobian(comp_model, params):
+    """
+    Return the analytic jacobian function related to the residual of 'comp_model' to be passed
+    as 'Dfun' (leastsq) or 'jac' (least_squares) to lmfit, or None if one of the components
+    has no analytic jacobian or if a parameter is constrained by an expression.
+
+    Parameters
+    ----------
+    comp_model: lmfit.Model or lmfit.CompositeModel
+        Model to fit (sum of the peak and background models)
+    params: lmfit.Parameters
+        Parameters related to 'comp_model'
+
+    Returns
+    -------
+    jacobian: callable or None
+        Function returning the (ndata, nvarys) jacobian matrix of the residual
+        (data - model) * weights with respect to the varying parameters
+    """
+    if any(par.expr for par in params.values()):
+        return None
+
+    components = []
+    for model in comp_model.components:
+        jac_func = get_model_jacobian(model)
+        if jac_func is None:
+            return None
+        basenames = [name[len(model.prefix):] for name in model.param_names]
+        components.append((model, jac_func, basenames))
+
+    def jacobian(pars, data, weights, **kwargs):
+        var_names = [name for name, par in pars.items() if par.vary]
+        inds = {name: i for i, name in enumerate(var_names)}
+        jac = np.zeros((len(data), len(var_names)))
+        for model, jac_func, basenames in components:
+            names = [model.prefix + name for name in basenames]
+            if not any(name in inds for name in names):
+                continue
+            values = {basename: pars[name].value for basename, name in zip(basenames, names)}
+            indep = {key: kwargs[key] for key in model.independent_vars if key in kwargs}
+            derivs = jac_func(**indep, **values)
+            for basename, name in zip(basenames, names):
+                if name in inds:
+                    jac[:, inds[name]] -= derivs[basename]
+        if weights is not None:
+            jac *= np.asarray(weights)[:, np.newaxis]
+        return jac
+
+    return jacobian
@@ -0,0 +1,87 @@
+"""
+Module related to the binary cache of the 2D-map files
+
+notes:
+The first reading of a 2D-map file ('.txt' parsed by pandas or rsciio formats decoded as a full
+cube) stores the related array (see fitspy.core.utils.get_2d_map()) with sorted wavelengths
+in a '.npy' file of the cache directory. The next readings open this file as a read-only
+memory-map, the data being paged on demand.
+The cache entries are identified by the file pathname, size and modification time, an entry
+being replaced when the file changes.
+"""
+import os
+import hashlib
+from pathlib import Path
+import numpy as np
+
+from fitspy import FITSPY_DIR
+from fitspy.core.utils import get_2d_map
+
+CACHE_DIR = FITSPY_DIR / "maps_cache"
+
+
+def get_cache_fname(fname):
+    """ Return the cache filename related to the 'fname' file current state """
+    fname = os.path.abspath(fname)
+    stat = os.stat(fname)
+    key = hashlib.sha1(fname.encode()).hexdigest()
+    return Path(CACHE_DIR) / f"{key}_{stat.st_size}_{stat.st_mtime_ns}.npy"
+
+
+def load_2d_map(fname, use_cache=True):
+    """
+    Return the array related to a 2D-map (see fitspy.core.utils.get_2d_map()) with sorted
+    wavelengths, as a read-only memory-map when issued from the cache
+
+    Parameters
+    ----------
+    fname: str
+        Pathname of the 2D-map file
+    use_cache: bool, optional
+        Activation key to read the array from the cache (and to create the cache entry)
+    """
+    if not use_cache:
+        return sort_wavelengths(get_2d_map(fname))
+
+    fname_cache = get_cache_fname(fname)
+    if fname_cache.is_file():
+        try:
+            return np.load(fname_cache, mmap_mode='r')
+        except (OSError, ValueError):
+            pass  # corrupted entry, rewritten below
+
+    arr0 = sort_wavelengths(get_2d_map(fname))
+    try:
+        write_entry(fname_cache, arr0)
+    except OSError as error:
+        print(f"WARNING: unable to write the map cache ({error})")
+        return arr0
+    return np.load(fname_cache, mmap_mode='r')
+
+
+def sort_wavelengths(arr0):
+    """ Return 'arr0' with the columns sorted according to the wavelengths """
+    inds = np.argsort(arr0[0, 2:])
+    if np.all(np.diff(inds) > 0):
+        return np.asarray(arr0, dtype=float)
+    return np.asarray(arr0[:, np.hstack(([0, 1], inds + 2))], dtype=float)
+
+
+def write_entry(fname_cache, arr0):
+    """ Write the 'arr0' cache entry, the obsolete entries of the same file being removed """
+    os.makedirs(fname_cache.parent, exist_ok=True)
+    key = fname_cache.name.split('_')[0]
+    for fname_old in fname_cache.parent.glob(f"{key}_*.npy"):
+        fname_old.unlink(missing_ok=True)
+
+    # written under a temporary name to not expose an incomplete entry
+    fname_tmp = fname_cache.with_suffix(f".{os.getpid()}.tmp")
+    with open(fname_tmp, 'wb') as fid:
+        np.save(fid, arr0)
+    os.replace(fname_tmp, fname_cache)
+
+
+def clear_cache():
+    """ Remove all the cache entries """
+    for fname_cache in Path(CACHE_DIR).glob("*.npy"):
+        fname_cache.unlink(missing_ok=True)
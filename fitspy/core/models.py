@@ -125,3 +125,67 @@ def pseudovoigt(x, ampli, fwhm, x0, alpha=0.5):
     """
     return alpha * gaussian(x, ampli, fwhm, x0) + \
         (1 - alpha) * lorentzian(x, ampli, fwhm, x0)
+
+
+def gaussian_jac(x, ampli, fwhm, x0):
+    """ Return the Gaussian partial derivatives wrt (ampli, fwhm, x0) """
+    coef = 4. * np.log(2.) / fwhm ** 2
+    expo = np.exp(-coef * (x - x0) ** 2)
+    y = ampli * expo
+    return {'ampli': expo,
+            'fwhm': y * 2 * coef * (x - x0) ** 2 / fwhm,
+            'x0': y * 2 * coef * (x - x0)}
+
+
+def gaussian_asym_jac(x, ampli, fwhm_l, fwhm_r, x0):
+    """ Return the Asymmetric Gaussian partial derivatives wrt (ampli, fwhm_l, fwhm_r, x0) """
+    mask = x < x0
+    jac_l = gaussian_jac(x, ampli, fwhm_l, x0)
+    jac_r = gaussian_jac(x, ampli, fwhm_r, x0)
+    return {'ampli': np.where(mask, jac_l['ampli'], jac_r['ampli']),
+            'fwhm_l': mask * jac_l['fwhm'],
+            'fwhm_r': ~mask * jac_r['fwhm'],
+            'x0': np.where(mask, jac_l['x0'], jac_r['x0'])}
+
+
+def lorentzian_jac(x, ampli, fwhm, x0):
+    """ Return the Lorentzian partial derivatives wrt (ampli, fwhm, x0) """
+    denom = 4 * (x - x0) ** 2 + fwhm ** 2 + 1e-6
+    return {'ampli': fwhm ** 2 / denom,
+            'fwhm': 2 * ampli * fwhm * (denom - fwhm ** 2) / denom ** 2,
+            'x0': 8 * ampli * fwhm ** 2 * (x - x0) / denom ** 2}
+
+
+def lorentzian_asym_jac(x, ampli, fwhm_l, fwhm_r, x0):
+    """ Return the Asymmetric Lorentzian partial derivatives wrt (ampli, fwhm_l, fwhm_r, x0) """
+    mask = x < x0
+    jac_l = lorentzian_jac(x, ampli, fwhm_l, x0)
+    jac_r = lorentzian_jac(x, ampli, fwhm_r, x0)
+    return {'ampli': np.where(mask, jac_l['ampli'], jac_r['ampli']),
+            'fwhm_l': mask * jac_l['fwhm'],
+            'fwhm_r': ~mask * jac_r['fwhm'],
+            'x0': np.where(mask, jac_l['x0'], jac_r['x0'])}
+
+
+def pseudovoigt_jac(x, ampli, fwhm, x0, alpha=0.5):
+    """ Return the Pseudovoigt partial derivatives wrt (ampli, fwhm, x0, alpha) """
+    jac_g = gaussian_jac(x, ampli, fwhm, x0)
+    jac_l = lorentzian_jac(x, ampli, fwhm, x0)
+    jac = {key: alpha * jac_g[key] + (1 - alpha) * jac_l[key] for key in jac_g}
+    jac['alpha'] = gaussian(x, ampli, fwhm, x0) - lorentzian(x, ampli, fwhm, x0)
+    return jac
+
+
+# analytic jacobians used by fitspy.core.jacobian.make_jacobian()
+gaussian.jacobian = gaussian_jac
+gaussian_asym.jacobian = gaussian_asym_jac
+lorentzian.jacobian = lorentzian_jac
+lorentzian_asym.jacobian = lorentzian_asym_jac
+pseudovoigt.jacobian = pseudovoigt_jac
+
+# parameters entering linearly the models used by fitspy.core.varpro.varpro_fit()
+gaussian.linear_params = ('ampli',)
+gaussian_asym.linear_params = ('ampli',)
+lorentzian.linear_params = ('ampli',)
+lorentzian_asym.linear_params = ('ampli',)
+pseudovoigt.linear_params = ('ampli',)
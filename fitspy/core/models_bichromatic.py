@@ -3,7 +3,7 @@ Module related to bichromatic models
 """
 import numpy as np
 
-from fitspy.core.models import pseudovoigt
+from fitspy.core.models import pseudovoigt, pseudovoigt_jac
 from fitspy.core.utils import with_independent_vars
 from fitspy import PEAK_MODELS
 
@@ -91,6 +91,31 @@ def pseudovoigt_ka12(x, ampli, fwhm, x0, alpha=0.5, cathode='Cu', coefs=None):
         coefs[1] * pseudovoigt(x, ampli2, fwhm2, x02, alpha=alpha)
 
 
+def pseudovoigt_ka12_jac(x, ampli, fwhm, x0, alpha=0.5, cathode='Cu', coefs=None):
+    """ Return the bichromatic Pseudovoigt partial derivatives wrt (ampli, fwhm, x0, alpha) """
+    assert MODE in ['2θ', 'qx']
+    coefs = coefs or (1., 1.)
+
+    ampli2 = ampli / AMPLITUDE_RATIO[cathode]
+    ratio = WAVELENGTH_RATIO[cathode]
+
+    if MODE == '2θ':
+        theta = np.radians(x0 / 2.)
+        x02 = 2 * np.degrees(np.arcsin(ratio * np.sin(theta)))
+        dx02 = ratio * np.cos(theta) / np.sqrt(1 - (ratio * np.sin(theta)) ** 2)
+    else:  # 'qx'
+        x02 = ratio * x0
+        dx02 = ratio
+
+    jac1 = pseudovoigt_jac(x, ampli, fwhm, x0, alpha=alpha)
+    jac2 = pseudovoigt_jac(x, ampli2, fwhm, x02, alpha=alpha)
+
+    return {'ampli': coefs[0] * jac1['ampli'] + coefs[1] * jac2['ampli'] / AMPLITUDE_RATIO[cathode],
+            'fwhm': coefs[0] * jac1['fwhm'] + coefs[1] * jac2['fwhm'],
+            'x0': coefs[0] * jac1['x0'] + coefs[1] * jac2['x0'] * dx02,
+            'alpha': coefs[0] * jac1['alpha'] + coefs[1] * jac2['alpha']}
+
+
 def make_pseudovoigt_ka12_for(cathode):
     """ Return function associated with the 'given' cathode """
     assert cathode in CATHODES
@@ -99,6 +124,11 @@ def make_pseudovoigt_ka12_for(cathode):
     def func(x, ampli, fwhm, x0, alpha=0.5, coefs=None):
         return pseudovoigt_ka12(x, ampli, fwhm, x0, alpha, cathode=cathode, coefs=coefs)
 
+    def jacobian(x, ampli, fwhm, x0, alpha=0.5, coefs=None):
+        return pseudovoigt_ka12_jac(x, ampli, fwhm, x0, alpha, cathode=cathode, coefs=coefs)
+
+    func.jacobian = jacobian
+    func.linear_params = ('ampli',)
     func.__name__ = f"pseudovoigt_ka12_{cathode}"
     func.__doc__ = f"PseudoVoigt Bi-chromatic related to '{cathode}' cathode"
     return func
@@ -0,0 +1,388 @@
+"""
+Module related to the HDF5 ('.h5') project format
+
+notes:
+A project file contains:
+ - 'fnames': the spectra fnames (spectra AND spectra maps),
+ - 'templates': the spectra models dictionaries (see Spectrum.save()) without their parameters
+   values, stored once as JSON strings and referred to by 'template_index',
+ - 'values' and 'success': the parameters values and the fit success status of each spectrum
+   (columnar tables),
+ - 'spectra': the raw data of the spectra (if saved), concatenated in chunked and compressed
+   datasets,
+ - 'maps': the spectra maps, with their arrays (if saved) in chunked and compressed datasets.
+
+At the loading, the maps intensities are read on demand (see LazyDataset), only the selected
+spectra are created and the maps spectra are created when accessed (see SpectraMap), from the
+models templates and the fit results.
+"""
+import os
+import json
+import contextlib
+import numpy as np
+import h5py
+
+from fitspy import VERSION
+from fitspy.core.spectrum import Spectrum
+from fitspy.core.spectra import Spectra
+from fitspy.core.spectra_map import SpectraMap
+from fitspy.core.fit_plan import FitPlan
+from fitspy.core.fit_results import CompactResult
+from fitspy.core.utils import int_keys
+
+FORMAT = 'fitspy-project'
+COMPRESSION = {'compression': 'gzip', 'compression_opts': 4, 'shuffle': True}
+CHUNK_SIZE = 2 ** 16  # number of values per chunk
+SUCCESS_CODES = {None: -1, False: 0, True: 1}
+
+
+class LazyDataset:
+    """
+    Class dedicated to a HDF5 dataset read on demand, used as a numpy array
+
+    Attributes
+    ----------
+    fname: str
+        Pathname of the HDF5 file
+    path: str
+        Path of the dataset in the HDF5 file
+    shape: tuple of ints
+        Dataset shape
+    dtype: numpy.dtype
+        Dataset type
+    """
+
+    def __init__(self, fname, path):
+        self.fname = fname
+        self.path = path
+        with self.open() as dataset:
+            self.shape = dataset.shape
+            self.dtype = dataset.dtype
+
+    @contextlib.contextmanager
+    def open(self):
+        """ Return the h5py.Dataset, the file being opened for the duration of the context (so
+            that the file is not kept open between two reads) """
+        with h5py.File(self.fname, 'r') as h5:
+            yield h5[self.path]
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        with self.open() as dataset:
+            return np.asarray(dataset[()], dtype=dtype)
+
+    def __getitem__(self, key):
+        with self.open() as dataset:
+            if isinstance(key, (list, np.ndarray)):
+                # h5py requires increasing indices
+                inds, inverse = np.unique(np.asarray(key), return_inverse=True)
+                return dataset[inds.tolist()][inverse.ravel()]
+            return dataset[key]
+
+
+def strip_values(model_dict):
+    """
+    Return the 'model_dict' copy with the models parameters values set to None, the values and
+    their location as (models key, model index, parameter name)
+    """
+    template = dict(model_dict)
+    values, paths = [], []
+
+    def strip(hints, path):
+        hints_ = {}
+        for name, hint in hints.items():
+            hint = dict(hint)
+            value = hint.get('value')
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                values.append(float(value))
+                paths.append(path + (name,))
+                hint['value'] = None
+            hints_[name] = hint
+        return hints_
+
+    if 'peak_models' in model_dict:
+        template['peak_models'] = {
+            i: {name: strip(hints, ('peak_models', k)) for name, hints in dict_model.items()}
+            for k, (i, dict_model) in enumerate(model_dict['peak_models'].items())}
+    if model_dict.get('bkg_models'):
+        template['bkg_models'] = [{**dict_model, 'param_hints': strip(dict_model['param_hints'],
+                                                                      ('bkg_models', k))}
+                                  for k, dict_model in enumerate(model_dict['bkg_models'])]
+    if model_dict.get('bkg_model'):
+        template['bkg_model'] = {name: strip(hints, ('bkg_model', 0))
+                                 for name, hints in model_dict['bkg_model'].items()}
+
+    return template, values, paths
+
+
+def fill_values(template, values):
+    """ Return the 'template' copy with the models parameters values issued from 'values' """
+    model_dict = json.loads(json.dumps(template), object_hook=int_keys)
+    values = iter(values)
+
+    def fill(hints):
+        for hint in hints.values():
+            if 'value' in hint and hint['value'] is None:
+                hint['value'] = next(values)
+
+    for dict_model in model_dict.get('peak_models', {}).values():
+        for hints in dict_model.values():
+            fill(hints)
+    for dict_model in model_dict.get('bkg_models') or []:
+        fill(dict_model['param_hints'])
+    for hints in (model_dict.get('bkg_model') or {}).values():
+        fill(hints)
+
+    return model_dict
+
+
+def save_h5(spectra, fname, fnames=None, save_data=False):
+    """
+    Save 'spectra' in a HDF5 project file
+
+    Parameters
+    ----------
+    spectra: Spectra object
+        Spectra (and spectra maps) to save
+    fname: str
+        Pathname of the '.h5' file
+    fnames: list of str, optional
+        List of the spectrum 'fnames' to save. If None, consider all the spectra
+    save_data: bool, optional
+        Activation keyword to save the spectra and spectra maps data
+    """
+    if fnames is None:
+        fnames = spectra.fnames
+    fnames = [os.path.normpath(fname) for fname in fnames]
+
+    templates = {}
+    template_index, values, success = [], [], []
+    data = []
+    with contextlib.ExitStack() as stack:
+        for spectra_map in spectra.spectra_maps:
+            stack.enter_context(spectra_map.transient())
+        for fname_ in fnames:
+            spectrum, parent = spectra.get_objects(fname_)
+            model_dict = spectrum.save()
+            model_dict['baseline'].pop('y_eval')
+            model_dict.pop('fname')
+            success.append(SUCCESS_CODES[model_dict.pop('result_fit_success', None)])
+            template, values_, _ = strip_values(model_dict)
+            key = json.dumps(template)
+            template_index.append(templates.setdefault(key, len(templates)))
+            values.append(values_)
+            if save_data and parent is spectra:
+                data.append((spectrum.x0, spectrum.y0, spectrum.weights0))
+            else:
+                data.append(None)
+
+    nvalues = max([len(values_) for values_ in values] + [0])
+    arr_values = np.full((len(fnames), nvalues), np.nan)
+    for i, values_ in enumerate(values):
+        arr_values[i, :len(values_)] = values_
+
+    # maps intensities read on demand from the file to overwrite
+    lazy_maps = [spectra_map for spectra_map in spectra.spectra_maps
+                 if isinstance(spectra_map.intensity, LazyDataset) and os.path.isfile(fname)
+                 and os.path.samefile(spectra_map.intensity.fname, fname)]
+    if not save_data:
+        for spectra_map in lazy_maps:
+            spectra_map.intensity = np.asarray(spectra_map.intensity)
+
+    # the file is written aside and then moved, the lazy datasets being read until the end
+    fname_tmp = f"{fname}.{os.getpid()}.tmp"
+    try:
+        with h5py.File(fname_tmp, 'w') as h5:
+            h5.attrs['format'] = FORMAT
+            h5.attrs['version'] = VERSION
+            h5.create_dataset('fnames', data=np.array(fnames, dtype=h5py.string_dtype()))
+            h5.create_dataset('templates',
+                              data=np.array(list(templates), dtype=h5py.string_dtype()))
+            h5.create_dataset('template_index', data=np.array(template_index, dtype=int))
+            h5.create_dataset('success', data=np.array(success, dtype=np.int8))
+            create_dataset(h5, 'values', arr_values)
+
+            # spectra data (concatenated)
+            group = h5.create_group('spectra')
+            sizes = [len(item[0]) if item is not None else 0 for item in data]
+            offsets = np.cumsum([0] + sizes)
+            group.create_dataset('offsets', data=offsets)
+            group.create_dataset('has_data', data=np.array([item is not None for item in data]))
+            items = [item for item in data if item is not None]
+            for k, name in enumerate(['x0', 'y0', 'weights0']):
+                arrays = [item[k] if item[k] is not None else np.full(len(item[0]), np.nan)
+                          for item in items]
+                create_dataset(group, name, np.concatenate(arrays) if arrays else np.zeros(0))
+
+            # spectra maps
+            group = h5.create_group('maps')
+            for k, spectra_map in enumerate(spectra.spectra_maps):
+                group_map = group.create_group(str(k))
+                group_map.attrs['fname'] = spectra_map.fname
+                if save_data:
+                    group_map.create_dataset('x0', data=spectra_map.x0)
+                    group_map.create_dataset('x_map', data=spectra_map.xy_map[0])
+                    group_map.create_dataset('y_map', data=spectra_map.xy_map[1])
+                    group_map.create_dataset('inds_flat', data=spectra_map.inds_flat)
+                    group_map.create_dataset('arr', data=spectra_map.arr)
+                    copy_dataset(group_map, 'intensity', spectra_map.intensity)
+        os.replace(fname_tmp, fname)
+    finally:
+        if os.path.isfile(fname_tmp):
+            os.remove(fname_tmp)
+
+    if save_data:
+        for spectra_map in lazy_maps:
+            k = spectra.spectra_maps.index(spectra_map)
+            spectra_map.intensity.path = f"/maps/{k}/intensity"
+
+
+def create_dataset(group, name, arr):
+    """ Create a chunked and compressed dataset in 'group' """
+    chunks = None
+    if arr.size > 0:
+        nrows = max(1, CHUNK_SIZE // max(1, int(np.prod(arr.shape[1:]))))
+        chunks = (min(nrows, arr.shape[0]),) + arr.shape[1:]
+    group.create_dataset(name, data=arr, chunks=chunks, **(COMPRESSION if chunks else {}))
+
+
+def copy_dataset(group, name, arr):
+    """ Copy 'arr' in 'group', a LazyDataset being copied through h5py (without reading it) """
+    if isinstance(arr, LazyDataset):
+        with arr.open() as dataset:
+            group.copy(dataset, name)
+    else:
+        create_dataset(group, name, np.asarray(arr))
+
+
+def load_h5(fname, fnames=None, preprocess=False):
+    """
+    Return a Spectra object from a HDF5 project file
+
+    Parameters
+    ----------
+    fname: str
+        Pathname of the '.h5' file
+    fnames: list of str, optional
+        List of the spectrum 'fnames' to load. If None, consider all the spectra
+    preprocess: bool, optional
+        Activation key to preprocess the created spectra
+    """
+    spectra = Spectra()
+    with h5py.File(fname, 'r') as h5:
+        if h5.attrs.get('format') != FORMAT:
+            raise IOError(f"{fname} is not a fitspy project file")
+
+        fnames_all = list(h5['fnames'].asstr()[()])
+        if fnames is None:
+            rows = list(range(len(fnames_all)))
+        else:
+            index = {fname_: i for i, fname_ in enumerate(fnames_all)}
+            fnames = [os.path.normpath(fname_) for fname_ in fnames]
+            missing = [fname_ for fname_ in fnames if fname_ not in index]
+            if missing:
+                raise KeyError(f"{len(missing)} fnames not found in {fname}: {missing}")
+            rows = sorted(index[fname_] for fname_ in fnames)
+
+        templates = [json.loads(template, object_hook=int_keys)
+                     for template in h5['templates'].asstr()[()]]
+        template_index = h5['template_index'][rows]
+        success = h5['success'][rows]
+        values = h5['values'][rows] if len(rows) > 0 else np.zeros((0, 0))
+
+        # spectra maps
+        for group in h5['maps'].values():
+            fname_map = group.attrs['fname']
+            if 'intensity' in group:
+                spectra_map = SpectraMap()
+                spectra_map.set_arrays(fname_map, group['x0'][()],
+                                       (group['x_map'][()].tolist(), group['y_map'][()].tolist()),
+                                       group['inds_flat'][()],
+                                       LazyDataset(fname, group['intensity'].name),
+                                       arr=group['arr'][()])
+                spectra.spectra_maps.append(spectra_map)
+            elif os.path.isfile(fname_map):
+                spectra.spectra_maps.append(SpectraMap.load_map(fname_map))
+            else:
+                print(f'ERROR: unable to reload data related to {os.path.basename(fname_map)}')
+
+        # spectra (with their data if saved)
+        offsets = h5['spectra/offsets'][()]
+        has_data = h5['spectra/has_data'][()]
+        datasets = [h5['spectra'][name] for name in ['x0', 'y0', 'weights0']]
+        for i in rows:
+            if "  X=" not in fnames_all[i]:
+                spectrum = Spectrum()
+                spectrum.fname = fnames_all[i]
+                if has_data[i]:
+                    inds = slice(offsets[i] - offsets[0], offsets[i + 1] - offsets[0])
+                    spectrum.x0, spectrum.y0, weights0 = [dset[inds] for dset in datasets]
+                    spectrum.weights0 = None if np.all(np.isnan(weights0)) else weights0
+                spectra.append(spectrum)
+
+    plans = {}
+    for i, ind, success_, values_ in zip(rows, template_index, success, values):
+        fname_ = fnames_all[i]
+        if ind not in plans:
+            plans[ind] = make_plan(templates[ind], values_)
+        fit_plan, paths, values_ref = plans[ind]
+        values_ = values_[:len(paths)]
+
+        spectra_map = spectra.get_map(fname_)
+        if "  X=" in fname_ and (spectra_map is None or spectra_map.pixel_id(fname_) is None):
+            continue  # map not reloaded
+        if spectra_map is not None and not spectra_map.is_materialized(fname_):
+            pid = spectra_map.pixel_id(fname_)
+            if success_ >= 0 or np.array_equal(values_, values_ref, equal_nan=True):
+                # map spectra created on demand from the template and the fit results
+                if fit_plan not in spectra_map.templates:
+                    spectra_map.templates.append(fit_plan)
+                spectra_map.template_inds[pid] = spectra_map.templates.index(fit_plan)
+                if success_ >= 0:
+                    record = make_record(fit_plan, paths, values_, bool(success_))
+                    spectra_map.results.store([fname_], [record])
+                continue
+
+        spectrum, parent = spectra.get_objects(fname_)
+        fit_plan.set_attributes(spectrum)
+        set_values(spectrum, paths, values_)
+        if success_ >= 0:
+            record = make_record(fit_plan, paths, values_, bool(success_))
+            parent.results.store([fname_], [record])
+            spectrum.result_fit = CompactResult(parent.results, spectrum)
+        if preprocess:
+            spectrum.preprocess()
+
+    return spectra
+
+
+def make_plan(template, values):
+    """ Return the FitPlan related to 'template' (with 'values'), the values location and the
+        values """
+    _, _, paths = strip_values(fill_values(template, values))
+    values = np.asarray(values[:len(paths)])
+    return FitPlan(fill_values(template, values.tolist())), paths, values
+
+
+def get_models(obj, key):
+    """ Return the models of 'obj' (Spectrum or FitPlan) related to the 'key' models """
+    return obj.peak_models if key == 'peak_models' else obj.bkg_models
+
+
+def set_values(spectrum, paths, values):
+    """ Set the models parameters 'values' located at 'paths' to 'spectrum' """
+    for (key, k, name), value in zip(paths, values):
+        if key != 'bkg_model':  # duplicated 'bkg_models' first item
+            get_models(spectrum, key)[k].param_hints[name]['value'] = float(value)
+
+
+def make_record(fit_plan, paths, values, success):
+    """ Return the fit result record (see fitspy.core.fit_results.make_record()) """
+    values_dict = {}
+    for (key, k, name), value in zip(paths, values):
+        if key != 'bkg_model':
+            values_dict[get_models(fit_plan, key)[k].prefix + name] = float(value)
+    return (values_dict, {}, np.nan, np.nan, 0, 0, 0, success,
+            fit_plan.model_dict['fit_params']['method'])
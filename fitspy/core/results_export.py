@@ -0,0 +1,216 @@
+"""
+Module related to the bulk export of the fit results
+
+notes:
+Instead of 3 files per spectrum (see Spectrum.save_profiles(), Spectrum.save_params() and
+Spectrum.save_stats()), the bulk export writes for the whole spectra selection:
+ - 'params.csv': the peak models parameters (one row per peak model),
+ - 'stats.csv': the fit statistics (one row per spectrum), issued from the fit results records
+   without rendering the lmfit fit reports,
+ - 'profiles.h5': the profiles (one row per spectrum, NaN-padded), the peak models profiles
+   being gathered in a 3D 'peaks' dataset with their 'peak_labels'.
+The spectra are handled by chunks (the map spectra being released after each chunk) and the
+spectra sharing the same support and the same models structure are evaluated in a vectorized
+form.
+"""
+import contextlib
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import h5py
+from lmfit.models import ExpressionModel
+
+from fitspy import PEAK_PARAMS
+from fitspy.core.spectrum import empty_expr
+from fitspy.core.fit_results import make_record, STATS_FIELDS
+from fitspy.core.project_h5 import COMPRESSION
+
+CHUNK_SIZE = 512  # number of spectra handled at once
+PROFILES_KEYS = ['x', 'y_raw', 'y_subtract', 'y_fit', 'baseline', 'bkg']
+
+
+def save_bulk_results(spectra, dirname_res, fnames):
+    """
+    Save the 'fnames' spectra results in 'params.csv', 'stats.csv' and 'profiles.h5'
+
+    Parameters
+    ----------
+    spectra: Spectra object
+        Spectra (and spectra maps) to handle
+    dirname_res: pathlib.Path object
+        Dirname where to save the files
+    fnames: list of str
+        List of the spectrum 'fnames' to save. The spectra without fit result are ignored
+    """
+    params, stats = [], []
+    row = 0
+    with h5py.File(Path(dirname_res) / "profiles.h5", 'w') as h5:
+        for k in range(0, len(fnames), CHUNK_SIZE):
+            with contextlib.ExitStack() as stack:
+                for spectra_map in spectra.spectra_maps:
+                    stack.enter_context(spectra_map.transient())
+                spectra_chunk = [spectra.get_objects(fname)[0]
+                                 for fname in fnames[k:k + CHUNK_SIZE]]
+                spectra_chunk = [spectrum for spectrum in spectra_chunk
+                                 if hasattr(spectrum.result_fit, "success")]
+                params += get_params(spectra_chunk)
+                stats += get_stats(spectra_chunk)
+                spectra_chunk = [spectrum for spectrum in spectra_chunk if spectrum.x is not None]
+                write_profiles(h5, row, spectra_chunk)
+                row += len(spectra_chunk)
+
+    pd.DataFrame(params).to_csv(Path(dirname_res) / "params.csv", sep=';', index=False)
+    pd.DataFrame(stats).to_csv(Path(dirname_res) / "stats.csv", sep=';', index=False)
+
+
+def get_infos(spectrum):
+    """ Return the name and the map coordinates (if any) related to 'spectrum' """
+    from fitspy.core.spectra_map import SpectraMap
+
+    x, y = SpectraMap.spectrum_coords(spectrum) if "  X=" in spectrum.fname else (None,) * 2
+    return {'name': Path(spectrum.fname).name, 'x': x, 'y': y}
+
+
+def get_params(spectra):
+    """ Return the peak models parameters rows related to 'spectra' """
+    rows = []
+    for spectrum in spectra:
+        infos = get_infos(spectrum)
+        for label, peak_model in zip(spectrum.peak_labels, spectrum.peak_models):
+            params = peak_model.param_hints
+            row = {**infos, 'label': label, 'model': spectrum.get_model_name(peak_model)}
+            for key in PEAK_PARAMS:
+                row[key] = params[key]['value'] if key in params else None
+            rows.append(row)
+    return rows
+
+
+def get_stats(spectra):
+    """ Return the fit statistics rows related to 'spectra' """
+    rows = []
+    for spectrum in spectra:
+        record = make_record(spectrum)
+        stats = {name: value for (name, _), value in zip(STATS_FIELDS, record[2:])}
+        rows.append({**get_infos(spectrum), **stats})
+    return rows
+
+
+def write_profiles(h5, row, spectra):
+    """ Write the 'spectra' profiles in the 'h5' file from the 'row' index """
+    if len(spectra) == 0:
+        return
+
+    nmax = max(len(spectrum.x) for spectrum in spectra)
+    npeaks = max(len(spectrum.peak_models) for spectrum in spectra)
+    profiles = {key: np.full((len(spectra), nmax), np.nan) for key in PROFILES_KEYS}
+    peaks = np.full((len(spectra), npeaks, nmax), np.nan)
+    labels = np.full((len(spectra), npeaks), '', dtype=object)
+    for inds, group in group_spectra(spectra).items():
+        inds = list(inds)
+        profiles_group, peaks_group = eval_profiles(group)
+        n = len(group[0].x)
+        for key in PROFILES_KEYS:
+            profiles[key][inds, :n] = profiles_group[key]
+        peaks[inds, :peaks_group.shape[1], :n] = peaks_group
+        for i, spectrum in zip(inds, group):
+            for j in range(len(spectrum.peak_models)):
+                labels[i, j] = spectrum.get_peak_label(j)
+
+    fnames = np.array([spectrum.fname for spectrum in spectra], dtype=object)
+    write_rows(h5, 'fnames', row, fnames, dtype=h5py.string_dtype())
+    for key in PROFILES_KEYS:
+        write_rows(h5, key, row, profiles[key])
+    write_rows(h5, 'peaks', row, peaks)
+    write_rows(h5, 'peak_labels', row, labels, dtype=h5py.string_dtype())
+
+
+def write_rows(h5, name, row, arr, dtype=float):
+    """ Write 'arr' in the 'name' dataset from the 'row' index, the dataset being created or
+        enlarged if needed (with NaN or '' as fill value) """
+    if name not in h5:
+        chunks = (64,) + tuple(min(max(1, size), 1024) for size in arr.shape[1:])
+        compression = COMPRESSION if dtype is float else {}
+        h5.create_dataset(name, shape=(0,) + arr.shape[1:], maxshape=(None,) * arr.ndim,
+                          dtype=dtype, chunks=chunks, fillvalue=np.nan if dtype is float else '',
+                          **compression)
+    dset = h5[name]
+    shape = (row + len(arr),) + tuple(max(n, m) for n, m in zip(dset.shape[1:], arr.shape[1:]))
+    if shape != dset.shape:
+        dset.resize(shape)
+    dset[(slice(row, row + len(arr)),) + tuple(slice(0, n) for n in arr.shape[1:])] = arr
+
+
+def get_signature(spectrum):
+    """ Return the key identifying the spectra that can be evaluated together """
+    models = []
+    for model in spectrum.peak_models + spectrum.bkg_models:
+        hints = model.param_hints
+        if isinstance(model, ExpressionModel) or \
+                any('value' not in hints.get(name[len(model.prefix):], {})
+                    for name in model.param_names):
+            return id(spectrum)  # evaluated alone
+        models.append((model.func, model.prefix, tuple(model.param_names),
+                       repr(sorted(model.opts.items()))))
+    return (len(spectrum.peak_models), tuple(models), spectrum.baseline.is_subtracted,
+            spectrum.x.tobytes())
+
+
+def group_spectra(spectra):
+    """ Return the spectra grouped by signature (see get_signature()) with their indices """
+    groups = {}
+    for i, spectrum in enumerate(spectra):
+        groups.setdefault(get_signature(spectrum), []).append(i)
+    return {tuple(inds): [spectra[i] for i in inds] for inds in groups.values()}
+
+
+def eval_models(models, x):
+    """ Return the profiles (nspectra, nmodels, len(x)) of the models sharing the same
+        structure ('models[i]' being the models of the i-th spectrum) """
+    profiles = np.zeros((len(models), len(models[0]), len(x)))
+    for j, model in enumerate(models[0]):
+        kwargs = dict(model.opts)
+        for name in model.param_names:
+            root_name = name[len(model.prefix):]
+            kwargs[root_name] = np.array([[models_[j].param_hints[root_name]['value']]
+                                          for models_ in models], dtype=float)
+        kwargs[model.independent_vars[0]] = x[np.newaxis, :]
+        profiles[:, j, :] = model.func(**kwargs)
+    return profiles
+
+
+def eval_profiles(spectra):
+    """ Return the profiles (see Spectrum.get_profiles()) of spectra sharing the same
+        signature (see get_signature()) as 2D arrays, and the peak models profiles as a 3D
+        array """
+    if len(spectra) > 1:
+        try:
+            x = spectra[0].x
+            peaks = eval_models([spectrum.peak_models for spectrum in spectra], x)
+            if len(spectra[0].bkg_models) > 0:
+                bkg = eval_models([spectrum.bkg_models for spectrum in spectra], x).sum(axis=1)
+            else:
+                bkg = np.zeros((len(spectra), len(x)))
+            y_subtract = np.array([spectrum.y for spectrum in spectra])
+            baseline = np.array([np.zeros_like(x) if spectrum.baseline.y_eval is None else
+                                 spectrum.baseline.y_eval for spectrum in spectra])
+            if spectra[0].baseline.is_subtracted:
+                y_raw = y_subtract + baseline
+            else:
+                y_raw = y_subtract + bkg
+            profiles = {'x': np.tile(x, (len(spectra), 1)), 'y_raw': y_raw,
+                        'y_subtract': y_subtract, 'y_fit': peaks.sum(axis=1),
+                        'baseline': baseline, 'bkg': bkg}
+            return profiles, peaks
+        except (TypeError, ValueError):
+            pass  # models not supporting the broadcasting: evaluated spectrum per spectrum
+
+    profiles = {key: [] for key in PROFILES_KEYS}
+    peaks = np.zeros((len(spectra), len(spectra[0].peak_models), len(spectra[0].x)))
+    for i, spectrum in enumerate(spectra):
+        profiles_ = spectrum.get_profiles()
+        for key in PROFILES_KEYS:
+            profiles[key].append(profiles_[key])
+        for j, peak_model in enumerate(spectrum.peak_models):
+            with empty_expr(peak_model):
+                peaks[i, j] = peak_model.eval(peak_model.make_params(), x=spectrum.x)
+    return {key: np.array(val) for key, val in profiles.items()}, peaks
@@ -5,25 +5,40 @@ Class dedicated to handle 'Spectrum' objects contained in a list managed by
 import os
 import sys
 import time
+import contextlib
 from pathlib import Path
 from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
 from multiprocessing import Queue
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 
 from fitspy.core.spectrum import Spectrum
+from fitspy.core.fit_plan import FitPlan
+from fitspy.core.batch_fit import BatchFit, check_fit_params
 from fitspy.core.utils import fileparts, save_to_json, load_from_json, compress, decompress
-from fitspy.core.utils_mp import fit_mp
+from fitspy.core.utils_mp import fit_mp, dumps_plot, plot_chunk, FigureRenderer, WORKER_POOL
+from fitspy.core.warm_start import map_schedule, sequence_schedule, init_from_seed
+from fitspy.core.fit_results import FitResults, CompactResult, make_record
+from fitspy.core.fit_handle import FitHandle
+from fitspy.core.fit_journal import FitJournal
+from fitspy.core.fit_cache import make_key
 
 
 class Spectra(list):
     """
     Class dedicated to handle 'Spectrum' objects contained in a list
 
+    The spectra related to spectra AND spectra maps ('all'), their fnames and the index used to
+    retrieve a spectrum from its fname are cached and rebuilt when the list or the spectra maps
+    contents change (the list mutators being overridden to increment the contents version).
+    When spectra fnames are modified in place, invalidate() has to be called.
+
     Attributes
     ----------
     spectra_maps: list of SpectraMap objects
+    results: FitResults object
+        Compact storage of the fit results related to the spectra (see apply_model())
     pbar_index: int
         Index related to the Progress bar during the fit processing
 
@@ -34,63 +49,206 @@ class Spectra(list):
         List of spectra pathname
     """
 
+    _version = 0
+    _cache = None
+
     def __init__(self, spectra_list=None, fnames=None):
 
         if spectra_list is not None:
             super().__init__(spectra_list)
 
-        if fnames is not None:
-            for fname in fnames:
-                spectrum = Spectrum()
-                spectrum.load_profile(fname)
-                self.append(spectrum)
-
         self.spectra_maps = []
+        self.results = FitResults()
         self.pbar_index = 0
 
+        if fnames is not None:
+            self.load_profiles(fnames, keep_failures=True)
+
+    def load_profiles(self, fnames, preprocess=False, max_workers=None, progress=None,
+                      keep_failures=False):
+        """
+        Load the 'fnames' 1D profiles concurrently and append the related spectra in the
+        'fnames' order
+
+        Parameters
+        ----------
+        fnames: list of str
+            Pathnames of the 1D profiles to load
+        preprocess: bool, optional
+            Activation key to preprocess the spectra once loaded
+        max_workers: int, optional
+            Number of threads used to read the files.
+            If None, use the concurrent.futures.ThreadPoolExecutor default value
+        progress: callable, optional
+            Function called as progress(count, total) each time a file is handled
+        keep_failures: bool, optional
+            Activation key to append the spectra that failed to be loaded too
+
+        Returns
+        -------
+        failures: dict
+            Error messages related to the fnames that failed to be loaded
+        """
+        fnames = list(fnames)
+        failures = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(load_profile, fnames, [preprocess] * len(fnames))
+            for count, (fname, (spectrum, error)) in enumerate(zip(fnames, results), 1):
+                if error is not None:
+                    failures[fname] = error
+                if error is None or keep_failures:
+                    self.append(spectrum)
+                if progress is not None:
+                    progress(count, len(fnames))
+        return failures
+
     @property
     def fnames(self):
         """ Return all the fnames related to spectra AND spectra maps """
-        return [os.path.normpath(spectrum.fname) for spectrum in self.all]
+        return list(self.get_cache()['fnames'])
 
     @property
     def all(self):
-        """ Return all the spectra related to spectra AND spectra maps """
-        spectra_all = []
-        spectra_all.extend(self)
-        for spectra_map in self.spectra_maps:
-            spectra_all.extend(spectra_map)
-        return spectra_all
+        """ Return all the spectra related to spectra AND spectra maps (the spectra maps
+            spectra being all created, see SpectraMap). To be avoided when the fnames or a
+            few spectra only are required (see 'fnames' and get_objects()) """
+        cache = self.get_cache()
+        if cache['all'] is None:
+            cache['all'] = list(self)
+            for spectra_map in getattr(self, 'spectra_maps', []):
+                cache['all'].extend(spectra_map)
+        return list(cache['all'])
+
+    def invalidate(self):
+        """ Invalidate the cached spectra, fnames and index """
+        self._version += 1
+
+    def append(self, spectrum):
+        self.invalidate()
+        super().append(spectrum)
+
+    def extend(self, spectra):
+        self.invalidate()
+        super().extend(spectra)
+
+    def insert(self, index, spectrum):
+        self.invalidate()
+        super().insert(index, spectrum)
+
+    def remove(self, spectrum):
+        self.invalidate()
+        super().remove(spectrum)
+
+    def pop(self, index=-1):
+        self.invalidate()
+        return super().pop(index)
+
+    def clear(self):
+        self.invalidate()
+        super().clear()
+
+    def sort(self, *args, **kwargs):
+        self.invalidate()
+        super().sort(*args, **kwargs)
+
+    def reverse(self):
+        self.invalidate()
+        super().reverse()
+
+    def __setitem__(self, index, value):
+        self.invalidate()
+        super().__setitem__(index, value)
+
+    def __delitem__(self, index):
+        self.invalidate()
+        super().__delitem__(index)
+
+    def __iadd__(self, spectra):
+        self.invalidate()
+        return super().__iadd__(spectra)
+
+    def __imul__(self, value):
+        self.invalidate()
+        return super().__imul__(value)
+
+    def local_fnames(self):
+        """ Return the fnames related to the spectra of the list (spectra maps excluded) """
+        return [os.path.normpath(spectrum.fname) for spectrum in self]
+
+    def get_cache(self, rebuild=False):
+        """ Return the cache related to spectra AND spectra maps: 'all' spectra (built at the
+            first request), 'fnames' and 'index' (position of the list spectra from their
+            fname) """
+        spectra_maps = getattr(self, 'spectra_maps', [])
+        state = (self._version, tuple((id(spectra_map), spectra_map._version)
+                                      for spectra_map in spectra_maps))
+        # (the spectra maps are kept in the cache so that their ids can not be reused)
+        if rebuild or self._cache is None or self._cache['state'] != state:
+            fnames = self.local_fnames()
+            index = {}
+            for pos, fname in enumerate(fnames):
+                index.setdefault(fname, pos)
+            for spectra_map in spectra_maps:
+                fnames.extend(spectra_map.local_fnames())
+            self._cache = {'state': state, 'maps': list(spectra_maps), 'all': None,
+                           'fnames': fnames, 'index': index}
+        return self._cache
+
+    def get_map(self, fname):
+        """ Return the spectra map related to the normalized 'fname' or None """
+        if "  X=" in fname:
+            fname_map = fname.split("  X=")[0]
+            for spectra_map in getattr(self, 'spectra_maps', []):
+                if spectra_map.fname == fname_map:
+                    return spectra_map
+        return None
+
+    def find(self, fname):
+        """ Return the spectrum and the parent related to the normalized 'fname' or None """
+        spectra_map = self.get_map(fname)
+        if spectra_map is not None:
+            return spectra_map.find(fname)
+        for rebuild in [False, True]:
+            pos = self.get_cache(rebuild=rebuild)['index'].get(fname)
+            # the index is checked in case of fnames modified in place
+            if pos is not None and pos < len(self) and \
+                    os.path.normpath(self[pos].fname) == fname:
+                return self[pos], self
+        return None
 
     def intensity(self):
         """Return the raw intensity array related to spectra AND spectra maps"""
-        # Get all y0 values
-        intensities = [spectrum.y0 for spectrum in self.all]
-        max_len = max(len(y0) for y0 in intensities)
+        # Get all y0 values (by blocks for the spectra maps)
+        intensities = [spectrum.y0[np.newaxis] for spectrum in self]
+        for spectra_map in self.spectra_maps:
+            intensities.append(spectra_map.get_intensity())
+        max_len = max(arr.shape[1] for arr in intensities)
 
         # Pad shorter arrays with NaN to match max length
         padded = [
-            np.pad(y0, (0, max_len - len(y0)),
+            np.pad(arr, ((0, 0), (0, max_len - arr.shape[1])),
                    mode='constant',
-                   constant_values=np.nan) if len(y0) < max_len else y0
-            for y0 in intensities
+                   constant_values=np.nan) if arr.shape[1] < max_len else arr
+            for arr in intensities
         ]
 
-        return np.asarray(padded)
+        return np.vstack(padded)
 
     def get_spectrum(self, fname):
         """ Return spectrum from 'fname' contained in the 'spectra' list only """
         fname = os.path.normpath(fname)
-        fnames = [os.path.normpath(spectrum.fname) for spectrum in self]
-        try:
-            return self[fnames.index(fname)]
-        except:
-            print(f"{fname} not found in the spectra list")
-            return None
+        item = self.find(fname)
+        if item is not None and item[1] is self:
+            return item[0]
+        print(f"{fname} not found in the spectra list")
+        return None
 
     def get_objects(self, fname):
         """ Return spectrum and parent (spectra or spectra map) related to 'fname' """
         fname = os.path.normpath(fname)
+        item = self.find(fname)
+        if item is not None:
+            return item
         if "  X=" in fname:
             fname_map = fname.split("  X=")[0]
             fname_maps = [spectra_map.fname for spectra_map in self.spectra_maps]
@@ -108,8 +266,10 @@ class Spectra(list):
         intensity_ref = sorted_values[nmax]
 
         outliers_limit = coef * intensity_ref
-        for spectrum in self.all:
+        for spectrum in self:
             spectrum.outliers_limit = outliers_limit[:len(spectrum.y0)]
+        for spectra_map in self.spectra_maps:
+            spectra_map.set_outliers_limit(outliers_limit)
 
     def get_results(self, fnames=None):
         """
@@ -130,19 +290,46 @@ class Spectra(list):
         if fnames is None:
             fnames = self.fnames
 
-        results = []
+        # results stored in a compact form (see FitResults) are gathered by columns
+        stored = {}
+        results, inds, infos = [], [], []
         for fname in fnames:
+            # released map spectra are handled without being recreated (see SpectraMap)
+            fname = os.path.normpath(fname)
+            spectra_map = self.get_map(fname)
+            if spectra_map is not None and not spectra_map.is_materialized(fname):
+                if fname in spectra_map.results:
+                    x, y = SpectraMap.fname_coords(fname)
+                    infos.append({'name': Path(fname).name, 'x': x, 'y': y})
+                    store = stored.setdefault(id(spectra_map.results),
+                                              (spectra_map.results, [], []))
+                    store[1].append(fname)
+                    store[2].append(len(infos) - 1)
+                continue
+
             spectrum, _ = self.get_objects(fname)
-            if hasattr(spectrum.result_fit, "success"):
+            result_fit = spectrum.result_fit
+            if hasattr(result_fit, "success"):
                 name = Path(spectrum.fname).name
-                success = spectrum.result_fit.success
                 x, y = SpectraMap.spectrum_coords(spectrum) if "  X=" in str(fname) else (None,) * 2
-                result_fit = spectrum.result_fit
-                res = result_fit.best_values if hasattr(result_fit, 'best_values') else {}
-                res.update({'name': name, 'success': success, 'x': x, 'y': y})
-                results.append(res)
-
-        dfr = pd.DataFrame(results)
+                infos.append({'name': name, 'x': x, 'y': y})
+                store = getattr(result_fit, 'results', None)
+                if isinstance(result_fit, CompactResult) and result_fit.fname in store:
+                    store = stored.setdefault(id(store), (store, [], []))
+                    store[1].append(result_fit.fname)
+                    store[2].append(len(infos) - 1)
+                else:
+                    res = dict(getattr(result_fit, 'best_values', {}))
+                    res['success'] = result_fit.success
+                    results.append(res)
+                    inds.append(len(infos) - 1)
+
+        dfrs = [store.to_dataframe(fnames_store).set_axis(inds_store)
+                for store, fnames_store, inds_store in stored.values()]
+        if len(results) > 0:
+            dfrs.append(pd.DataFrame(results, index=inds))
+        dfr = pd.concat(dfrs).sort_index() if len(dfrs) > 0 else pd.DataFrame()
+        dfr = pd.concat([dfr, pd.DataFrame(infos)], axis=1)
 
         # reindex columns according to the parameters names
         dfr = dfr.reindex(sorted(dfr.columns), axis=1)
@@ -157,7 +344,7 @@ class Spectra(list):
 
         return dfr
 
-    def save_results(self, dirname_res, fnames=None):
+    def save_results(self, dirname_res, fnames=None, layout='files'):
         """
         Save spectra results (peaks parameters and statistics) in .csv files
 
@@ -168,6 +355,10 @@ class Spectra(list):
         fnames: list of str, optional
             List of the spectrum 'fnames' to save. If None, consider all the
             spectrum contained in the 'spectra' list
+        layout: str, optional
+            'files' to save the profiles, the parameters and the statistics of each spectrum
+            in dedicated files, 'bulk' to save them for all the spectra in 'profiles.h5',
+            'params.csv' and 'stats.csv' (see fitspy.core.results_export)
         """
         dirname_res = Path(dirname_res)
         dirname_res.mkdir(parents=True, exist_ok=True)
@@ -175,17 +366,24 @@ class Spectra(list):
         if fnames is None:
             fnames = self.fnames
 
-        for fname in fnames:
-            spectrum, _ = self.get_objects(fname)
-            if hasattr(spectrum.result_fit, "success"):
-                spectrum.save_profiles(dirname_res)
-                spectrum.save_params(dirname_res)
-                spectrum.save_stats(dirname_res)
+        if layout == 'bulk':
+            from fitspy.core.results_export import save_bulk_results
+            save_bulk_results(self, dirname_res, fnames)
+        elif layout == 'files':
+            for fname in fnames:
+                spectrum, _ = self.get_objects(fname)
+                if hasattr(spectrum.result_fit, "success"):
+                    spectrum.save_profiles(dirname_res)
+                    spectrum.save_params(dirname_res)
+                    spectrum.save_stats(dirname_res)
+        else:
+            raise ValueError(f"layout '{layout}' not in ['files', 'bulk']")
 
         dfr = self.get_results(fnames=fnames)
         dfr.to_csv(dirname_res / "results.csv", sep=';', index=False)
 
-    def save_figures(self, dirname_fig, fnames=None, bounds=None):
+    def save_figures(self, dirname_fig, fnames=None, bounds=None, ncpus=1, chunksize=16,
+                     progress=None):
         """
         Save spectra figures
 
@@ -198,24 +396,45 @@ class Spectra(list):
             spectrum contained in the 'spectra' list
         bounds: tuple of 2 tuples, optional
             Axis limits corresponding to ((xmin, xmax), (ymin, ymax))
+        ncpus: int, optional
+            Number of processes used to render the figures
+        chunksize: int, optional
+            Number of figures sent at once to a process (if ncpus > 1)
+        progress: callable, optional
+            Function called as progress(count, total) each time figures are saved
         """
         dirname_fig = Path(dirname_fig)
         dirname_fig.mkdir(parents=True, exist_ok=True)
 
         if fnames is None:
             fnames = self.fnames
-
-        for fname in fnames:
-            spectrum, _ = self.get_objects(fname)
-            fig, ax = plt.subplots()
-            spectrum.plot(ax, show_peak_models=False)
-            if bounds is not None:
-                ax.set_xlim(bounds[0])
-                ax.set_ylim(bounds[1])
-            _, name, _ = fileparts(fname)
-            fname_fig = dirname_fig / (name + '.png')
-            fig.savefig(fname_fig)
-            plt.close(fig)
+        fnames_fig = [dirname_fig / (fileparts(fname)[1] + '.png') for fname in fnames]
+
+        def get_chunks():
+            # the map spectra created for the figures are released chunk by chunk
+            for k in range(0, len(fnames), chunksize):
+                with contextlib.ExitStack() as stack:
+                    for spectra_map in self.spectra_maps:
+                        stack.enter_context(spectra_map.transient())
+                    spectra = [self.get_objects(fname)[0] for fname in fnames[k:k + chunksize]]
+                    yield list(zip(spectra, fnames_fig[k:k + chunksize]))
+
+        count = 0
+        if ncpus > 1:
+            args = (([(dumps_plot(spectrum), fname_fig) for spectrum, fname_fig in items], bounds)
+                    for items in get_chunks())
+            for ncount in WORKER_POOL.imap_unordered(plot_chunk, args, ncpus):
+                count += ncount
+                if progress is not None:
+                    progress(count, len(fnames))
+        else:
+            renderer = FigureRenderer()
+            for items in get_chunks():
+                for spectrum, fname_fig in items:
+                    renderer.save(spectrum, fname_fig, bounds=bounds)
+                    count += 1
+                    if progress is not None:
+                        progress(count, len(fnames))
 
     @staticmethod
     def load_model(fname_json, ind=0):
@@ -239,7 +458,9 @@ class Spectra(list):
         model_dict = load_from_json(fname_json)[ind]
         return model_dict
 
-    def apply_model(self, model, fnames=None, ncpus=1, show_progressbar=True):
+    def apply_model(self, model, fnames=None, ncpus=1, show_progressbar=True, solver='lmfit',
+                    warm_start=None, checkpoint=None, resume=False, cache=None,
+                    bypass_cache=False):
         """
         Apply 'model' to all or part of the spectra
 
@@ -256,23 +477,200 @@ class Spectra(list):
             Number of CPU to use during the fit processing
         show_progressbar: bool, optional
             Activation key to show the progress bar
+        solver: str, optional
+            Solver used for the fit: 'lmfit' (default) to fit the spectra one by one with lmfit or
+            'batch' to fit the spectra sharing the same support all at once with the vectorized
+            Levenberg-Marquardt engine (see fitspy.core.batch_fit). The spectra (or models) that
+            can not be handled by the 'batch' solver are fitted with lmfit.
+            A ValueError is raised with the 'batch' solver if the model fit parameters are not
+            related to the 'leastsq' method or to a composite model fit (independent_models).
+        warm_start: str, optional
+            Scheduling mode used to initialize each spectrum from an already fitted one:
+            'serpentine' or 'hilbert' to walk the spectra maps according to the related
+            space-filling curve, each map spectrum being initialized from its nearest fitted
+            neighbor. The other spectra are handled as a sequence, each spectrum being
+            initialized from the previous one. With multiprocessing, each worker fits
+            contiguous tiles of the scheduled spectra.
+            If None (default), all the spectra are initialized from 'model'.
+            Not used with the 'batch' solver.
+        checkpoint: str or pathlib.Path, optional
+            Dirname of the journal where the fit results are appended as soon as the spectra
+            are fitted (see fitspy.core.fit_journal)
+        resume: bool, optional
+            Activation key to restore from the 'checkpoint' journal the spectra already fitted
+            with the same model and the same raw data, the other spectra being fitted
+        cache: FitCache object, optional
+            Cache (see fitspy.core.fit_cache) from which the fit results are restored for the
+            spectra already fitted with the same raw data, preprocessing, models and fit
+            parameters. The other fit results are stored in the cache.
+            Not used with 'warm_start'.
+        bypass_cache: bool, optional
+            Activation key to ignore the cached fit results (the new fit results being stored
+            in the cache)
         """
+        if fnames is None:
+            fnames = self.fnames
+
+        # migration, composite model and parameters creation done once for all the spectra
+        model_dict = Spectra.get_model_dict(model)
+        fit_plan = FitPlan(model_dict)
+        if solver == 'batch':
+            check_fit_params(fit_plan.model_dict.get('fit_params', {}))
+
+        kwargs = {'cache': cache, 'bypass_cache': bypass_cache}
+        if checkpoint is None:
+            self._run_fit_plan(fit_plan, fnames, ncpus, show_progressbar, solver, warm_start,
+                               **kwargs)
+            return
+
+        with FitJournal(checkpoint, model_dict) as journal:
+            if resume:
+                journal.load()
+                kwargs['get_record'] = journal.get_record
+            self._run_fit_plan(fit_plan, fnames, ncpus, show_progressbar, solver, warm_start,
+                               callback=journal.write, **kwargs)
+
+    def restore_fits(self, fit_plan, fnames, get_record):
+        """
+        Restore the fit results of the 'fnames' spectra from records
+
+        Parameters
+        ----------
+        fit_plan: FitPlan object
+            Model applied to the spectra
+        fnames: list of str
+            List of the spectrum.fname to handle
+        get_record: callable
+            Function called as get_record(spectrum) with the spectrum to fit (model applied and
+            preprocessed) and returning the record (see
+            fitspy.core.fit_results.make_record()) to restore or None
+
+        Returns
+        -------
+        fnames_left: list of str
+            Fnames of the spectra not restored
+        """
+        fnames_left = []
+        for fname in fnames:
+            spectrum, parent = self.get_objects(fname)
+            fit_plan.set_attributes(spectrum)
+            spectrum.fname = fname  # reassign the correct fname
+            spectrum.preprocess()  # state of the spectrum passed to Spectrum.fit()
+            record = get_record(spectrum)
+            if record is None:
+                fnames_left.append(fname)
+                continue
+            spectrum.set_param_values(record[0])
+            parent.results.update([spectrum], records={fname: record})
+        return fnames_left
+
+    def submit_model(self, model, fnames=None, ncpus=1, solver='lmfit', warm_start=None,
+                     callback=None):
+        """
+        Apply 'model' to all or part of the spectra in a background thread and return a handle
+        to follow the fit, the fitted spectra being reported as soon as they are completed
+
+        Parameters
+        ----------
+        model: str or dict
+            See apply_model()
+        fnames: list of str, optional
+            See apply_model()
+        ncpus: int, optional
+            See apply_model()
+        solver: str, optional
+            See apply_model()
+        warm_start: str, optional
+            See apply_model()
+        callback: callable, optional
+            Function called as callback(fname, result) each time a spectrum is fitted (from
+            the fitting thread), 'result' being the spectrum 'result_fit'
+
+        Returns
+        -------
+        handle: FitHandle object
+            Handle yielding the (fname, result) items as the spectra are fitted and providing
+            the counters, cancel() and wait() (see fitspy.core.fit_handle)
+        """
+        if fnames is None:
+            fnames = self.fnames
+
+        fit_plan = FitPlan(Spectra.get_model_dict(model))
+        if solver == 'batch':
+            check_fit_params(fit_plan.model_dict.get('fit_params', {}))
+
+        handle = FitHandle(len(fnames))
+        if callback is not None:
+            handle.add_callback(callback)
+        handle.start(self._run_fit_plan, fit_plan, list(fnames), ncpus, False, solver,
+                     warm_start, handle.report, handle.cancel_event)
+        return handle
+
+    @staticmethod
+    def get_model_dict(model):
+        """ Return the 'model_dict' related to 'model' (see apply_model()) """
         if isinstance(model, (str, Path)) and Path(model).is_file():
-            model_dict = Spectra.load_model(model)
+            return Spectra.load_model(model)
         elif isinstance(model, dict):
-            model_dict = model
+            return model
         else:
             raise IOError("'model' passes to apply_model() is not correct")
 
-        if fnames is None:
-            fnames = self.fnames
-
+    def _run_fit_plan(self, fit_plan, fnames, ncpus, show_progressbar, solver, warm_start,
+                      callback=None, cancel_event=None, get_record=None, cache=None,
+                      bypass_cache=False):
+        """ Apply 'fit_plan' to the 'fnames' spectra (see _apply_fit_plan()), the map spectra
+            created for the fit being released afterwards (see SpectraMap). The spectra with
+            a record returned by 'get_record' or by 'cache' are restored instead of being
+            fitted (see restore_fits() and apply_model()) """
+        with contextlib.ExitStack() as stack:
+            for spectra_map in self.spectra_maps:
+                stack.enter_context(spectra_map.transient(template=fit_plan))
+            if get_record is not None:
+                fnames = self.restore_fits(fit_plan, fnames, get_record)
+
+            keys = {}  # cache keys of the spectra to fit
+            if cache is not None and warm_start is None:
+                options = {'reinit_guess': True}  # as in a Spectrum.fit() call
+                if solver != 'lmfit':
+                    options['solver'] = solver
+
+                def get_cached_record(spectrum):
+                    key = make_key(spectrum, **options)
+                    record = cache.get(key) if not bypass_cache else None
+                    if record is None:
+                        keys[spectrum.fname] = key
+                    return record
+
+                fnames = self.restore_fits(fit_plan, fnames, get_cached_record)
+
+            self._apply_fit_plan(fit_plan, fnames, ncpus, show_progressbar, solver, warm_start,
+                                 callback=callback, cancel_event=cancel_event)
+
+            for fname, key in keys.items():
+                spectrum = self.get_objects(fname)[0]
+                if hasattr(spectrum.result_fit, 'success'):
+                    cache.put(key, make_record(spectrum))
+
+    def _apply_fit_plan(self, fit_plan, fnames, ncpus, show_progressbar, solver, warm_start,
+                        callback=None, cancel_event=None):
+        """ Apply 'fit_plan' to the 'fnames' spectra (see apply_model()).
+            If 'callback' is given, the fit results are stored as soon as available and
+            'callback' is called with the fitted spectra. Once 'cancel_event' is set, the
+            spectra not started yet are not fitted """
         spectra = []
+        parents = []
         for fname in fnames:
-            spectrum, _ = self.get_objects(fname)
-            spectrum.set_attributes(model_dict)
+            spectrum, parent = self.get_objects(fname)
+            fit_plan.set_attributes(spectrum)
             spectrum.fname = fname  # reassign the correct fname
             spectra.append(spectrum)
+            parents.append(parent)
+        spectra_fitted = list(spectra)
+
+        seeds = None
+        if warm_start is not None and solver != 'batch':
+            spectra, seeds = self.warm_start_schedule(spectra, parents, order=warm_start)
 
         self.pbar_index = 0
 
@@ -281,16 +679,93 @@ class Spectra(list):
         thread = Thread(target=self.progressbar, args=args)
         thread.start()
 
-        if ncpus == 1:
+        parents_ = {id(spectrum): parent for spectrum, parent in zip(spectra_fitted, parents)}
+
+        def report(spectra_done, records_done=None):
+            # fit results stored by the parents to be reported as compact results
+            records_done = records_done or [None] * len(spectra_done)
+            for spectrum, record in zip(spectra_done, records_done):
+                records_ = {spectrum.fname: record} if record is not None else None
+                parents_[id(spectrum)].results.update([spectrum], records=records_)
+            callback(spectra_done)
+
+        if solver == 'batch':
             for spectrum in spectra:
                 spectrum.preprocess()
-                spectrum.fit()
+            spectra_left = BatchFit(fit_plan).fit(spectra, queue_incr)
+            if callback is not None:
+                ids_left = {id(spectrum) for spectrum in spectra_left}
+                report([spectrum for spectrum in spectra if id(spectrum) not in ids_left])
+            spectra = spectra_left
+
+        records = {}
+        if ncpus == 1 or len(spectra) == 0:
+            for k, spectrum in enumerate(spectra):
+                if cancel_event is not None and cancel_event.is_set():
+                    queue_incr.put(len(spectra) - k)  # to end the progress bar
+                    break
+                seed = seeds[k] if seeds is not None else None
+                seeded = seed is not None and init_from_seed(spectrum, spectra[seed])
+                spectrum.preprocess()
+                spectrum.fit(reinit_guess=not seeded, fit_plan=fit_plan)
                 queue_incr.put(1)
+                if callback is not None:
+                    report([spectrum])
         else:
-            fit_mp(spectra, ncpus, queue_incr)
+            maps = [parents_[id(spectrum)] for spectrum in spectra]
+            maps = [parent if parent is not self else None for parent in maps]
+            records_mp = fit_mp(spectra, ncpus, queue_incr, fit_plan=fit_plan, seeds=seeds,
+                                callback=report if callback is not None else None,
+                                cancel_event=cancel_event, maps=maps)
+            if callback is None:
+                records = {spectrum.fname: record for spectrum, record in zip(spectra, records_mp)
+                           if record is not None}
 
         thread.join()
 
+        # fit results stored in a compact form by the parents (spectra or spectra maps)
+        for parent in {id(parent): parent for parent in parents}.values():
+            group = [spectrum for spectrum, parent_ in zip(spectra_fitted, parents)
+                     if parent_ is parent]
+            parent.results.update(group, records=records)
+
+    def warm_start_schedule(self, spectra, parents, order='serpentine'):
+        """
+        Return the 'spectra' reordered for a warm-start fitting and the indices of the spectra
+        used to initialize each of them (see fitspy.core.warm_start)
+
+        Parameters
+        ----------
+        spectra: list of Spectrum objects
+            Spectra to schedule
+        parents: list of Spectra or SpectraMap objects
+            Parents (spectra list or spectra map) of each spectrum
+        order: str, optional
+            Space-filling curve used to walk the spectra maps: 'serpentine' or 'hilbert'
+
+        Returns
+        -------
+        spectra_ordered: list of Spectrum objects
+            Spectra grouped by parent, the spectra list being handled as a sequence and the
+            spectra maps being walked along the space-filling curve
+        seeds: list of int or None
+            Indices (in 'spectra_ordered') of the spectra used to initialize each spectrum
+        """
+        groups = {}
+        for spectrum, parent in zip(spectra, parents):
+            groups.setdefault(id(parent), (parent, []))[1].append(spectrum)
+
+        spectra_ordered, seeds = [], []
+        for parent, spectra_ in groups.values():
+            if parent is self:
+                spectra_, seeds_ = sequence_schedule(spectra_)
+            else:
+                spectra_, seeds_ = map_schedule(parent, spectra_, order=order)
+            offset = len(spectra_ordered)
+            seeds += [seed + offset if seed is not None else None for seed in seeds_]
+            spectra_ordered += spectra_
+        return spectra_ordered, seeds
+
     def progressbar(self, queue_incr, ntot, ncpus, show_progressbar):
         """ Progress bar """
         self.pbar_index = 0
@@ -315,7 +790,9 @@ class Spectra(list):
         Parameters
         ----------
         fname_json: str, optional
-            Filename associated to the .json file for the spectra saving
+            Filename associated to the .json file for the spectra saving.
+            With a '.h5' suffix, the spectra are saved in a HDF5 project file
+            (see fitspy.core.project_h5.save_h5()) and nothing is returned
         fnames: list of str, optional
             List of the spectrum 'fnames' to save. If None, consider all the
             spectrum contained in the 'spectra' list
@@ -329,14 +806,22 @@ class Spectra(list):
             is set to True
 
         """
+        if fname_json is not None and Path(fname_json).suffix == '.h5':
+            from fitspy.core.project_h5 import save_h5
+            save_h5(self, fname_json, fnames=fnames, save_data=save_data)
+            return None
+
         if fnames is None:
             fnames = self.fnames
 
         dict_spectra = {}
-        for i, fname in enumerate(fnames):
-            spectrum, parent = self.get_objects(fname)
-            dict_spectra[i] = spectrum.save(save_data=save_data and parent is self)
-            dict_spectra[i]['baseline'].pop('y_eval')
+        with contextlib.ExitStack() as stack:
+            for spectra_map in self.spectra_maps:
+                stack.enter_context(spectra_map.transient())
+            for i, fname in enumerate(fnames):
+                spectrum, parent = self.get_objects(fname)
+                dict_spectra[i] = spectrum.save(save_data=save_data and parent is self)
+                dict_spectra[i]['baseline'].pop('y_eval')
 
         if save_data and len(self.spectra_maps) > 0:
             dict_spectra['data'] = {}
@@ -354,8 +839,14 @@ class Spectra(list):
         return dict_spectra
 
     @staticmethod
-    def load(fname_json=None, dict_spectra=None, preprocess=False):
-        """ Return a Spectra object from a .json file or directly from 'dict_spectra' """
+    def load(fname_json=None, dict_spectra=None, preprocess=False, fnames=None):
+        """ Return a Spectra object from a .json file or directly from 'dict_spectra'.
+            With a '.h5' project file, only the 'fnames' spectra can be loaded (see
+            fitspy.core.project_h5.load_h5()) """
+        if fname_json is not None and Path(fname_json).suffix == '.h5':
+            from fitspy.core.project_h5 import load_h5
+            return load_h5(fname_json, fnames=fnames, preprocess=preprocess)
+
         dict_spectra = dict_spectra or load_from_json(fname_json)
 
         spectra = Spectra()
@@ -393,3 +884,18 @@ class Spectra(list):
                 spectrum.set_attributes(model)
                 if preprocess:
                     spectrum.preprocess()
+
+
+def load_profile(fname, preprocess=False):
+    """ Return the spectrum related to the 'fname' 1D profile and the error message (None if
+        the profile has been successfully loaded) """
+    spectrum = Spectrum()
+    try:
+        spectrum.load_profile(fname)
+        if spectrum.x0 is None:
+            return spectrum, f"Unable to read data from {fname}"
+        if preprocess:
+            spectrum.preprocess()
+    except Exception as error:  # pylint:disable=broad-except
+        return spectrum, str(error) or repr(error)
+    return spectrum, None
@@ -2,6 +2,8 @@
 Class dedicated to handle 'Spectrum' objects from a 2D map managed by SpectraMap
 """
 import os
+import contextlib
+from bisect import bisect_left
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -11,22 +13,50 @@ from parse import Parser
 
 from fitspy.core.spectra import Spectra
 from fitspy.core.spectrum import Spectrum
-from fitspy.core.utils import closest_index, get_2d_map
+from fitspy.core.utils import closest_index
+from fitspy.core.map_cache import load_2d_map
+from fitspy.core.fit_results import FitResults, CompactResult
+from fitspy.core.fit_journal import hash_model, hash_arrays
 
 POLICY = "{name}  X={x} Y={y}"
 PARSER = Parser(POLICY)
+DERIVED_KEYS = ['fname', 'outliers_inds', 'peak_models', 'peak_labels', 'bkg_models',
+                'bkg_model', 'result_fit_success', 'schema_version']
+
+
+def hash_settings(spectrum):
+    """ Return the hash of the 'spectrum' settings (attributes not related to the fname, the
+        models and the preprocessing results), with its outliers limit """
+    model_dict = spectrum.save()
+    for key in DERIVED_KEYS:
+        model_dict.pop(key, None)
+    model_dict['baseline'] = {key: val for key, val in model_dict['baseline'].items()
+                              if key not in ['y_eval', 'is_subtracted']}
+    model_dict['outliers_limit'] = hash_arrays(spectrum.outliers_limit)
+    return hash_model(model_dict)
 
 
 class SpectraMap(Spectra):
     """
     Class dedicated to handle 'Spectrum' objects from a 2D map
 
+    The map behaves as an array-backed collection: the list initially contains the pixels
+    indices and the related Spectrum objects are created on demand (when indexed or iterated)
+    from the map arrays ('x0', 'intensity', 'xy_map') and stored in place of the indices.
+    They can be released afterwards (see release() and transient()), the spectra fitted by
+    apply_model() being recreated from the applied model ('templates') and the fit results.
+    The spectra whose raw data or settings differ from those of a recreated spectrum are kept.
+
+    The intensities are stored once in 'intensity', the spectra 'x0' and 'y0' being views on the
+    shared support and on the 'intensity' rows. 'arr0' and 'coords' are rebuilt on request.
+
     Attributes
     ----------
     fname: str
         Pathname associated to the loaded object
     arr0: numpy.ndarray
-        Raw array with coordinates and intensities returned by fitspy.core.utils.get_2d_map()
+        Raw array with coordinates and intensities (see fitspy.core.utils.get_2d_map()),
+        rebuilt from the map arrays
     xy_map: tuple of 2 list
         Lists of x and y coordinates used in the 2D-map
     shape_map: tuple of 2 ints
@@ -34,14 +64,28 @@ class SpectraMap(Spectra):
     extent: iterable of 4 floats
         bounding box in data coordinates that the image will fill specified as
         (xmin, xmax, ymin, ymax)
-    coords: list of list of 2 floats
-        List containing the (x,y) coordinates for each spectrum in the 2D-map
-    fnames_map: list of str
-        List of the spectrum names related to the 2D-map
+    coords: numpy.ndarray((N, 2))
+        Array containing the (x,y) coordinates for each spectrum (pixel) in the 2D-map,
+        rebuilt from 'xy_map' and 'inds_flat'
+    x0: numpy.ndarray(n)
+        Sorted support shared by the spectra
     intensity: numpy.ndarray(((len(shape_map[0]) * len(shape_map[1]), n))
         Array of spectra intensities (n-values) associated to the xy_map coords
+    inds_flat: numpy.ndarray(N)
+        Rows of 'intensity' related to each pixel
+    pixels: numpy.ndarray(len(shape_map[0]) * len(shape_map[1]))
+        Pixels indices related to each row of 'intensity' (-1 if no pixel)
+    templates: list of FitPlan objects
+        Models applied to the released spectra
+    template_inds: numpy.ndarray(N)
+        Index of the template related to each pixel (-1 if no template)
     arr: numpy.ndarray((len(shape_map[0]), len(shape_map[1]))
         Array associated to the xy_map coords
+    results: FitResults object
+        Compact storage of the fit results related to the map spectra
+    shared: tuple
+        Shared memory block of the map arrays read by the fit workers, with the related
+        arrays and finalizer (see fitspy.core.utils_mp.share_map()). None if not created
     ax: Matplotlib.pyplot.axis
         Axis associated to the 2D-map displaying
     img: Matplotlib.image.AxesImage
@@ -62,15 +106,20 @@ class SpectraMap(Spectra):
     def __init__(self):
 
         self.fname = None
-        self.arr0 = None
         self.xy_map = None
         self.shape_map = None
         self.extent = None
-        self.coords = None
-        self.fnames_map = None
+        self.x0 = None
         self.intensity = None
+        self.inds_flat = None
+        self.pixels = None
+        self.templates = []
+        self.template_inds = None
         self.arr = None
         self.outliers_limit = None
+        self.results = FitResults()
+        self.shared = None
+        self._pids = None
 
         self.ax = None
         self.img = None
@@ -80,13 +129,96 @@ class SpectraMap(Spectra):
         self.xrange = None
         self.marker = None
 
+    def __getitem__(self, ind):
+        if isinstance(ind, slice):
+            return [self.materialize(i) for i in range(*ind.indices(len(self)))]
+        return self.materialize(ind)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.materialize(i)
+
+    def pop(self, index=-1):
+        spectrum = self.materialize(index)
+        super().pop(index)
+        return spectrum
+
+    @property
+    def arr0(self):
+        """ Return the raw array [[0, 0, x0], [y, x, intensity], ...] related to the map """
+        if self.intensity is None:
+            return None
+        coords = self.coords
+        arr0 = np.zeros((len(coords) + 1, len(self.x0) + 2))
+        arr0[0, 2:] = self.x0
+        arr0[1:, 0] = coords[:, 1]
+        arr0[1:, 1] = coords[:, 0]
+        arr0[1:, 2:] = self.intensity[self.inds_flat]
+        return arr0
+
+    @property
+    def coords(self):
+        """ Return the (x, y) coordinates of the map spectra as a (N, 2) array """
+        if self.inds_flat is None:
+            return None
+        inds_y, inds_x = np.divmod(self.inds_flat, len(self.xy_map[0]))
+        return np.column_stack((np.asarray(self.xy_map[0])[inds_x],
+                                np.asarray(self.xy_map[1])[inds_y]))
+
+    @property
+    def fnames_map(self):
+        """ Return the spectrum names related to the 2D-map """
+        return self.local_fnames()
+
     def create_map(self, fname, arr0=None):
         """ Create map """
         fname = os.path.normpath(fname)
-        arr0 = get_2d_map(fname) if arr0 is None else arr0
+        arr0 = load_2d_map(fname) if arr0 is None else arr0
+
+        # map coordinates and flat indices of the spectra (x varying first)
+        x_map, inds_x = np.unique(arr0[1:, 1], return_inverse=True)
+        y_map, inds_y = np.unique(arr0[1:, 0], return_inverse=True)
+        x_map = x_map.tolist()
+        y_map = y_map.tolist()
+        inds_flat = inds_x.ravel() + inds_y.ravel() * len(x_map)
 
-        x_map = x = list(np.sort(np.unique(arr0[1:, 1])))
-        y_map = y = list(np.sort(np.unique(arr0[1:, 0])))
+        # wavelengths
+        x = arr0[0][2:]
+        inds = np.argsort(x)
+        x = x[inds]
+
+        # intensities (a view on 'arr0' for a complete grid with sorted rows and wavelengths)
+        nrows = len(x_map) * len(y_map)
+        if len(inds_flat) == nrows and np.all(np.diff(inds_flat) > 0) and \
+                np.all(np.diff(inds) > 0):
+            intensity_map = arr0[1:, 2:]
+        else:
+            intensity_map = np.full((nrows, len(x)), np.nan)
+            intensity_map[inds_flat] = arr0[1:, 2:][:, inds]
+
+        self.set_arrays(fname, x, (x_map, y_map), inds_flat, intensity_map)
+
+    def set_arrays(self, fname, x0, xy_map, inds_flat, intensity, arr=None):
+        """
+        Set the map from its arrays
+
+        Parameters
+        ----------
+        fname: str
+            Pathname associated to the map
+        x0: numpy.ndarray(n)
+            Sorted support shared by the spectra
+        xy_map: tuple of 2 list
+            Lists of x and y coordinates used in the 2D-map
+        inds_flat: numpy.ndarray(N)
+            Rows of 'intensity' related to each pixel
+        intensity: array-like((len(xy_map[0]) * len(xy_map[1]), n))
+            Spectra intensities associated to the xy_map coords. Any object supporting the
+            numpy indexing (h5py.Dataset for instance) can be used
+        arr: numpy.ndarray((len(xy_map[1]), len(xy_map[0])), optional
+            Integrated intensities. If None, calculated from 'intensity'
+        """
+        x, y = xy_map
 
         # grid range associated to 'arr' to be consistent with the tools axis
         xmin = ymin = -0.5
@@ -98,50 +230,294 @@ class SpectraMap(Spectra):
             ymin = y[-1] + 0.5 * (y[-1] - y[-2])
             ymax = y[0] - 0.5 * (y[1] - y[0])
 
-        # wavelengths
-        x = arr0[0][2:]
-        inds = np.argsort(x)
-        x = x[inds]
-
-        # intensities
-        intensity_map = np.nan * np.ones((len(x_map) * len(y_map), len(x)))
-
-        coords = []
-        fnames_map = []
-        for vals in arr0[1:]:
-            intensity = vals[2:][inds]
-            ind_flat = x_map.index(vals[1]) + y_map.index(vals[0]) * len(x_map)
-            intensity_map[ind_flat, :] = intensity
-            coords.append([vals[1], vals[0]])
-
-            # create the related spectrum object
-            spectrum = Spectrum()
-            spectrum.fname = POLICY.format(name=fname, x=vals[1], y=vals[0])
-            spectrum.x = x
-            spectrum.y = intensity
-            spectrum.x0 = spectrum.x.copy()
-            spectrum.y0 = spectrum.y.copy()
-            self.append(spectrum)
-            fnames_map.append(spectrum.fname)
-
         self.fname = fname
-        self.arr0 = arr0
-        self.xy_map = (x_map, y_map)
+        self.xy_map = (list(x), list(y))
         self.shape_map = (len(self.xy_map[1]), len(self.xy_map[0]))
         self.extent = [xmin, xmax, ymin, ymax]
-        self.intensity = intensity_map
-        self.arr = np.sum(intensity_map, axis=1).reshape(self.shape_map)
-        self.coords = coords
-        self.fnames_map = fnames_map
+        self.x0 = x0
+        self.intensity = intensity
+        self.inds_flat = inds_flat
+        self.pixels = np.full(len(intensity), -1)
+        self.pixels[inds_flat] = np.arange(len(inds_flat))
+        self.templates = []
+        self.template_inds = np.full(len(inds_flat), -1)
+        if arr is None:
+            arr = np.sum(intensity, axis=1).reshape(self.shape_map)
+        self.arr = arr
+
+        # the spectra are created on demand
+        self.extend(range(len(inds_flat)))
+
+    def materialize(self, ind):
+        """ Return the spectrum located at the 'ind' position, created if not existing """
+        item = list.__getitem__(self, ind)
+        if isinstance(item, Spectrum):
+            return item
+        spectrum = self.create_spectrum(item)
+        list.__setitem__(self, ind, spectrum)
+        return spectrum
+
+    def is_materialized(self, fname):
+        """ Return True if the spectrum related to 'fname' exists as a Spectrum object """
+        pos = self.get_position(self.pixel_id(fname))
+        return pos is None or isinstance(list.__getitem__(self, pos), Spectrum)
+
+    def create_spectrum(self, pid):
+        """ Return the spectrum related to the 'pid' pixel, from the map arrays, the template
+            and the fit results """
+        spectrum = Spectrum()
+        template_ind = self.template_inds[pid]
+        if template_ind >= 0:
+            self.templates[template_ind].set_attributes(spectrum)
+        spectrum.fname = self.pixel_fname(pid)
+        spectrum.x0 = self.x0
+        spectrum.y0 = self.intensity[self.inds_flat[pid]]
+        spectrum.x, spectrum.y = spectrum.x0.copy(), spectrum.y0.copy()
+        if self.outliers_limit is not None:
+            spectrum.outliers_limit = self.outliers_limit
+        if template_ind >= 0:
+            spectrum.preprocess()
+            if spectrum.fname in self.results:
+                values, _ = self.results.get(spectrum.fname)
+                spectrum.set_param_values(values)
+                spectrum.result_fit = CompactResult(self.results, spectrum)
+        return spectrum
+
+    def release(self, spectra, template=None):
+        """
+        Release 'spectra' (replaced by their pixel index in the list), to be recreated on
+        demand from the map arrays. The spectra with raw data or settings (range,
+        normalization, baseline, outliers, fit parameters) differing from those of a spectrum
+        recreated from the map arrays and the template are kept (see is_releasable())
+
+        Parameters
+        ----------
+        spectra: list of Spectrum objects
+            Spectra to release. Their models are supposed to be those of a spectrum created
+            from the map arrays or, if 'template' is given, those resulting from the 'template'
+            application and fit (see Spectra.apply_model())
+        template: FitPlan object, optional
+            Model applied to the spectra
+        """
+        if template is not None:
+            if template not in self.templates:
+                self.templates.append(template)
+            template_ind = self.templates.index(template)
+        items = []
+        for spectrum in spectra:
+            pid = self.pixel_id(spectrum.fname)
+            pos = self.get_position(pid)
+            if pos is not None and list.__getitem__(self, pos) is spectrum:
+                items.append((spectrum, pid, pos))
+
+        # raw data read at once to be compared with the spectra ones
+        rows = self.intensity[self.inds_flat[[pid for _, pid, _ in items]]] if items else []
+        settings = {}  # settings hashes of the spectra recreated per template index
+        for (spectrum, pid, pos), y0 in zip(items, rows):
+            ind = template_ind if template is not None else self.template_inds[pid]
+            if self.is_releasable(spectrum, y0, ind, settings):
+                self.template_inds[pid] = ind
+                list.__setitem__(self, pos, pid)
+        self.invalidate()
+
+    def is_releasable(self, spectrum, y0, template_ind, settings):
+        """ Return True if 'spectrum' has the 'y0' raw data of its pixel and the settings of a
+            spectrum created with the 'template_ind' template, the settings hashes being
+            stored per template index in 'settings' """
+        if spectrum.weights0 is not None or not np.array_equal(spectrum.y0, y0, equal_nan=True):
+            return False
+        if template_ind not in settings:
+            spectrum_ref = Spectrum()
+            if template_ind >= 0:
+                self.templates[template_ind].set_attributes(spectrum_ref)
+            spectrum_ref.outliers_limit = self.outliers_limit
+            settings[template_ind] = hash_settings(spectrum_ref)
+        return hash_settings(spectrum) == settings[template_ind]
+
+    @contextlib.contextmanager
+    def transient(self, template=None):
+        """ Context manager releasing the spectra created within the context (see release()).
+            The spectra are kept if an exception occurs """
+        existing = {id(item) for item in list.__iter__(self) if isinstance(item, Spectrum)}
+        yield
+        spectra = [item for item in list.__iter__(self)
+                   if isinstance(item, Spectrum) and id(item) not in existing]
+        self.release(spectra, template=template)
+
+    def pixel_fname(self, pid):
+        """ Return the fname related to the 'pid' pixel """
+        i, j = divmod(int(self.inds_flat[pid]), len(self.xy_map[0]))
+        x, y = self.xy_map[0][j], self.xy_map[1][i]
+        return POLICY.format(name=self.fname, x=x, y=y)
+
+    def pixel_id(self, fname):
+        """ Return the index of the pixel related to 'fname' or None """
+        try:
+            name, (x, y) = fname.split("  X=")[0], self.fname_coords(fname)
+        except (ValueError, IndexError):
+            return None
+        if os.path.normpath(name) != self.fname:
+            return None
+        j = bisect_left(self.xy_map[0], x)
+        i = bisect_left(self.xy_map[1], y)
+        if j == len(self.xy_map[0]) or i == len(self.xy_map[1]) or \
+                self.xy_map[0][j] != x or self.xy_map[1][i] != y:
+            return None
+        pid = self.pixels[i * len(self.xy_map[0]) + j]
+        return pid if pid >= 0 else None
+
+    def get_pids(self):
+        """ Return the pixels indices related to the list items (-1 if not related to a
+            pixel), updated when the list is modified """
+        if self._pids is None or self._pids[0] != self._version:
+            pids = []
+            for item in list.__iter__(self):
+                if isinstance(item, Spectrum):
+                    pid = self.pixel_id(os.path.normpath(item.fname))
+                    item = pid if pid is not None else -1
+                pids.append(item)
+            pids = np.array(pids, dtype=int)
+            positions = np.full(len(self.inds_flat), -1)
+            positions[pids[pids >= 0]] = np.where(pids >= 0)[0]
+            self._pids = (self._version, pids, positions)
+        return self._pids[1]
+
+    def get_position(self, pid):
+        """ Return the position of the 'pid' pixel in the list or None """
+        if pid is None:
+            return None
+        self.get_pids()
+        pos = self._pids[2][pid]
+        return pos if pos >= 0 else None
+
+    def local_fnames(self):
+        """ Return the fnames related to the map spectra """
+        coords = self.coords.tolist() if self.coords is not None else []
+        return [os.path.normpath(item.fname) if isinstance(item, Spectrum) else
+                POLICY.format(name=self.fname, x=coords[item][0], y=coords[item][1])
+                for item in list.__iter__(self)]
+
+    def find(self, fname):
+        """ Return the spectrum and the map related to the normalized 'fname' or None """
+        pos = self.get_position(self.pixel_id(fname))
+        if pos is not None:
+            spectrum = self.materialize(pos)
+            if os.path.normpath(spectrum.fname) == fname:
+                return spectrum, self
+        # spectra not related to a pixel or with a fname modified in place
+        for pos, item in enumerate(list.__iter__(self)):
+            if isinstance(item, Spectrum) and os.path.normpath(item.fname) == fname:
+                return item, self
+        return None
 
     def get_spectrum(self, fname):
         """ Return the spectrum object related to 'fname' in the spectra map list """
         fname = os.path.normpath(fname)
-        try:
-            return self[self.fnames_map.index(fname)]
-        except:
-            print(f"{fname} not found in the spectra map list")
-            return None
+        item = self.find(fname)
+        if item is not None:
+            return item[0]
+        print(f"{fname} not found in the spectra map list")
+        return None
+
+    def get_intensity(self):
+        """ Return the raw intensities of the map spectra """
+        pids = self.get_pids()
+        if np.all(pids >= 0):
+            return self.intensity[self.inds_flat[pids]]
+        return np.asarray([spectrum.y0 for spectrum in self])
+
+    def set_outliers_limit(self, outliers_limit):
+        """ Set the 'outliers_limit' to the map spectra """
+        self.outliers_limit = outliers_limit[:len(self.x0)]
+        for item in list.__iter__(self):
+            if isinstance(item, Spectrum):
+                item.outliers_limit = outliers_limit[:len(item.y0)]
+
+    def get_peak_labels(self):
+        """ Return the sorted peak labels related to the map spectra """
+        labels = set()
+        for item in list.__iter__(self):
+            if isinstance(item, Spectrum):
+                labels.update(item.peak_labels)
+        for template_ind, template in enumerate(self.templates):
+            if np.any(self.template_inds == template_ind):
+                labels.update(template.peak_labels)
+        return sorted(labels)
+
+    def get_param_map(self, label, var):
+        """ Return the array of the 'var' parameter values related to the 'label' peak """
+        arr = np.full(self.shape_map[0] * self.shape_map[1], np.nan)
+        pids = self.get_pids()
+
+        # released spectra (values issued from the templates and the fit results)
+        released = np.zeros(len(self.inds_flat), dtype=bool)
+        released[pids[[not isinstance(item, Spectrum) for item in list.__iter__(self)]]] = True
+        for template_ind, template in enumerate(self.templates):
+            pids_template = np.where(released & (self.template_inds == template_ind))[0]
+            for model, lab in zip(template.peak_models, template.peak_labels):
+                if lab == label and var in model.param_hints:
+                    values = np.full(len(pids_template), model.param_hints[var]['value'],
+                                     dtype=float)
+                    results = self.get_results_values(pids_template, model.prefix + var)
+                    values = np.where(np.isnan(results), values, results)
+                    arr[self.inds_flat[pids_template]] = values
+
+        # created spectra
+        for item in list.__iter__(self):
+            if isinstance(item, Spectrum):
+                for j, lab in enumerate(item.peak_labels):
+                    if lab == label:
+                        params = item.peak_models[j].param_hints
+                        if var in params.keys():
+                            i_row, i_col = self.spectrum_indices(item)
+                            arr[i_row * self.shape_map[1] + i_col] = params[var]['value']
+
+        return arr.reshape(self.shape_map)
+
+    def get_param_values(self, fnames, label, var):
+        """ Return the flat map indices and the 'var' parameter values related to the 'label'
+            peak of the 'fnames' spectra (NaN if not defined), to update a parameter map
+            pixel by pixel (see get_param_map()) """
+        inds, values = [], []
+        for fname in fnames:
+            pid = self.pixel_id(fname)
+            if pid is None:
+                continue
+            value = np.nan
+            pos = self.get_position(pid)
+            item = list.__getitem__(self, pos) if pos is not None else None
+            if isinstance(item, Spectrum):
+                for model, lab in zip(item.peak_models, item.peak_labels):
+                    if lab == label and var in model.param_hints:
+                        value = model.param_hints[var]['value']
+            elif self.template_inds[pid] >= 0:
+                template = self.templates[self.template_inds[pid]]
+                for model, lab in zip(template.peak_models, template.peak_labels):
+                    if lab == label and var in model.param_hints:
+                        value = self.get_results_values([pid], model.prefix + var)[0]
+                        if np.isnan(value):
+                            value = model.param_hints[var]['value']
+            inds.append(self.inds_flat[pid])
+            values.append(value)
+        return np.array(inds, dtype=int), np.array(values, dtype=float)
+
+    def get_results_values(self, pids, name):
+        """ Return the fitted values of the 'name' parameter related to the 'pids' pixels
+            (NaN if not fitted) """
+        values = np.full(len(pids), np.nan)
+        if name in self.results.param_names:
+            col = self.results.param_names.index(name)
+            rows = [self.results.index.get(self.pixel_fname(pid), -1) for pid in pids]
+            rows = np.array(rows, dtype=int)
+            values[rows >= 0] = self.results.data['values'][rows[rows >= 0], col]
+        return values
+
+    @staticmethod
+    def fname_coords(fname):
+        """ Return the (x, y) map coordinates associated with 'fname' """
+        coords = fname.split("  X=")[1]
+        x, y = coords.split(" Y=")
+        return float(x), float(y)
 
     @staticmethod
     def spectrum_coords(spectrum):
@@ -173,7 +549,7 @@ class SpectraMap(Spectra):
         self.img = self.ax.imshow(self.arr, extent=extent, origin='lower', cmap=cmap)
 
         if range_slider is not None:
-            _min, _max = self[0].x0.min(), self[0].x0.max()
+            _min, _max = self.x0.min(), self.x0.max()
             range_slider.blockSignals(True)
             range_slider.setRange(_min, _max)
             range_slider.setValue((_min, _max))
@@ -182,7 +558,7 @@ class SpectraMap(Spectra):
             fig.subplots_adjust(top=0.92)
             self.ax_slider = fig.add_axes([0.2, 0.92, 0.4, 0.05])
             self.cbar = plt.colorbar(self.img, ax=self.ax)
-            self.xrange = (self[0].x0.min(), self[0].x0.max())
+            self.xrange = (self.x0.min(), self.x0.max())
             self.slider = RangeSlider(self.ax_slider, "X-Range ",
                                       self.xrange[0], self.xrange[1],
                                       valinit=self.xrange)
@@ -200,19 +576,12 @@ class SpectraMap(Spectra):
             self.xrange = xrange
 
         if 'Intensity' in var:
-            imin = closest_index(self[0].x0, self.xrange[0])
-            imax = closest_index(self[0].x0, self.xrange[1])
+            imin = closest_index(self.x0, self.xrange[0])
+            imax = closest_index(self.x0, self.xrange[1])
             arr = np.sum(self.intensity[:, imin:imax + 1], axis=1)
             self.arr = arr.reshape(self.shape_map)
         else:  # models parameter displaying
-            self.arr = np.full((self.shape_map[0], self.shape_map[1]), np.nan)
-            for spectrum in self:
-                for j, lab in enumerate(spectrum.peak_labels):
-                    if lab == label:
-                        params = spectrum.peak_models[j].param_hints
-                        if var in params.keys():
-                            ind = self.spectrum_indices(spectrum)
-                            self.arr[ind[0], ind[1]] = params[var]['value']
+            self.arr = self.get_param_map(label, var)
 
         self.img.set_data(self.arr)
         self.img.autoscale()
@@ -23,6 +23,10 @@ from fitspy.core.utils import get_1d_profile
 from fitspy.core.utils import closest_index, fileparts, check_or_rename
 from fitspy.core.utils import save_to_json, load_from_json, eval_noise_amplitude
 from fitspy.core.baseline import BaseLine
+from fitspy.core.jacobian import make_jacobian
+from fitspy.core.varpro import varpro_fit, make_result
+from fitspy.core.fit_results import FitResults, CompactResult, make_record
+from fitspy.core.fit_cache import make_key
 from fitspy.core.models_bichromatic import plot_decomposition
 from fitspy.core.migrations import migrate_model_dict, CURRENT_MODEL_SCHEMA_VERSION
 
@@ -135,8 +139,22 @@ class Spectrum:
         * independent_models: bool
             Key to fit each model of the composite model separately.
             Default value is False.
-    result_fit: lmfit.ModelResult
-        Object resulting from lmfit fitting. Default value is a 'None' object
+        * analytic_jac: bool
+            Activation keyword to use the models analytic jacobian (when
+            available) with the 'Leastsq' and the 'Least_squares' algorithms.
+            Default value is False.
+        * varpro: bool
+            Activation keyword to solve the parameters entering linearly the
+            models (peaks 'ampli', Constant/Linear/Parabolic background
+            coefficients) by variable projection before the final fit.
+            Default value is False.
+        * varpro_refine: bool
+            Activation keyword to refine the variable projection solution by
+            a final fit of all the parameters.
+            Default value is True.
+    result_fit: lmfit.ModelResult or CompactResult
+        Object resulting from lmfit fitting (or its compact version stored in the parent
+        Spectra/SpectraMap object after apply_model()). Default value is a 'None' object
         (function) that enables to address a 'result_fit.success' status.
     """
 
@@ -453,7 +471,12 @@ class Spectrum:
         mask = np.logical_and(self.x0 >= (self.range_min or -np.inf),
                               self.x0 <= (self.range_max or np.inf))
 
-        self.x = self.x0[mask].copy()
+        # 'x' is a view on 'x0' for a contiguous range (not modified in place, contrary to 'y')
+        inds = np.flatnonzero(mask)
+        if len(inds) > 0 and inds[-1] - inds[0] + 1 == len(inds):
+            self.x = self.x0[inds[0]:inds[-1] + 1]
+        else:
+            self.x = self.x0[mask].copy()
         self.y = self.y0[mask].copy()
         if self.weights0 is not None:
             self.weights = self.weights0[mask].copy()
@@ -555,17 +578,18 @@ class Spectrum:
 
         return peak_model
 
-    def reassign_params(self):
-        """ Reassign fitted 'params' values to the 'models' """
+    def reassign_params(self, values=None):
+        """ Reassign fitted 'params' values (or the 'values' dictionary if given) to the
+            'models' """
+        if values is None:
+            values = {key: param.value for key, param in self.result_fit.params.items()}
         for peak_model in self.peak_models:
             for key in peak_model.param_names:
-                param = self.result_fit.params[key]
                 name = key[4:]  # remove prefix 'mXX_'
-                peak_model.set_param_hint(name, value=param.value)
+                peak_model.set_param_hint(name, value=values[key])
         for bkg_model in self.bkg_models:
             for key in bkg_model.param_names:
-                param = self.result_fit.params[key]
-                bkg_model.set_param_hint(key, value=param.value)
+                bkg_model.set_param_hint(key, value=values[key])
 
     def estimate_params(self, x0):
         """ Return model parameters estimated from the local spectrum profile """
@@ -662,7 +686,8 @@ class Spectrum:
             self.add_bkg_model(bkg_name, component_id='b01', order=1)
 
     def fit(self, fit_method=None, fit_negative=None, fit_outliers=None, independent_models=None,
-            max_ite=None, coef_noise=None, xtol=None, reinit_guess=True,
+            max_ite=None, coef_noise=None, xtol=None, analytic_jac=None, varpro=None,
+            varpro_refine=None, reinit_guess=True, fit_plan=None, cache=None, bypass_cache=False,
             **kwargs):
         """
         Fit the peaks and background models
@@ -693,10 +718,37 @@ class Spectrum:
             Relative tolerance associated with the ‘leastsq’ and the
             ‘least_squares’ fit algorithm.
             Default value is 0.0001.
+        analytic_jac: bool, optional
+            Activation key to use the analytic jacobian of the models (if all of them provide one
+            and if no parameter is constrained by an expression) with the ‘leastsq’ and the
+            ‘least_squares’ fit algorithm.
+            Default value is False.
+        varpro: bool, optional
+            Activation key to solve the linear parameters (peaks 'ampli' and
+            Constant/Linear/Parabolic background coefficients) exactly by variable
+            projection, the fit method iterating only over the nonlinear ones.
+            Not used with 'independent_models'.
+            Default value is False.
+        varpro_refine: bool, optional
+            Activation key to refine the variable projection solution by a final fit of all
+            the parameters. Otherwise, the uncertainties are estimated from the models analytic
+            jacobian (when available).
+            Default value is True.
         reinit_guess: bool, optional
             Key to adapt initial values for 'ampli' and 'fwhm', 'fwhm_l' or
             'fwhm_r' to the spectrum intensity at the corresponding point 'x0'.
             Default value is True.
+        fit_plan: FitPlan object, optional
+            Plan (see fitspy.core.fit_plan) providing the composite model and its parameters
+            to be reused instead of being rebuilt. Ignored if the spectrum models don't match
+            the plan layout.
+        cache: FitCache object, optional
+            Cache (see fitspy.core.fit_cache) from which the fit result is restored if the same
+            raw data, preprocessing, models and fit parameters have already been fitted.
+            Otherwise, the fit result is stored in the cache.
+        bypass_cache: bool, optional
+            Activation key to ignore the cached fit result (the new fit result being stored in
+            the cache)
         kwargs: dict, optional
             Dictionary of optional arguments passed to lmfit.fit()
         """
@@ -718,87 +770,57 @@ class Spectrum:
             self.fit_params['coef_noise'] = coef_noise
         if xtol is not None:
             self.fit_params['xtol'] = xtol
+        if analytic_jac is not None:
+            self.fit_params['analytic_jac'] = analytic_jac
+        if varpro is not None:
+            self.fit_params['varpro'] = varpro
+        if varpro_refine is not None:
+            self.fit_params['varpro_refine'] = varpro_refine
+
+        cache_key = None
+        if cache is not None:
+            cache_key = make_key(self, reinit_guess=reinit_guess, **kwargs)
+            record = cache.get(cache_key) if not bypass_cache else None
+            if record is not None:
+                self.set_fit_record(record)
+                return
 
         x, y, weights = self.x, self.y, self.weights
-        mask = np.ones_like(x, dtype=bool)
-        vary_init = None
-        noise_level = 0
-
-        if not self.fit_params['fit_negative']:
-            mask[y < 0] = False
-
-        if not self.fit_params['fit_outliers']:
-            x_outliers, _ = self.calculate_outliers()
-            if x_outliers is not None:
-                mask[np.where(np.isin(x, x_outliers))] = False
-
-        if self.fit_params['coef_noise'] > 0:
-            ampli_noise = eval_noise_amplitude(y)
-            noise_level = self.fit_params['coef_noise'] * ampli_noise
-            mask[y < noise_level] = False
-
-        # composite model creation
-        comp_model = None
-        if len(self.peak_models) > 0:
-            comp_model = self.peak_models[0]
-        if len(self.peak_models) > 1:
-            for peak_model in self.peak_models[1:]:
-                comp_model += peak_model
-
-        # reinitialize 'ampli' and 'fwhm'
-        if reinit_guess and comp_model is not None:
-            fwhm_min = max(np.diff(x))
-            for component in comp_model.components:
-                params = component.param_hints
-                if params['ampli']['vary']:
-                    ind = closest_index(x, params['x0']['value'])
-                    params['ampli']['value'] = self.y_no_outliers[ind]
-                for key in ['fwhm', 'fwhm_l', 'fwhm_r']:
-                    if key in params and params[key]['vary']:
-                        params[key]['value'] = max(fwhm_min, params[key]['value'])
-
-        # disable a peak_models in a noisy areas
-        if noise_level > 0 and comp_model is not None:
-
-            # save initial 'vary' state
-            vary_init = [param['vary'] for component in comp_model.components
-                         for param in component.param_hints.values()]
-
-            # set 'ampli'/'fwhm' to 0 and 'vary' to False in noisy areas
-            ymean = uniform_filter1d(y, size=5)
-            for component in comp_model.components:
-                params = component.param_hints
-                ind = closest_index(x, params['x0']['value'])
-                if ymean[ind] < noise_level:
-                    params['ampli']['value'] = 0
-                    for key in params.keys():
-                        if key in ['fwhm', 'fwhm_l', 'fwhm_r']:
-                            params[key]['value'] = 0
-                        params[key]['vary'] = False
+        mask, vary_init = self.prepare_fit(reinit_guess=reinit_guess)
 
-        # bkg_model(s) addition
-        for bkg_model in self.bkg_models:
-            if comp_model is not None:
-                comp_model += bkg_model
-            else:
-                comp_model = bkg_model
-
-        params = comp_model.make_params()
+        if fit_plan is not None and fit_plan.is_compatible(self):
+            comp_model = fit_plan.comp_model
+            params = fit_plan.make_params(self)
+            nvarys = fit_plan.nvarys
+        else:
+            # composite model creation (peak_models + bkg_model(s))
+            comp_model = None
+            for model in self.peak_models + self.bkg_models:
+                if comp_model is None:
+                    comp_model = model
+                else:
+                    comp_model += model
+            params = comp_model.make_params()
+            nvarys = len(params)  # number of 'free' parameters
 
         # maximum function evaluation from max_ite
         # consider a minimum of 2 ite to avoid instabilities when fitting 1 by 1
-        nvarys = 0  # number of 'free' parameters
-        for param in params:
-            nvarys += param['vary'] if 'vary' in param else 1
         max_nfev = max(2, self.fit_params['max_ite']) * nvarys
 
         fit_kws = {}
         if 'fit_kws' in kwargs:
-            fit_kws = kwargs['fit_kws']  # example: fit_kws={'xtol': 1.e-2}
+            fit_kws = dict(kwargs['fit_kws'])  # example: fit_kws={'xtol': 1.e-2}
             kwargs.pop('fit_kws')
         if self.fit_params['method'] in ['leastsq', 'least_squares']:
             fit_kws.update({'xtol': self.fit_params['xtol']})
 
+        # analytic jacobian keyword related to the fitting method
+        jac_key = None
+        if self.fit_params.get('analytic_jac', False):
+            jac_key = {'leastsq': 'Dfun', 'least_squares': 'jac'}.get(self.fit_params['method'])
+            if jac_key in fit_kws or 'Dfun' in fit_kws:
+                jac_key = None
+
         if weights is not None:
             weights = weights[mask]
 
@@ -810,27 +832,61 @@ class Spectrum:
 
         if not self.fit_params['independent_models']:
 
-            self.result_fit = comp_model.fit(y[mask], params, x=x[mask],
-                                             weights=weights,
-                                             method=self.fit_params['method'],
-                                             max_nfev=max_nfev,
-                                             fit_kws=fit_kws,
-                                             **extra_vars,
-                                             **kwargs)
+            use_varpro = self.fit_params.get('varpro', False)
+            refine = not use_varpro or self.fit_params.get('varpro_refine', True)
+            nfev_varpro = 0
+            if use_varpro:
+                init_params = None if refine else params.copy()
+                nfev_varpro, success, message = varpro_fit(comp_model, params, x[mask], y[mask],
+                                                           weights=weights,
+                                                           method=self.fit_params['method'],
+                                                           max_nfev=max_nfev,
+                                                           fit_kws=fit_kws,
+                                                           analytic_jac=jac_key is not None,
+                                                           **extra_vars)
+                refine = refine or nfev_varpro == 0  # variable projection not applied
+
+            if refine:
+                jacobian = make_jacobian(comp_model, params) if jac_key else None
+                if jacobian is not None:
+                    fit_kws[jac_key] = jacobian
+
+                self.result_fit = comp_model.fit(y[mask], params, x=x[mask],
+                                                 weights=weights,
+                                                 method=self.fit_params['method'],
+                                                 max_nfev=max_nfev,
+                                                 fit_kws=fit_kws,
+                                                 **extra_vars,
+                                                 **kwargs)
+                self.result_fit.nfev += nfev_varpro
+            else:
+                self.result_fit = make_result(comp_model, params, init_params, x[mask], y[mask],
+                                              weights=weights,
+                                              method=self.fit_params['method'],
+                                              nfev=nfev_varpro,
+                                              success=success,
+                                              message=message,
+                                              **extra_vars)
             self.reassign_params()
 
         else:
 
             best_fits = []
             success = True
-            for k, model in enumerate(comp_model.components):
-                result_fit = model.fit(y[mask], params, x=x[mask],
-                                       weights=weights,
-                                       method=self.fit_params['method'],
-                                       max_nfev=max_nfev,
-                                       fit_kws=fit_kws,
-                                       **extra_vars,
-                                       **kwargs)
+            models = self.peak_models + self.bkg_models
+            for model_ref, model in zip(comp_model.components, models):
+                fit_kws_ = fit_kws.copy()
+                jacobian = make_jacobian(model_ref, params) if jac_key else None
+                if jacobian is not None:
+                    fit_kws_[jac_key] = jacobian
+
+                result_fit = model_ref.fit(y[mask], params, x=x[mask],
+                                           weights=weights,
+                                           method=self.fit_params['method'],
+                                           max_nfev=max_nfev,
+                                           fit_kws=fit_kws_,
+                                           **extra_vars,
+                                           **kwargs)
                 success *= result_fit.success
                 best_fits.append(result_fit.best_fit)
 
@@ -851,11 +907,93 @@ class Spectrum:
         self.result_fit.best_fit = mask.astype(float)
         self.result_fit.best_fit[mask] = best_fit
 
-        # reassign initial 'vary' values
+        self.restore_vary(vary_init)
+
+        if cache is not None:
+            cache.put(cache_key, make_record(self))
+
+    def set_param_values(self, values):
+        """ Set the models parameters 'values' (dictionary with the prefixed names as keys) """
+        for model in self.peak_models + self.bkg_models:
+            for name in model.param_names:
+                if name in values:
+                    model.set_param_hint(name[len(model.prefix):], value=values[name])
+
+    def set_fit_record(self, record):
+        """ Set the models parameters values and the 'result_fit' (as a compact result) from
+            a fit result 'record' (see fitspy.core.fit_results.make_record()) """
+        self.set_param_values(record[0])
+        FitResults().update([self], records={self.fname: record})
+
+    def prepare_fit(self, reinit_guess=True):
+        """
+        Return the mask of the points to fit and the initial 'vary' states of the peak models
+        parameters (or None) after adapting the initial guesses and disabling the peak models
+        located in noisy areas (see fit())
+        """
+        x, y = self.x, self.y
+        mask, noise_level = self.fit_mask()
+        vary_init = None
+
+        # reinitialize 'ampli' and 'fwhm'
+        if reinit_guess and len(self.peak_models) > 0:
+            fwhm_min = max(np.diff(x))
+            for component in self.peak_models:
+                params = component.param_hints
+                if params['ampli']['vary']:
+                    ind = closest_index(x, params['x0']['value'])
+                    params['ampli']['value'] = self.y_no_outliers[ind]
+                for key in ['fwhm', 'fwhm_l', 'fwhm_r']:
+                    if key in params and params[key]['vary']:
+                        params[key]['value'] = max(fwhm_min, params[key]['value'])
+
+        # disable a peak_models in a noisy areas
+        if noise_level > 0 and len(self.peak_models) > 0:
+
+            # save initial 'vary' state
+            vary_init = [param['vary'] for component in self.peak_models
+                         for param in component.param_hints.values()]
+
+            # set 'ampli'/'fwhm' to 0 and 'vary' to False in noisy areas
+            ymean = uniform_filter1d(y, size=5)
+            for component in self.peak_models:
+                params = component.param_hints
+                ind = closest_index(x, params['x0']['value'])
+                if ymean[ind] < noise_level:
+                    params['ampli']['value'] = 0
+                    for key in params.keys():
+                        if key in ['fwhm', 'fwhm_l', 'fwhm_r']:
+                            params[key]['value'] = 0
+                        params[key]['vary'] = False
+
+        return mask, vary_init
+
+    def fit_mask(self):
+        """ Return the mask of the points to fit and the noise level (see fit()) """
+        x, y = self.x, self.y
+        mask = np.ones_like(x, dtype=bool)
+        noise_level = 0
+
+        if not self.fit_params['fit_negative']:
+            mask[y < 0] = False
+
+        if not self.fit_params['fit_outliers']:
+            x_outliers, _ = self.calculate_outliers()
+            if x_outliers is not None:
+                mask[np.where(np.isin(x, x_outliers))] = False
+
+        if self.fit_params['coef_noise'] > 0:
+            ampli_noise = eval_noise_amplitude(y)
+            noise_level = self.fit_params['coef_noise'] * ampli_noise
+            mask[y < noise_level] = False
+
+        return mask, noise_level
+
+    def restore_vary(self, vary_init):
+        """ Reassign the initial 'vary' values returned by prepare_fit() """
         if vary_init is not None:
             i = itertools.count()
-            components = self.peak_models
-            for component in components:
+            for component in self.peak_models:
                 for param in component.param_hints.values():
                     param['vary'] = vary_init[next(i)]
 
@@ -1025,18 +1163,9 @@ class Spectrum:
         ax.plot(x, factor * residual, 'r', label=label)
         ax.legend()
 
-    def save_profiles(self, dirname_profiles):
-        """ Save profiles in a '.csv' file located in 'dirname_params' """
-
-        # In Tkinter, reload() only applies update() to the 1rst spectrum,
-        # leaving the other spectra uninitialized.
-        if self.x is None:
-            return
-
-        _, name, _ = fileparts(self.fname)
-        fname_profiles = os.path.join(dirname_profiles, name + '_profiles.csv')
-        fname_profiles = check_or_rename(fname_profiles)
-
+    def get_profiles(self):
+        """ Return the profiles ('x', 'y_raw', 'y_subtract', 'y_fit', 'baseline', 'bkg' and
+            the peak models profiles named by their labels) as a dictionary """
         x, y_subtract = self.x.copy(), self.y.copy()
 
         baseline = np.zeros_like(x)
@@ -1061,17 +1190,33 @@ class Spectrum:
             y_peak = peak_model.eval(params, x=x)
             y_fit += y_peak
 
-            peak_label = f"model_{i}"
-            if len(self.peak_models) > 0 and self.peak_labels[i] != '':
-                peak_label = self.peak_labels[i]
-
-            profiles.update({peak_label: y_peak})
+            profiles.update({self.get_peak_label(i): y_peak})
 
         profiles.update({'y_fit': y_fit})
 
         first_keys = ['x', 'y_raw', 'y_subtract', 'y_fit', 'baseline', 'bkg']
         last_keys = [k for k in profiles.keys() if k not in first_keys]
-        dfr = pd.DataFrame({k: profiles[k] for k in first_keys + last_keys})
+        return {k: profiles[k] for k in first_keys + last_keys}
+
+    def get_peak_label(self, i):
+        """ Return the label of the i-th peak model used in the profiles export """
+        if self.peak_labels[i] != '':
+            return self.peak_labels[i]
+        return f"model_{i}"
+
+    def save_profiles(self, dirname_profiles):
+        """ Save profiles in a '.csv' file located in 'dirname_params' """
+
+        # In Tkinter, reload() only applies update() to the 1rst spectrum,
+        # leaving the other spectra uninitialized.
+        if self.x is None:
+            return
+
+        _, name, _ = fileparts(self.fname)
+        fname_profiles = os.path.join(dirname_profiles, name + '_profiles.csv')
+        fname_profiles = check_or_rename(fname_profiles)
+
+        dfr = pd.DataFrame(self.get_profiles())
         dfr.to_csv(fname_profiles, index=False, sep=';')
 
     def save_params(self, dirname_params):
@@ -1100,7 +1245,7 @@ class Spectrum:
 
     def save_stats(self, dirname_stats):
         """ Save statistics in a '.txt' file located in 'dirname_stats' """
-        if isinstance(self.result_fit, ModelResult):
+        if isinstance(self.result_fit, (ModelResult, CompactResult)):
             _, name, _ = fileparts(self.fname)
             fname_stats = os.path.join(dirname_stats, name + '_stats.txt')
             fname_stats = check_or_rename(fname_stats)
@@ -4,10 +4,12 @@ utilities functions
 import os
 import re
 import json
+import time
+from threading import Lock
+from collections import OrderedDict
 from pathlib import Path
 from io import StringIO
 import importlib
-import itertools
 import runpy
 import inspect
 import numpy as np
@@ -104,10 +106,12 @@ def load_from_json(filename):
     a dict object
     """
     with open(filename, 'r') as fid:
-        return json.load(fid,
-                         object_hook=lambda d: {  # to manage 'int' keys
-                             int(k) if k.lstrip('-').isdigit() else k: v
-                             for k, v in d.items()})
+        return json.load(fid, object_hook=int_keys)
+
+
+def int_keys(dictionary):
+    """ JSON object hook to manage 'int' keys """
+    return {int(k) if k.lstrip('-').isdigit() else k: v for k, v in dictionary.items()}
 
 
 def save_to_json(filename, dictionary, indent=3):
@@ -123,24 +127,59 @@ def save_to_json(filename, dictionary, indent=3):
     indent: int, optional
         json keyword for indentation. See dedicated doc for more details
     """
-    json_dumps = json.dumps(dictionary, indent=indent)
+    with open(filename, 'w') as fid:
+        fid.writelines(iterencode_json(dictionary, indent=indent))
+
+
+def iterencode_json(obj, indent=3, level=0):
+    """
+    Yield the chunks of the 'obj' JSON encoding, with an 'indent' indentation for the
+    dictionaries and the lists written on a single line (see save_to_json())
+    """
+    if isinstance(obj, dict) and len(obj) > 0:
+        newline = '\n' + ' ' * indent * (level + 1)
+        sep = '{'
+        for key, value in obj.items():
+            yield sep + newline + json_key(key) + ': '
+            yield from iterencode_json(value, indent=indent, level=level + 1)
+            sep = ','
+        yield '\n' + ' ' * indent * level + '}'
+    elif isinstance(obj, (list, tuple)):
+        yield encode_list(obj, indent=indent, level=level)
+    else:
+        yield json.dumps(obj)
+
 
-    # lists on a single line from https://stackoverflow.com/a/73748594/5964076
+def json_key(key):
+    """ Return the JSON encoding of a dictionary 'key' (converted as by the json module) """
+    return json.dumps({key: None})[1:-7]
+
+
+def encode_list(list_, indent=3, level=0):
+    """ Return the single line JSON encoding of 'list_' located at the 'level' depth """
+    if not any(has_list(item) for item in list_):
+        return json.dumps(list_, separators=(', ', ': '))
+
+    # nested lists, formatted as historically
+    # (lists on a single line from https://stackoverflow.com/a/73748594/5964076)
+    json_dumps = json.dumps(list_, indent=indent).replace('\n', '\n' + ' ' * indent * level)
     indent_ = ' ' * indent
     starts = [x.start() for x in re.finditer(r'\[', json_dumps)]
     ends = [x.start() + 1 for x in re.finditer(r'\]', json_dumps)]
-    origs = []
-    alters = []
-    for start, end in zip(starts, ends):
-        orig = json_dumps[start:end]
+    origs = [json_dumps[start:end] for start, end in zip(starts, ends)]
+    for orig in origs:
         alter = orig.replace('\n', '').replace(indent_, '').replace(',', ', ')
-        origs.append(orig)
-        alters.append(alter)
-    for orig, alter in zip(origs, alters):
         json_dumps = json_dumps.replace(orig, alter)
+    return json_dumps
 
-    with open(filename, 'w') as fid:
-        fid.write(json_dumps)
+
+def has_list(obj):
+    """ Return True if 'obj' is or contains a list """
+    if isinstance(obj, (list, tuple)):
+        return True
+    if isinstance(obj, dict):
+        return any(has_list(value) for value in obj.values())
+    return False
 
 
 def compress(array):
@@ -196,28 +235,113 @@ def load_models_from_py(fname):
         runpy.run_path(fname)
 
 
-def get_dim(fname):
-    """ Return the dimension (1, 2 or None) of the spectrum/spectra field """
+class PayloadCache:
+    """
+    Class dedicated to a short-lived LRU cache of the decoded payloads ('x', 'data') related to
+    files, to not decode twice a file read by a probe (see probe()) then loaded
 
-    dim = None
+    Attributes
+    ----------
+    maxsize: int
+        Maximum number of payloads
+    ttl: float
+        Lifetime (in seconds) of the payloads
+    items: collections.OrderedDict
+        Payloads and their creation time, related to the files (pathname, size, mtime)
+    """
+
+    def __init__(self, maxsize=2, ttl=30.):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.items = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def get_key(fname):
+        """ Return the key related to the 'fname' file current state """
+        stat = os.stat(fname)
+        return os.path.abspath(fname), stat.st_size, stat.st_mtime_ns
+
+    def get(self, fname):
+        """ Return the payload related to 'fname' or None """
+        key = self.get_key(fname)
+        with self._lock:
+            self.remove_expired()
+            if key in self.items:
+                self.items.move_to_end(key)
+                return self.items[key][0]
+        return None
+
+    def put(self, fname, payload):
+        """ Add the 'fname' payload """
+        key = self.get_key(fname)
+        with self._lock:
+            self.items[key] = (payload, time.monotonic())
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def remove_expired(self):
+        """ Remove the expired payloads """
+        tmin = time.monotonic() - self.ttl
+        for key in [key for key, (_, t0) in self.items.items() if t0 < tmin]:
+            del self.items[key]
+
+    def clear(self):
+        """ Remove all the payloads """
+        with self._lock:
+            self.items.clear()
+
+
+PAYLOADS = PayloadCache()
+
+
+def probe(fname):
+    """
+    Return the metadata of a spectrum/spectra field, read from the file header when possible
+
+    Returns
+    -------
+    metadata: dict
+        'dim': dimension (1, 2 or None) of the spectrum/spectra field,
+        'shape': shape of the data (None if not read),
+        'axis': dictionary with the 'offset', 'scale' and 'size' of the spectrum support (None if
+        not read)
+    """
+    metadata = {'dim': None, 'shape': None, 'axis': None}
 
     if Path(fname).suffix[:4] in ['.h5', '.h4', '.hdf']:
-        dim = 1
+        metadata['dim'] = 1
 
     elif Path(fname).suffix in ['.txt', '.csv', 'xy']:
         with open(fname, 'r') as fid:
-            dim = 2 if fid.readline()[0] == "\t" else 1
+            metadata['dim'] = 2 if fid.readline()[0] == "\t" else 1
 
     else:
         reader = get_reader_from_rsciio(fname)
         if reader is not None:
-            data = reader.file_reader(fname)[0]['data']
-            if data.ndim == 1:
-                dim = 1
-            elif data.ndim == 3:  # 2D-map
-                dim = 2
+            try:
+                fdict = reader.file_reader(fname, lazy=True)[0]
+            except Exception:  # pylint:disable=broad-except
+                fdict = reader.file_reader(fname)[0]
+            # data decoded anyway (readers without lazy mode) kept for the next loading
+            if isinstance(fdict['data'], np.ndarray):
+                PAYLOADS.put(fname, get_x_data_from_fdict(fdict))
+            shape = tuple(fdict['data'].shape)
+            axis = fdict['axes'][0]
+            metadata['shape'] = shape
+            metadata['axis'] = {key: axis[key] for key in ['offset', 'scale', 'size']}
+            if len(shape) == 1:
+                metadata['dim'] = 1
+            elif len(shape) == 3:  # 2D-map
+                metadata['dim'] = 2
+
+    return metadata
 
-    return dim
+
+def get_dim(fname):
+    """ Return the dimension (1, 2 or None) of the spectrum/spectra field """
+    return probe(fname)['dim']
 
 
 def get_reader_from_rsciio(fname):
@@ -231,21 +355,28 @@ def get_reader_from_rsciio(fname):
         return None
 
 
+def get_x_data_from_fdict(fdict):
+    """ Return the support ('x') and the intensities ('data') from a rsciio dictionary """
+    data = fdict['data']
+    axis = fdict['axes'][0]
+    x = axis['offset'] + axis['scale'] * np.arange(axis['size'])
+    return x, data
+
+
 def get_x_data_from_rsciio(fname):
     """ Return the spectrum/spectra support ('x') and the related intensities
         ('data') using the Rosettasciio library """
 
+    payload = PAYLOADS.get(fname)
+    if payload is not None:
+        return payload
+
     reader = get_reader_from_rsciio(fname)
 
     if reader is None:
         raise NotImplementedError(f"unreadable file {fname}")
 
-    fdict = reader.file_reader(fname)[0]
-    data = fdict['data']
-    axis = fdict['axes'][0]
-    x = axis['offset'] + axis['scale'] * np.arange(axis['size'])
-
-    return x, data
+    return get_x_data_from_fdict(reader.file_reader(fname)[0])
 
 
 def get_x_data_from_nxcansas(fname):
@@ -301,6 +432,88 @@ def get_x_data_from_nxcansas(fname):
     return data_x, data_y
 
 
+ASCII_FORMATS = {}  # ascii formats (see sniff_ascii_format) cached per directory and suffix
+
+
+def is_numeric_line(line):
+    """ Return True if the 2 first items of 'line' are numbers.
+        Accept lines like: "0, 0", "0.01 0", "1e-3, 5" """
+    parts = re.split(r'[,\s]+', line.strip())
+    if len(parts) < 2:
+        return False
+    try:
+        float(parts[0])
+        float(parts[1])
+        return True
+    except:
+        return False
+
+
+def sniff_ascii_format(fname, nbytes=4096):
+    """ Return the header length (number of lines) and the separator of a numeric ascii file
+        from its 'nbytes' first bytes, or None if not identified """
+    with open(fname, encoding="utf-8", errors="ignore") as fid:
+        sample = fid.read(nbytes)
+    lines = sample.split('\n')
+    if len(sample) == nbytes:
+        lines = lines[:-1]  # last line possibly incomplete
+    if sample.startswith('\ufeff') or any('\r' in line.rstrip('\r') for line in lines):
+        return None
+    header = next((i for i, line in enumerate(lines) if is_numeric_line(line)), None)
+    if header is None:
+        return None
+    sep = ',' if ',' in lines[header] else r'\s+'
+    return header, sep
+
+
+def check_ascii_header(fname, header):
+    """ Return True if the data of the 'fname' ascii file start after 'header' lines """
+    with open(fname, encoding="utf-8", errors="ignore") as fid:
+        lines = [fid.readline() for _ in range(header + 1)]
+    return is_numeric_line(lines[-1]) and not any(is_numeric_line(line) for line in lines[:-1])
+
+
+def read_ascii(fname, ascii_format):
+    """ Return the 'fname' numeric ascii file data as a pandas.DataFrame, parsed with the pandas
+        C engine according to 'ascii_format' (see sniff_ascii_format) """
+    header, sep = ascii_format
+    dfr = pd.read_csv(fname, sep=sep, header=None, skiprows=header,
+                      encoding="utf-8", encoding_errors="ignore")
+    # missing values may change the columns dtype wrt the slow path (rows filtered beforehand)
+    if not all(dtype.kind in 'iuf' for dtype in dfr.dtypes) or dfr.isna().to_numpy().any():
+        raise ValueError(f"non numeric or missing values in {fname}")
+    return dfr
+
+
+def read_ascii_fast(fname):
+    """ Return the 'fname' numeric ascii file data as a pandas.DataFrame (fast path), the file
+        format being sniffed or taken from the files of the same directory """
+    key = (os.path.dirname(os.path.abspath(fname)), Path(fname).suffix)
+    ascii_format = ASCII_FORMATS.get(key)
+    if ascii_format is not None and check_ascii_header(fname, ascii_format[0]):
+        try:
+            return read_ascii(fname, ascii_format)
+        except Exception:
+            pass
+    ascii_format = sniff_ascii_format(fname)
+    if ascii_format is None:
+        raise ValueError(f"unidentified format in {fname}")
+    dfr = read_ascii(fname, ascii_format)
+    ASCII_FORMATS[key] = ascii_format
+    return dfr
+
+
+def read_ascii_tolerant(fname):
+    """ Return the 'fname' ascii file data as a pandas.DataFrame, the non numeric lines being
+        ignored (slow path) """
+    with open(fname, encoding="utf-8", errors="ignore") as fid:
+        lines = fid.readlines()
+
+    clean_lines = [line for line in lines if is_numeric_line(line)]
+    return pd.read_csv(StringIO("".join(clean_lines)),
+                       sep=r'\s*,\s*|\s+', engine='python', header=None)
+
+
 def get_1d_profile(fname):
     """ Return the spectrum support ('x0') and its intensity ('y0') """
 
@@ -309,18 +522,6 @@ def get_1d_profile(fname):
     #  - then, 2-column ascii file like .csv, .txt, .xy, ...
     #  - finally, proprietary format as .dm3, .dm4, ...
 
-    def is_numeric_line(line):
-        # Accept lines like: "0, 0", "0.01 0", "1e-3, 5"
-        parts = re.split(r'[,\s]+', line.strip())
-        if len(parts) < 2:
-            return False
-        try:
-            float(parts[0])
-            float(parts[1])
-            return True
-        except:
-            return False
-
     if Path(fname).suffix[:4] in ['.h5', '.h4', '.hdf']:
         try:
             x0, y0 = get_x_data_from_nxcansas(fname)
@@ -330,12 +531,11 @@ def get_1d_profile(fname):
             return None, None, None
 
     try:
-        with open(fname, encoding="utf-8", errors="ignore") as fid:
-            lines = fid.readlines()
-
-        clean_lines = [line for line in lines if is_numeric_line(line)]
-        dfr = pd.read_csv(StringIO("".join(clean_lines)),
-                          sep=r'\s*,\s*|\s+', engine='python', header=None).dropna()
+        try:
+            dfr = read_ascii_fast(fname)
+        except Exception:
+            dfr = read_ascii_tolerant(fname)
+        dfr = dfr.dropna()
         if dfr.shape[1] == 2:
             dfr.columns = ['x0', 'y0']
             weights = None
@@ -372,10 +572,10 @@ def get_2d_map(fname):
         x, data = get_x_data_from_rsciio(fname)
         if data.ndim == 3:
             shape = data.shape
-            inds_i, inds_j = range(shape[1]), range(shape[2])
-            inds = np.array(list(itertools.product(inds_i, inds_j)))
-            data = data.reshape(shape[0], shape[1] * shape[2])
-            arr = np.vstack((np.hstack(([0, 0], x)), np.hstack((inds, data.T))))
+            arr = np.zeros((shape[1] * shape[2] + 1, len(x) + 2))
+            arr[0, 2:] = x
+            arr[1:, :2] = np.indices(shape[1:]).reshape(2, -1).T
+            arr[1:, 2:] = data.reshape(shape[0], shape[1] * shape[2]).T
         else:
             raise IOError(f"incorrect dimension associated with {fname}")
 
@@ -2,51 +2,666 @@
 utilities functions related to multiprocessing
 
 notes:
-The strategy (see commented lines below) of passing the models to the workers
-once instead of duplicating them for each spectrum turned out to be slightly
-  more costly in terms of CPU time finally (?).
+The workers are gathered in a persistent pool (see 'WorkerPool'), started lazily at the first
+fit and reused by the next ones, the modules being imported once per worker. The pool is
+restarted when the number of CPUs changes and shut down at the interpreter exit.
+
+The model applied to the spectra (FitPlan) is pickled once per fit in a shared memory block,
+read once per worker and per fit (see 'get_fit_plan'), the spectra being passed to the workers
+by their fname (see 'load_spectrum'). The spectra maps arrays are placed in a shared memory
+block once per map (see 'share_map'), the workers reading the map spectra raw data from their
+row. The other spectra data are placed in a shared memory block per fit (see 'SharedArrays')
+where the workers also write the preprocessed data, the returned objects being limited to the
+compact fit results (see fitspy.core.fit_results).
+
+The figures (see Spectra.save_figures()) are rendered by chunks of spectra by the same
+workers, each one holding a matplotlib Figure (Agg canvas, without pyplot) created at its
+initialization and whose artists are updated from one spectrum to another (see
+'FigureRenderer').
 """
-from concurrent.futures import ProcessPoolExecutor
+import os
+import atexit
+import weakref
+import itertools
+from types import SimpleNamespace
+from threading import Lock, Thread
+from queue import Empty
+from concurrent.futures import ProcessPoolExecutor, BrokenExecutor, wait, as_completed
+from concurrent.futures import FIRST_COMPLETED
+from multiprocessing import Queue, shared_memory, active_children
+import numpy as np
 import dill
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+
+from fitspy.core.spectrum import Spectrum
+from fitspy.core.warm_start import init_from_seed
+from fitspy.core.fit_results import make_record
+
+TILES_PER_CPU = 4  # number of contiguous tiles of spectra per CPU
+ARRAYS_ATTRS = ['x0', 'y0', 'weights0', 'x', 'y', 'weights', 'result_fit']
+SPECTRUM_KEYS = ARRAYS_ATTRS + ['outliers_limit', 'peak_models', 'peak_index', '_bkg_models']
+
+
+def fit_tile(args):
+    """ Fitting function used in multiprocessing for a tile of contiguous spectra, each
+        spectrum being initialized from its seed (if any) """
+    key, plan_ref, layouts, items, seeds = args
+
+    fit_plan, extra_keys = get_fit_plan(key, plan_ref)
+    blocks = [SharedArrays.attach(layout) for layout in layouts]
+    arrays = blocks[0][1]  # fit block, followed by the maps blocks
+    spectra = []
+    outputs = []
+    try:
+        for (spec, source, ind_out), seed in zip(items, seeds):
+            spectrum = load_spectrum(spec, fit_plan, extra_keys)
+            imap, inds = source
+            if imap >= 0:
+                # raw data read from the map block (see share_map())
+                arrays_map = blocks[imap][1]
+                npts = len(arrays_map['x0'])
+                spectrum.x0 = arrays_map['x0'].copy()
+                spectrum.y0 = arrays_map['intensity'][inds * npts:(inds + 1) * npts].copy()
+                if len(arrays_map['outliers_limit']) > 0:
+                    spectrum.outliers_limit = arrays_map['outliers_limit'].copy()
+            else:
+                ind_x, ind_y, npts, has_weights, has_limit = inds
+                spectrum.x0 = arrays['x0'][ind_x:ind_x + npts].copy()
+                spectrum.y0 = arrays['y0'][ind_y:ind_y + npts].copy()
+                if has_weights:
+                    spectrum.weights0 = arrays['weights0'][ind_y:ind_y + npts].copy()
+                if has_limit:
+                    spectrum.outliers_limit = arrays['outliers_limit'][ind_y:ind_y + npts].copy()
+            spectra.append(spectrum)
+
+            seeded = seed is not None and init_from_seed(spectrum, spectra[seed])
+            spectrum.preprocess()
+            spectrum.fit(reinit_guess=not seeded, fit_plan=fit_plan)
+
+            # outputs written in the shared arrays (from the 'ind_out' index)
+            npts_out = len(spectrum.x)
+            arrays['x'][ind_out:ind_out + npts_out] = spectrum.x
+            arrays['y'][ind_out:ind_out + npts_out] = spectrum.y
+            if spectrum.weights is not None:
+                arrays['weights'][ind_out:ind_out + npts_out] = spectrum.weights
+            if spectrum.baseline.y_eval is not None:
+                arrays['y_eval'][ind_out:ind_out + npts_out] = spectrum.baseline.y_eval
+            outputs.append((npts_out, spectrum.weights is not None,
+                            spectrum.baseline.y_eval is not None,
+                            spectrum.baseline.is_subtracted,
+                            make_record(spectrum)))
+
+            shared_queue.put(1)
+    finally:
+        arrays = arrays_map = None
+        for shm, arrays_ in blocks:
+            arrays_.clear()
+            shm.close()
+
+    return outputs
+
+
+def load_spectrum(spec, fit_plan, extra_keys):
+    """ Return the spectrum (without data) related to 'spec': the pickled spectrum (see
+        dumps_light()) or, if 'fit_plan' is given, the fname and the 'extra_keys' attributes
+        values of a spectrum whose other attributes are set by the plan """
+    if fit_plan is None:
+        spectrum = dill.loads(spec)
+    else:
+        spectrum = Spectrum()
+        fit_plan.set_attributes(spectrum)
+        spectrum.fname, extra_values = spec
+        for key, value in zip(extra_keys, extra_values):
+            setattr(spectrum, key, value)
+    spectrum.result_fit = lambda: None
+    return spectrum
+
+
+def get_extra_keys(fit_plan):
+    """ Return the spectrum attributes (apart from the data) not set by 'fit_plan' """
+    if fit_plan is None:
+        return []
+    spectrum = Spectrum()
+    fit_plan.set_attributes(spectrum)
+    return [key for key in vars(spectrum)
+            if key not in fit_plan.attrs_dict and key not in SPECTRUM_KEYS]
+
+
+def dumps_light(spectrum):
+    """ Return the pickled 'spectrum' without its data arrays and its fit result """
+    attrs = {key: getattr(spectrum, key) for key in ARRAYS_ATTRS}
+    y_eval = spectrum.baseline.y_eval
+    try:
+        for key in ARRAYS_ATTRS:
+            setattr(spectrum, key, None)
+        spectrum.baseline.y_eval = None
+        return dill.dumps(spectrum)
+    finally:
+        for key, value in attrs.items():
+            setattr(spectrum, key, value)
+        spectrum.baseline.y_eval = y_eval
+
+
+def dumps_plot(spectrum):
+    """ Return the pickled 'spectrum' with its fit result reduced to the fit success status """
+    result_fit = spectrum.result_fit
+    if hasattr(result_fit, 'success'):
+        spectrum.result_fit = SimpleNamespace(success=bool(result_fit.success))
+    else:
+        spectrum.result_fit = SimpleNamespace()
+    try:
+        return dill.dumps(spectrum)
+    finally:
+        spectrum.result_fit = result_fit
+
+
+class PlotRecorder:
+    """
+    Class dedicated to the recording of the plotting calls made on an axis (see Spectrum.plot()),
+    to be replayed on a matplotlib axis or used to update the data of the artists issued from a
+    previous replay
+
+    Attributes
+    ----------
+    calls: list of tuple
+        (name, args, kwargs) of the recorded calls
+    """
+    DATA_KWARGS = {'hlines': ['y', 'xmin', 'xmax']}
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def record(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return [Line2D([], [])] if name == 'plot' else None
+
+        return record
+
+    def signature(self):
+        """ Return the signature of the recorded calls, apart from their data """
+        items = []
+        for name, args, kwargs in self.calls:
+            data_kwargs = self.DATA_KWARGS.get(name, [])
+            items.append((name, [arg if isinstance(arg, str) else None for arg in args],
+                          {key: val for key, val in kwargs.items() if key not in data_kwargs}))
+        return repr(items)
+
+    def replay(self, ax):
+        """ Replay the recorded calls on 'ax' and return the related artists """
+        return [getattr(ax, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+    def update(self, ax, artists):
+        """ Update the data of the 'artists' issued from a replay with the same signature, and
+            the 'ax' data limits. Return False if a call is not supported """
+        segments = []
+        for (name, args, kwargs), artist in zip(self.calls, artists):
+            if name == 'plot':
+                artist[0].set_data(*[arg for arg in args if not isinstance(arg, str)])
+            elif name == 'hlines':
+                segments.append([(kwargs['xmin'], kwargs['y']), (kwargs['xmax'], kwargs['y'])])
+                artist.set_segments(segments[-1:])
+            elif name != 'set_prop_cycle':
+                return False
+        ax.relim()
+        for segment in segments:
+            ax.update_datalim(segment)
+        return True
+
+
+class FigureRenderer:
+    """
+    Class dedicated to the rendering of the spectra figures in a single matplotlib Figure (Agg
+    canvas, without pyplot), the artists being reused from one spectrum to another when the
+    plotting calls only differ by their data
+
+    Attributes
+    ----------
+    fig: matplotlib.figure.Figure
+        Figure used for the rendering
+    ax: matplotlib.axes.Axes
+        Axis of the figure
+    signature: str
+        Signature of the plotting calls related to the current artists (see PlotRecorder)
+    artists: list
+        Artists related to the plotting calls
+    """
+
+    def __init__(self):
+        self.fig = Figure()
+        self.ax = self.fig.add_subplot()
+        self.signature = None
+        self.artists = []
+
+    def save(self, spectrum, fname_fig, bounds=None):
+        """ Save the 'spectrum' figure in 'fname_fig' with the axis 'bounds' (if given) """
+        recorder = PlotRecorder()
+        spectrum.plot(recorder, show_peak_models=False)
+        signature = recorder.signature()
+        ax = self.ax
+        if signature != self.signature or not recorder.update(ax, self.artists):
+            ax.cla()
+            self.artists = recorder.replay(ax)
+            self.signature = signature
+        ax.set_autoscale_on(True)
+        ax.autoscale_view()
+        if bounds is not None:
+            ax.set_xlim(bounds[0])
+            ax.set_ylim(bounds[1])
+        self.fig.savefig(fname_fig)
+
+
+def plot_chunk(args):
+    """ Plotting function used in multiprocessing for a chunk of spectra """
+    items, bounds = args
+    for spectrum_, fname_fig in items:
+        shared_renderer.save(dill.loads(spectrum_), fname_fig, bounds=bounds)
+    return len(items)
+
+
+class SharedArrays:
+    """
+    Class dedicated to 1D arrays stored in a single shared memory block
 
+    Attributes
+    ----------
+    shm: multiprocessing.shared_memory.SharedMemory
+        Shared memory block
+    layout: tuple
+        Block name and (name, offset, size) of each array, to be passed to the workers
+    arrays: dict of numpy.ndarray
+        Arrays (views on the shared memory block)
 
-def fit(spectrum_):
-    """ Fitting function used in multiprocessing """
+    Parameters
+    ----------
+    sizes: dict
+        Sizes of the float arrays to allocate
+    """
 
-    spectrum = dill.loads(spectrum_)
-    spectrum.preprocess()
-    spectrum.fit()
+    def __init__(self, sizes):
+        nbytes = max(1, 8 * sum(sizes.values()))
+        self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        items, offset = [], 0
+        for name, size in sizes.items():
+            items.append((name, offset, size))
+            offset += 8 * size
+        self.layout = (self.shm.name, tuple(items))
+        _, self.arrays = self.attach(self.layout, shm=self.shm)
 
-    shared_queue.put(1)
+    @staticmethod
+    def attach(layout, shm=None):
+        """ Return the shared memory block and the arrays related to 'layout' """
+        name, items = layout
+        if shm is None:
+            shm = shared_memory.SharedMemory(name=name)
+        arrays = {key: np.ndarray((size,), dtype=float, buffer=shm.buf, offset=offset)
+                  for key, offset, size in items}
+        return shm, arrays
 
-    return (spectrum.x, spectrum.y, spectrum.weights,
-            spectrum.baseline.y_eval, spectrum.baseline.is_subtracted,
-            dill.dumps(spectrum.result_fit))
+    def release(self):
+        """ Release the arrays and unlink the shared memory block """
+        self.arrays = {}
+        self.shm.close()
+        self.shm.unlink()
 
 
-def initializer(queue_incr):
-    """ Initialize a global var shared btw the processes and the progressbar """
-    global shared_queue  # pylint:disable=global-variable-undefined
+def share_map(spectra_map):
+    """ Return the shared memory block holding the 'spectra_map' support, intensities and
+        outliers limit, created once per map and kept up to the map deletion (recreated if
+        these arrays are replaced) """
+    arrays = (spectra_map.x0, spectra_map.intensity, spectra_map.outliers_limit)
+    if spectra_map.shared is not None:
+        arrays_ref, shared, finalizer = spectra_map.shared
+        if all(arr is arr_ref for arr, arr_ref in zip(arrays, arrays_ref)):
+            return shared
+        finalizer()
+
+    x0, limit = spectra_map.x0, spectra_map.outliers_limit
+    intensity = np.asarray(spectra_map.intensity, dtype=float)
+    sizes = {'x0': len(x0), 'intensity': intensity.size,
+             'outliers_limit': len(limit) if limit is not None else 0}
+    shared = SharedArrays(sizes)
+    shared.arrays['x0'][:] = x0
+    shared.arrays['intensity'][:] = intensity.ravel()
+    if limit is not None:
+        shared.arrays['outliers_limit'][:] = limit
+    spectra_map.shared = (arrays, shared, weakref.finalize(spectra_map, shared.release))
+    return shared
+
+
+def get_map_row(spectrum, spectra_map):
+    """ Return the row of the 'spectra_map' intensities holding the 'spectrum' raw data (and
+        sharing the map outliers limit) or None """
+    pid = spectra_map.pixel_id(os.path.normpath(spectrum.fname))
+    if pid is None or spectrum.weights0 is not None or len(spectrum.y0) != len(spectra_map.x0):
+        return None
+    arrays = share_map(spectra_map).arrays
+    npts, row = len(spectra_map.x0), int(spectra_map.inds_flat[pid])
+    if spectra_map.outliers_limit is None:
+        same_limit = spectrum.outliers_limit is None
+    else:
+        same_limit = spectrum.outliers_limit is not None and \
+                     np.array_equal(spectrum.outliers_limit, arrays['outliers_limit'])
+    if same_limit and np.array_equal(spectrum.x0, arrays['x0']) and \
+            np.array_equal(spectrum.y0, arrays['intensity'][row * npts:(row + 1) * npts],
+                           equal_nan=True):
+        return row
+    return None
+
+
+def get_fit_plan(key, plan_ref):
+    """ Return the fit plan related to 'key' and its extra keys (see get_extra_keys()), read
+        from the 'plan_ref' shared memory block (name and size) once per worker and per fit """
+    global shared_fit_plan  # pylint:disable=global-variable-undefined
+    if shared_fit_plan[0] != key:
+        fit_plan = None
+        if plan_ref is not None:
+            name, size = plan_ref
+            shm = shared_memory.SharedMemory(name=name)
+            try:
+                fit_plan = dill.loads(bytes(shm.buf[:size]))
+            finally:
+                shm.close()
+        shared_fit_plan = (key, fit_plan, get_extra_keys(fit_plan))
+    return shared_fit_plan[1:]
+
+
+def initializer(queue_incr, queue_workers=None):
+    """ Initialize a global var shared btw the processes and the progressbar and the worker
+        figure renderer, preload the modules used during the fit and report the worker
+        process id in 'queue_workers' """
+    # pylint:disable=global-variable-undefined
+    global shared_queue, shared_fit_plan, shared_renderer
     shared_queue = queue_incr
+    shared_fit_plan = (None, None, [])
+    shared_renderer = FigureRenderer()
+
+    # pylint:disable=import-outside-toplevel, unused-import
+    import fitspy.core.spectrum
+    import fitspy.core.fit_plan
+
+    if queue_workers is not None:
+        queue_workers.put(os.getpid())
+
+
+class WorkerPool:
+    """
+    Class dedicated to a persistent pool of workers reused from one fit to another
+
+    Attributes
+    ----------
+    executor: concurrent.futures.ProcessPoolExecutor
+        Executor related to the workers. None if the pool is not started
+    ncpus: int
+        Number of workers
+    queue_incr: multiprocessing.Queue
+        Queue shared with the workers to count the fitted spectra
+    pending: int
+        Number of submitted tiles not yet completed
+    pids: set of int
+        Process ids of the started workers (reported by the workers at their initialization)
+    broken: bool
+        True if a worker terminated abruptly, all the workers being terminated by the executor
+    """
+
+    def __init__(self):
+        self.executor = None
+        self.ncpus = 0
+        self.queue_incr = None
+        self.queue_workers = None
+        self.pending = 0
+        self.pids = set()
+        self.broken = False
+        self._keys = itertools.count()
+        self._lock = Lock()  # held during a fit
+        self._pending_lock = Lock()  # held by the done callbacks (executor thread)
+
+    def get_executor(self, ncpus):
+        """ Return the executor with 'ncpus' workers, (re)started if needed """
+        if self.executor is not None and (self.ncpus != ncpus or self.broken):
+            self.shutdown()
+        if self.executor is None:
+            self.queue_incr = Queue()
+            self.queue_workers = Queue()
+            self.executor = ProcessPoolExecutor(initializer=initializer,
+                                                initargs=(self.queue_incr, self.queue_workers),
+                                                max_workers=ncpus)
+            self.ncpus = ncpus
+        return self.executor
+
+    def shutdown(self):
+        """ Shut down the workers """
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.queue_incr.close()
+            self.queue_workers.close()
+        self.executor = None
+        self.ncpus = 0
+        self.queue_incr = None
+        self.queue_workers = None
+        self.pids = set()
+        self.broken = False
+        with self._pending_lock:
+            self.pending = 0
+
+    def state(self):
+        """ Return the pool state: number of workers, live workers and pending tiles """
+        live_workers = 0
+        if self.executor is not None:
+            try:
+                while True:
+                    self.pids.add(self.queue_workers.get_nowait())
+            except Empty:
+                pass
+            pids = {process.pid for process in active_children()}
+            live_workers = len(self.pids & pids)
+        return {'ncpus': self.ncpus, 'live_workers': live_workers, 'queue_depth': self.pending}
+
+    def map(self, args, ncpus, queue_incr, nspectra):
+        """ Return the results of 'fit_tile' applied to the 'args' tiles by 'ncpus' workers,
+            the 'nspectra' fitted spectra being reported in 'queue_incr' """
+        results = [None] * len(args)
+        for i, result in self.imap(args, ncpus, queue_incr, nspectra):
+            results[i] = result
+        return results
+
+    def imap(self, args, ncpus, queue_incr, nspectra, cancel_event=None):
+        """ Yield the (index, result) of 'fit_tile' applied to the 'args' tiles by 'ncpus'
+            workers as soon as each tile is completed, the 'nspectra' fitted spectra being
+            reported in 'queue_incr'. Once 'cancel_event' is set, the tiles not started yet
+            are cancelled (and reported as completed in 'queue_incr') """
+        with self._lock:
+            executor = self.get_executor(ncpus)
+            relay = Thread(target=relay_queue, args=(self.queue_incr, queue_incr, nspectra))
+            relay.start()
+
+            futures = {self.submit(executor, fit_tile, arg): i for i, arg in enumerate(args)}
+            try:
+                pending = set(futures)
+                while len(pending) > 0:
+                    done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                    if cancel_event is not None and cancel_event.is_set():
+                        for future in pending:
+                            future.cancel()
+                    for future in done:
+                        if future.cancelled():
+                            self.queue_incr.put(len(args[futures[future]][3]))
+                        else:
+                            yield futures[future], future.result()
+            except BaseException:  # including the generator closing
+                # release the relay thread and restart the workers at the next fit
+                self.queue_incr.put(nspectra)
+                relay.join()
+                self.shutdown()
+                raise
+            relay.join()
+
+    def imap_unordered(self, func, args, ncpus):
+        """ Yield the results of 'func' applied to 'args' by 'ncpus' workers as soon as each
+            one is completed (the workers being shared with the fits) """
+        with self._lock:
+            executor = self.get_executor(ncpus)
+            futures = [self.submit(executor, func, arg) for arg in args]
+            try:
+                for future in as_completed(futures):
+                    yield future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def submit(self, executor, func, arg):
+        """ Submit 'func' applied to 'arg' to 'executor' and count it as pending """
+        with self._pending_lock:
+            self.pending += 1
+        future = executor.submit(func, arg)
+        future.add_done_callback(self._task_done)
+        return future
+
+    def next_key(self):
+        """ Return a new key to identify the fit plan of a fit """
+        return next(self._keys)
+
+    def _task_done(self, future):
+        with self._pending_lock:
+            self.pending = max(0, self.pending - 1)
+        if not future.cancelled() and isinstance(future.exception(), BrokenExecutor):
+            self.broken = True
+
+
+def relay_queue(queue_src, queue_dst, ntot):
+    """ Forward 'ntot' increments from 'queue_src' to 'queue_dst' """
+    count = 0
+    while count < ntot:
+        incr = queue_src.get()
+        count += incr
+        queue_dst.put(incr)
+
+
+WORKER_POOL = WorkerPool()
+atexit.register(WORKER_POOL.shutdown)
+
+
+def get_pool_state():
+    """ Return the persistent pool state (see WorkerPool.state()) """
+    return WORKER_POOL.state()
+
+
+def shutdown_pool():
+    """ Shut down the persistent pool workers (restarted at the next fit if needed) """
+    WORKER_POOL.shutdown()
+
+
+def fit_mp(spectra, ncpus, queue_incr, fit_plan=None, seeds=None, callback=None,
+           cancel_event=None, maps=None):
+    """ Multiprocessing fit function applied to spectra.
+        The spectra are split in contiguous tiles fitted by the persistent pool workers.
+        If 'seeds' (indices of the spectra used for the initialization) are given, each
+        spectrum is initialized from its seed (when belonging to the same tile).
+        If 'maps' (spectra map related to each spectrum or None) are given, the raw data of
+        the maps spectra are read by the workers from the maps blocks (see share_map()).
+        Each time a tile is completed, 'callback' (if any) is called with the tile spectra and
+        their records. Once 'cancel_event' is set, the tiles not started yet are cancelled.
+        Return the records of the fit results (see fitspy.core.fit_results.make_record),
+        None for the spectra of the cancelled tiles """
+    if len(spectra) == 0:
+        return []
+
+    key = WORKER_POOL.next_key()
+    seeds = seeds or [None] * len(spectra)
+    maps = maps or [None] * len(spectra)
+    extra_keys = get_extra_keys(fit_plan)
+
+    # raw data of the maps spectra read from the maps blocks, the other ones being placed in
+    # the fit block (identical consecutive supports stored once)
+    layouts, imaps = [None], {}
+    sources, inds_out, supports, others = [], [], [], []
+    size_x = size_y = size_out = 0
+    for spectrum, spectra_map in zip(spectra, maps):
+        row = get_map_row(spectrum, spectra_map) if spectra_map is not None else None
+        if row is not None:
+            if id(spectra_map) not in imaps:
+                imaps[id(spectra_map)] = len(layouts)
+                layouts.append(share_map(spectra_map).layout)
+            sources.append((imaps[id(spectra_map)], row))
+        else:
+            if len(supports) == 0 or not np.array_equal(spectrum.x0, supports[-1]):
+                supports.append(spectrum.x0)
+                size_x += len(spectrum.x0)
+            sources.append((-1, (size_x - len(spectrum.x0), size_y, len(spectrum.y0),
+                                 spectrum.weights0 is not None,
+                                 spectrum.outliers_limit is not None)))
+            others.append((spectrum, size_y))
+            size_y += len(spectrum.y0)
+        inds_out.append(size_out)
+        size_out += len(spectrum.y0)
+    has_weights = any(spectrum.weights0 is not None for spectrum, _ in others)
+    has_limit = any(spectrum.outliers_limit is not None for spectrum, _ in others)
+    sizes = {'x0': size_x, 'y0': size_y, 'weights0': size_y if has_weights else 0,
+             'outliers_limit': size_y if has_limit else 0,
+             'x': size_out, 'y': size_out, 'weights': size_out, 'y_eval': size_out}
+    shared = SharedArrays(sizes)
+    layouts[0] = shared.layout
+
+    # fit plan pickled once and read by the workers once per fit (see get_fit_plan())
+    plan_ref = shm_plan = None
+    if fit_plan is not None:
+        data = dill.dumps(fit_plan)
+        shm_plan = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+        shm_plan.buf[:len(data)] = data
+        plan_ref = (shm_plan.name, len(data))
 
+    records = [None] * len(spectra)
+    try:
+        arrays = shared.arrays
+        if len(supports) > 0:
+            arrays['x0'][:] = np.concatenate(supports)
+        for spectrum, ind_y in others:
+            inds = slice(ind_y, ind_y + len(spectrum.y0))
+            arrays['y0'][inds] = spectrum.y0
+            if spectrum.weights0 is not None:
+                arrays['weights0'][inds] = spectrum.weights0
+            if spectrum.outliers_limit is not None:
+                arrays['outliers_limit'][inds] = spectrum.outliers_limit
 
-def fit_mp(spectra, ncpus, queue_incr):
-    """ Multiprocessing fit function applied to spectra """
-    args = []
-    for spectrum in spectra:
-        args.append(dill.dumps(spectrum))
+        # spectra passed by their fname (and extra attributes values) if the plan is given
+        if fit_plan is not None:
+            specs = [(spectrum.fname, [getattr(spectrum, key) for key in extra_keys])
+                     for spectrum in spectra]
+        else:
+            specs = [dumps_light(spectrum) for spectrum in spectra]
 
-    with ProcessPoolExecutor(initializer=initializer,
-                             initargs=(queue_incr,),
-                             max_workers=ncpus) as executor:
-        results = executor.map(fit, args)
+        args = []
+        ntiles = min(len(spectra), TILES_PER_CPU * ncpus)
+        bounds = [round(i * len(spectra) / ntiles) for i in range(ntiles + 1)]
+        for imin, imax in zip(bounds[:-1], bounds[1:]):
+            items = list(zip(specs[imin:imax], sources[imin:imax], inds_out[imin:imax]))
+            # seeds outside the tile are discarded
+            seeds_ = [seed - imin if seed is not None and imin <= seed < imax else None
+                      for seed in seeds[imin:imax]]
+            args.append((key, plan_ref, layouts, items, seeds_))
 
-    for res, spectrum in zip(results, spectra):
-        spectrum.x = res[0]
-        spectrum.y = res[1]
-        spectrum.weights = res[2]
-        spectrum.baseline.y_eval = res[3]
-        spectrum.baseline.is_subtracted = res[4]
-        spectrum.result_fit = dill.loads(res[5])
+        for itile, results in WORKER_POOL.imap(args, ncpus, queue_incr, len(spectra),
+                                               cancel_event=cancel_event):
+            inds_tile = range(bounds[itile], bounds[itile + 1])
+            for i, res in zip(inds_tile, results):
+                spectrum = spectra[i]
+                npts, weighted, has_y_eval, is_subtracted, record = res
+                inds = slice(inds_out[i], inds_out[i] + npts)
+                spectrum.x = arrays['x'][inds].copy()
+                spectrum.y = arrays['y'][inds].copy()
+                spectrum.weights = arrays['weights'][inds].copy() if weighted else None
+                spectrum.baseline.y_eval = arrays['y_eval'][inds].copy() if has_y_eval else None
+                spectrum.baseline.is_subtracted = is_subtracted
+                spectrum.reassign_params(values=record[0])
+                records[i] = record
+            if callback is not None:
+                callback([spectra[i] for i in inds_tile], [records[i] for i in inds_tile])
+    finally:
+        del arrays
+        shared.release()
+        if shm_plan is not None:
+            shm_plan.close()
+            shm_plan.unlink()
 
-        spectrum.reassign_params()
+    return records
@@ -0,0 +1,252 @@
+"""
+Module related to the variable projection (VarPro) fitting of the composite models
+
+notes:
+The parameters entering linearly the composite model (peak 'ampli', Constant/Linear/Parabolic
+background coefficients) are solved exactly by a (bounded) linear least-squares at each
+evaluation, and the minimizer only iterates over the nonlinear parameters (x0, fwhm, ...).
+The linear parameters are then no more sensitive to their initial guesses.
+The VarPro solution is either refined by a final fit of all the parameters (see Spectrum.fit())
+or directly returned as a lmfit ModelResult (see 'make_result').
+"""
+import numpy as np
+from scipy.optimize import lsq_linear
+from lmfit import minimize
+from lmfit.model import ModelResult
+from lmfit.models import ConstantModel, LinearModel, ParabolicModel
+
+from fitspy.core.jacobian import get_model_jacobian, make_jacobian
+
+BKG_LINEAR_PARAMS = {ConstantModel: ('c',),
+                     LinearModel: ('slope', 'intercept'),
+                     ParabolicModel: ('a', 'b', 'c')}
+
+
+def get_linear_params(model):
+    """ Return the basenames of the parameters entering linearly 'model' """
+    if type(model) in BKG_LINEAR_PARAMS:
+        return BKG_LINEAR_PARAMS[type(model)]
+    return getattr(model.func, 'linear_params', ())
+
+
+def varpro_fit(comp_model, params, x, y, weights=None, method='leastsq', max_nfev=None,
+               fit_kws=None, analytic_jac=True, **kwargs):
+    """
+    Fit 'comp_model' to (x, y) by variable projection and update 'params' values in place
+
+    Parameters
+    ----------
+    comp_model: lmfit.Model or lmfit.CompositeModel
+        Model to fit (sum of the peak and background models)
+    params: lmfit.Parameters
+        Parameters related to 'comp_model'. The 'vary' status and the bounds are respected
+    x, y: numpy.ndarray
+        Support and intensity to fit
+    weights: numpy.ndarray, optional
+        Weights applied to the residual
+    method: str, optional
+        Method passed to lmfit.minimize() for the nonlinear parameters
+    max_nfev: int, optional
+        Maximum number of function evaluations
+    fit_kws: dict, optional
+        Dictionary of optional arguments passed to lmfit.minimize()
+    analytic_jac: bool, optional
+        Activation key to use the analytic jacobian of the models (if all of them provide one)
+        with the 'leastsq' and the 'least_squares' methods
+    kwargs: dict, optional
+        Extra independent variables passed to the models (with a not None value)
+
+    Returns
+    -------
+    nfev: int
+        Number of function evaluations. 0 if the variable projection can not be applied
+        (parameters constrained by expressions or no varying linear parameters)
+    success: bool
+        Success status of the minimization over the nonlinear parameters
+    message: str
+        Message related to the minimization over the nonlinear parameters
+    """
+    if any(par.expr for par in params.values()):
+        return 0, False, "Variable projection not applied"
+
+    components = []
+    for model in comp_model.components:
+        basenames = [name[len(model.prefix):] for name in model.param_names]
+        linears = [name for name in get_linear_params(model)
+                   if name in basenames and params[model.prefix + name].vary]
+        # the models are null when all their linear parameters are null
+        is_homogeneous = len(linears) == len(get_linear_params(model))
+        indep = {key: kwargs[key] for key in model.independent_vars
+                 if key != 'x' and kwargs.get(key) is not None}
+        components.append((model, get_model_jacobian(model), basenames, linears, indep,
+                           is_homogeneous))
+
+    lin_names = [model.prefix + name for model, _, _, linears, _, _ in components
+                 for name in linears]
+    if len(lin_names) == 0:
+        return 0, False, "Variable projection not applied"
+
+    lbounds = np.array([params[name].min for name in lin_names])
+    ubounds = np.array([params[name].max for name in lin_names])
+    weights = np.ones_like(y) if weights is None else np.asarray(weights)
+
+    def solve(pars):
+        """ Return the linear parameters values, the related model and the weighted matrix of
+            the linear problem """
+        y_fixed = np.zeros_like(y)
+        columns = []
+        for model, _, basenames, linears, indep, is_homogeneous in components:
+            values = {name: pars[model.prefix + name].value for name in basenames}
+            values.update({name: 0. for name in linears})
+            y0 = 0. if is_homogeneous else model.func(x, **values, **indep)
+            y_fixed += y0
+            for name in linears:
+                columns.append(model.func(x, **{**values, name: 1.}, **indep) - y0)
+        mat = np.asarray(columns).T
+        rhs = (y - y_fixed) * weights
+        mat_w = mat * weights[:, np.newaxis]
+        coefs = np.linalg.lstsq(mat_w, rhs, rcond=None)[0]
+        if np.any(coefs < lbounds) or np.any(coefs > ubounds):
+            coefs = lsq_linear(mat_w, rhs, bounds=(lbounds, ubounds), method='bvls').x
+        return coefs, y_fixed + mat @ coefs, mat_w
+
+    def residual(pars):
+        _, y_eval, _ = solve(pars)
+        return (y_eval - y) * weights
+
+    def jacobian(pars):
+        """ Return the jacobian of the residual wrt the nonlinear parameters (Kaufman
+            approximation: model derivatives projected onto the orthogonal complement of the
+            linear problem columns) """
+        coefs, _, mat_w = solve(pars)
+        lin_values = dict(zip(lin_names, coefs))
+        var_names = [name for name, par in pars.items() if par.vary]
+        inds = {name: i for i, name in enumerate(var_names)}
+        jac = np.zeros((len(y), len(var_names)))
+        for model, jac_func, basenames, _, indep, _ in components:
+            names = [model.prefix + name for name in basenames]
+            if not any(name in inds for name in names):
+                continue
+            values = {basename: lin_values.get(name, pars[name].value)
+                      for basename, name in zip(basenames, names)}
+            derivs = jac_func(x, **values, **indep)
+            for basename, name in zip(basenames, names):
+                if name in inds:
+                    jac[:, inds[name]] += derivs[basename]
+        jac *= weights[:, np.newaxis]
+
+        # projection (linear parameters blocked on a bound are excluded)
+        free = (coefs > lbounds) & (coefs < ubounds)
+        if free.any():
+            mat_q, _ = np.linalg.qr(mat_w[:, free])
+            jac -= mat_q @ (mat_q.T @ jac)
+        return jac
+
+    pars_nl = params.copy()
+    for name in lin_names:
+        pars_nl[name].vary = False
+
+    fit_kws = dict(fit_kws or {})
+    jac_key = {'leastsq': 'Dfun', 'least_squares': 'jac'}.get(method)
+    if analytic_jac and jac_key is not None and not (set(fit_kws) & {'Dfun', 'jac'}) and \
+            all(component[1] is not None for component in components):
+        fit_kws[jac_key] = jacobian
+
+    nfev, success, message = 1, True, "Linear least-squares solution"
+    if any(par.vary for par in pars_nl.values()):
+        result = minimize(residual, pars_nl, method=method, max_nfev=max_nfev, **fit_kws)
+        pars_nl = result.params
+        nfev, success, message = result.nfev, bool(result.success), result.message
+
+    coefs, _, _ = solve(pars_nl)
+    for name, par in pars_nl.items():
+        if par.vary:
+            params[name].value = par.value
+    for name, coef in zip(lin_names, coefs):
+        params[name].value = coef
+
+    return nfev, success, message
+
+
+def make_result(comp_model, params, init_params, x, y, weights=None, method='leastsq', nfev=0,
+                success=True, message='', **kwargs):
+    """
+    Return the lmfit ModelResult related to the 'params' issued from varpro_fit(), without
+    refinement. The uncertainties are estimated from the analytic jacobian of the models (if
+    all of them provide one)
+
+    Parameters
+    ----------
+    comp_model: lmfit.Model or lmfit.CompositeModel
+        Fitted model
+    params, init_params: lmfit.Parameters
+        Parameters resulting from varpro_fit() and initial parameters
+    x, y: numpy.ndarray
+        Support and intensity fitted
+    weights: numpy.ndarray, optional
+        Weights applied to the residual
+    method: str, optional
+        Method used for the nonlinear parameters
+    nfev: int, optional
+        Number of function evaluations
+    success: bool, optional
+        Success status of the fit
+    message: str, optional
+        Message related to the fit
+    kwargs: dict, optional
+        Extra independent variables passed to the models (with a not None value)
+
+    Returns
+    -------
+    result: lmfit.ModelResult
+    """
+    indep = {key: val for key, val in kwargs.items() if val is not None}
+    params = params.copy()
+    best_fit = comp_model.eval(params, x=x, **indep)
+    residual = best_fit - y
+    if weights is not None:
+        residual = residual * weights
+
+    var_names = [name for name, par in params.items() if par.vary]
+    ndata, nvarys = len(y), len(var_names)
+    chisqr = float(np.sum(residual ** 2))
+    nfree = max(1, ndata - nvarys)
+    redchi = chisqr / nfree
+
+    covar = None
+    jacobian = make_jacobian(comp_model, params)
+    if jacobian is not None and nvarys > 0:
+        jac = jacobian(params, y, weights, x=x, **indep)
+        try:
+            covar = np.linalg.inv(jac.T @ jac) * redchi
+        except np.linalg.LinAlgError:
+            covar = None
+    if covar is not None:
+        for i, name in enumerate(var_names):
+            params[name].stderr = float(np.sqrt(abs(covar[i, i])))
+
+    result = ModelResult(comp_model, params, data=y, weights=weights, method=method)
+    result.params = params
+    result.init_params = init_params
+    result.init_values = {name: par.value for name, par in init_params.items()}
+    result.best_values = {name: par.value for name, par in params.items()}
+    result.var_names = var_names
+    result.covar = covar
+    result.errorbars = covar is not None
+    result.nfev = int(nfev)
+    result.ndata = ndata
+    result.nvarys = nvarys
+    result.nfree = nfree
+    result.chisqr = chisqr
+    result.redchi = redchi
+    _neg2_log_likel = ndata * np.log(max(chisqr, 1e-250) / ndata)
+    result.aic = _neg2_log_likel + 2 * nvarys
+    result.bic = _neg2_log_likel + np.log(ndata) * nvarys
+    result.rsquared = 1. - np.sum((y - best_fit) ** 2) / max(np.sum((y - y.mean()) ** 2), 1e-250)
+    result.success = success
+    result.aborted = False
+    result.message = message
+    result.residual = residual
+    result.userkws = {'x': x, **indep}
+    result.best_fit = best_fit
+    return result
@@ -0,0 +1,136 @@
+"""
+Module related to the warm-start scheduling of the fits
+
+notes:
+Map spectra are walked in a space-filling order ('serpentine' or 'hilbert') so that each
+spectrum can be initialized from the fitted parameters of its nearest already fitted
+neighbor. Plain spectra are considered as an ordered sequence (time series for instance) and
+are initialized from the previous spectrum.
+"""
+import numpy as np
+
+ORDERS = ['serpentine', 'hilbert']
+BOUNDS_MARGIN = 1e-3  # relative distance to the bounds of the seeded values
+
+
+def serpentine_order(shape):
+    """ Return the flat indices of a (nrows, ncols) grid walked in a serpentine (boustrophedon)
+        order """
+    inds = np.arange(shape[0] * shape[1]).reshape(shape)
+    inds[1::2] = inds[1::2, ::-1]
+    return inds.ravel()
+
+
+def hilbert_order(shape):
+    """ Return the flat indices of a (nrows, ncols) grid walked along a Hilbert curve """
+    nrows, ncols = shape
+    size = 1 << int(np.ceil(np.log2(max(nrows, ncols, 1))))
+    i, j = np.divmod(np.arange(nrows * ncols), ncols)
+
+    # (x, y) -> d conversion (see https://en.wikipedia.org/wiki/Hilbert_curve)
+    x, y = j.copy(), i.copy()
+    dist = np.zeros_like(x)
+    s = size // 2
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        dist += s * s * ((3 * rx) ^ ry)
+        # rotation
+        flip = ~ry & rx
+        x[flip] = size - 1 - x[flip]
+        y[flip] = size - 1 - y[flip]
+        swap = ~ry
+        x[swap], y[swap] = y[swap], x[swap]
+        s //= 2
+
+    return np.argsort(dist, kind='stable')
+
+
+def map_schedule(spectra_map, spectra, order='serpentine'):
+    """
+    Return the 'spectra' (belonging to 'spectra_map') reordered according to a space-filling
+    curve and the index of their seed, i.e. the nearest neighbor fitted before them
+
+    Parameters
+    ----------
+    spectra_map: SpectraMap object
+        Spectra map the 'spectra' belong to
+    spectra: list of Spectrum objects
+        Spectra to schedule
+    order: str, optional
+        Space-filling curve to consider: 'serpentine' or 'hilbert'
+
+    Returns
+    -------
+    spectra_ordered: list of Spectrum objects
+        Reordered spectra
+    seeds: list of int or None
+        Indices (in 'spectra_ordered') of the spectra used to initialize each spectrum
+    """
+    assert order in ORDERS
+
+    shape = spectra_map.shape_map
+    x_map, y_map = spectra_map.xy_map
+    inds_spectra = {}
+    for spectrum in spectra:
+        i, j = spectra_map.spectrum_indices(spectrum)
+        inds_spectra[i * shape[1] + j] = spectrum
+
+    flat_inds = serpentine_order(shape) if order == 'serpentine' else hilbert_order(shape)
+    flat_inds = [ind for ind in flat_inds if ind in inds_spectra]
+
+    spectra_ordered, seeds, positions = [], [], {}
+    for k, ind in enumerate(flat_inds):
+        i, j = divmod(ind, shape[1])
+        seed, dist_min = None, np.inf
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                pos = positions.get((i + di, j + dj))
+                if pos is None:
+                    continue
+                dist = np.hypot(x_map[j + dj] - x_map[j], y_map[i + di] - y_map[i])
+                # the most recently fitted neighbor is preferred in case of equality
+                if dist < dist_min or (dist == dist_min and pos > seed):
+                    seed, dist_min = pos, dist
+        positions[(i, j)] = k
+        spectra_ordered.append(inds_spectra[ind])
+        seeds.append(seed)
+
+    return spectra_ordered, seeds
+
+
+def sequence_schedule(spectra):
+    """ Return the 'spectra' and the index of their seed, i.e. the previous spectrum """
+    return list(spectra), [None] + list(range(len(spectra) - 1))
+
+
+def init_from_seed(spectrum, seed):
+    """
+    Set the initial values of the 'spectrum' models from the fitted values of the 'seed'
+    models and return True if the spectrum has been initialized
+
+    Only the varying parameters are considered and the values are clipped into the 'spectrum'
+    parameters bounds, slightly inside them to avoid the null derivatives of the bounds
+    transformation (see lmfit). Peak models that vanished in the 'seed' fit (ampli=0) are
+    ignored.
+    """
+    if not hasattr(seed.result_fit, 'success') or not seed.result_fit.success:
+        return False
+
+    models = spectrum.peak_models + spectrum.bkg_models
+    models_seed = seed.peak_models + seed.bkg_models
+    if [model.param_names for model in models] != [model.param_names for model in models_seed]:
+        return False
+
+    for model, model_seed in zip(models, models_seed):
+        hints_seed = model_seed.param_hints
+        if 'ampli' in hints_seed and hints_seed['ampli']['value'] == 0:
+            continue
+        for key, hint in model.param_hints.items():
+            if hint.get('vary', True) and not hint.get('expr') and key in hints_seed:
+                vmin, vmax = hint.get('min', -np.inf), hint.get('max', np.inf)
+                margin = BOUNDS_MARGIN * max(1., abs(hints_seed[key]['value']))
+                if np.isfinite(vmin) and np.isfinite(vmax):
+                    margin = min(margin, BOUNDS_MARGIN * (vmax - vmin))
+                hint['value'] = min(max(hints_seed[key]['value'], vmin + margin), vmax - margin)
+    return True
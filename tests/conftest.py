@@ -0,0 +1,79 @@
+"""
+fixtures shared by the tests suites
+"""
+import numpy as np
+import pytest
+
+from fitspy.core.spectrum import Spectrum
+from fitspy.core.spectra import Spectra
+from fitspy.core.spectra_map import SpectraMap
+from fitspy.core.models import gaussian
+
+
+@pytest.fixture
+def basic_spectrum2():
+    spectrum = Spectrum()
+    x = np.arange(0., 100.)
+    y = gaussian(x, ampli=20, fwhm=20, x0=40) + gaussian(x, ampli=30, fwhm=10, x0=60)
+    spectrum.x = x
+    spectrum.y = y
+    spectrum.x0 = spectrum.x.copy()
+    spectrum.y0 = spectrum.y.copy()
+    spectrum.add_peak_model('Gaussian', x0=30)
+    spectrum.add_peak_model('Gaussian', x0=65)
+
+    # import matplotlib.pyplot as plt
+    # _, ax= plt.subplots()
+    # spectrum.fit()
+    #
+    # spectrum.plot(ax)
+    # plt.show()
+
+    return spectrum
+
+
+@pytest.fixture
+def make_spectra():
+    """
+    Return a function creating a Spectra object from the 'profile' function:
+    - with the 'spectrum_{k}' spectra of intensity profile(k) for k in range(nspectra), or
+    - with a 'map' spectra map of intensity profile(i, j) for (i, j) in np.ndindex(shape)
+      (if 'shape' is given)
+    """
+
+    def make_spectra(profile, nspectra=None, shape=None, x=None):
+        x = np.linspace(0, 100, 101) if x is None else x
+        spectra = Spectra()
+        if shape is None:
+            for k in range(nspectra):
+                spectrum = Spectrum()
+                spectrum.fname = f'spectrum_{k}'
+                spectrum.x0, spectrum.y0 = x.copy(), profile(k)
+                spectra.append(spectrum)
+        else:
+            rows = [[0, 0, *x]] + [[i, j, *profile(i, j)] for i, j in np.ndindex(shape)]
+            spectra_map = SpectraMap()
+            spectra_map.create_map('map', arr0=np.array(rows, dtype=float))
+            spectra.spectra_maps.append(spectra_map)
+        return spectra
+
+    return make_spectra
+
+
+@pytest.fixture
+def make_model():
+    """ Return a function creating a model spectrum of intensity 'y0' with Gaussian peak
+        models located at 'x0s' (and a 'bkg_name' background model if given) """
+
+    def make_model(y0, x0s, bkg_name=None, x=None):
+        model = Spectrum()
+        model.x0 = np.linspace(0, 100, 101) if x is None else x
+        model.y0 = y0
+        model.preprocess()
+        for x0 in x0s:
+            model.add_peak_model('Gaussian', x0)
+        if bkg_name is not None:
+            model.set_bkg_model(bkg_name)
+        return model
+
+    return make_model
@@ -6,7 +6,6 @@ from pytest import approx
 import pytest
 
 from fitspy.core.spectrum import Spectrum
-from fitspy.core.models import gaussian
 
 
 @pytest.fixture
@@ -21,28 +20,6 @@ def basic_spectrum():
     return spectrum
 
 
-@pytest.fixture
-def basic_spectrum2():
-    spectrum = Spectrum()
-    x = np.arange(0., 100.)
-    y = gaussian(x, ampli=20, fwhm=20, x0=40) + gaussian(x, ampli=30, fwhm=10, x0=60)
-    spectrum.x = x
-    spectrum.y = y
-    spectrum.x0 = spectrum.x.copy()
-    spectrum.y0 = spectrum.y.copy()
-    spectrum.add_peak_model('Gaussian', x0=30)
-    spectrum.add_peak_model('Gaussian', x0=65)
-
-    # import matplotlib.pyplot as plt
-    # _, ax= plt.subplots()
-    # spectrum.fit()
-    #
-    # spectrum.plot(ax)
-    # plt.show()
-
-    return spectrum
-
-
 def test_with_no_constraint(basic_spectrum2):
     basic_spectrum2.fit()
 
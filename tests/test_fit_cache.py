@@ -0,0 +1,70 @@
+"""
+tests suite related to the on-disk cache of the fit results
+"""
+import numpy as np
+from pytest import approx
+
+from fitspy.core.spectrum import Spectrum
+from fitspy.core.spectra import Spectra
+from fitspy.core.fit_cache import FitCache
+from fitspy.core.models import gaussian
+
+
+def test_fit_cache(tmp_path):
+    x = np.linspace(0, 100, 101)
+
+    def create_spectrum(x0=40, range_max=None):
+        spectrum = Spectrum()
+        spectrum.fname = f'spectrum_{x0}'
+        spectrum.x0, spectrum.y0 = x, gaussian(x, ampli=100, fwhm=5, x0=x0)
+        spectrum.range_max = range_max
+        spectrum.preprocess()
+        spectrum.add_peak_model('Gaussian', 38)
+        return spectrum
+
+    cache = FitCache(tmp_path)
+    spectrum = create_spectrum()
+    spectrum.fit(cache=cache)
+    assert cache.stats() == {'hits': 0, 'misses': 1, 'entries': 1,
+                             'bytes': cache.nbytes}
+
+    spectrum2 = create_spectrum()
+    spectrum2.fit(cache=cache)
+    assert cache.hits == 1
+    assert spectrum2.result_fit.success and spectrum2.result_fit.nfev == spectrum.result_fit.nfev
+    assert spectrum2.peak_models[0].param_hints['x0']['value'] == approx(40, abs=1e-3)
+    assert spectrum2.result_fit.best_fit == approx(spectrum.result_fit.best_fit)
+
+    # bypass, other preprocessing
+    create_spectrum().fit(cache=cache, bypass_cache=True)
+    create_spectrum(range_max=80).fit(cache=cache)
+    assert (cache.hits, cache.misses, len(cache)) == (1, 2, 2)
+
+    # independent models, with or without cache
+    spectrum.fit(independent_models=True)
+    spectrum = create_spectrum()
+    spectrum.fit(independent_models=True, cache=cache)
+    spectrum2 = create_spectrum()
+    spectrum2.fit(independent_models=True, cache=cache)
+    assert (cache.hits, cache.misses, len(cache)) == (2, 3, 3)
+    assert spectrum2.peak_models[0].param_hints['x0']['value'] == \
+           approx(spectrum.peak_models[0].param_hints['x0']['value'])
+
+    # apply_model() on spectra partially cached, the least recently used entry being evicted
+    cache.clear()
+    create_spectrum().fit(cache=cache)
+    create_spectrum(range_max=80).fit(cache=cache)
+    cache = FitCache(tmp_path, max_bytes=2.5 * cache.nbytes / 2)
+    spectra = Spectra([create_spectrum(x0) for x0 in [40, 41]])
+    spectra.apply_model(create_spectrum().save(), show_progressbar=False, cache=cache)
+    assert (cache.hits, cache.misses, len(cache)) == (1, 1, 2)
+    assert cache.nbytes == sum(fname.stat().st_size for fname in tmp_path.glob('*/*.json'))
+    assert list(spectra.get_results()['m01_x0']) == approx([40, 41], abs=1e-3)
+    spectra.apply_model(create_spectrum().save(), show_progressbar=False, cache=cache)
+    assert (cache.hits, cache.misses) == (3, 1)
+    create_spectrum(range_max=80).fit(cache=cache)
+    assert (cache.hits, cache.misses) == (3, 2)
+
+    cache.clear()
+    assert cache.stats() == {'hits': 0, 'misses': 0, 'entries': 0, 'bytes': 0}
+    assert len(FitCache(tmp_path)) == 0
@@ -0,0 +1,57 @@
+"""
+tests suite related to the fits checkpointing
+"""
+import numpy as np
+from pytest import approx
+
+from fitspy.core.spectrum import Spectrum
+from fitspy.core.fit_journal import hash_data
+from fitspy.core.models import gaussian
+
+
+def test_apply_model_checkpoint(tmp_path, monkeypatch, make_spectra, make_model):
+    x = np.linspace(0, 100, 101)
+
+    def profile(i, j):
+        return gaussian(x, ampli=100, fwhm=5, x0=40 + j + 3 * i)
+
+    model = make_model(gaussian(x, ampli=100, fwhm=5, x0=40), [40])
+
+    spectra = make_spectra(profile, shape=(2, 3))
+    spectra.apply_model(model.save(), show_progressbar=False, checkpoint=tmp_path)
+    results = spectra.get_results()
+    lines = (tmp_path / 'journal.jsonl').read_text().splitlines()
+    assert len(lines) == 6
+
+    # journal of a fit interrupted during the writing of the 5th spectrum
+    (tmp_path / 'journal.jsonl').write_text('\n'.join(lines[:4]) + '\n' + lines[4][:20])
+    spectra = make_spectra(lambda i, j: (1 + (i + j == 0)) * profile(i, j),  # raw data modified
+                           shape=(2, 3))
+    spectra_map = spectra.spectra_maps[0]
+
+    fitted = []
+    fit = Spectrum.fit
+    monkeypatch.setattr(Spectrum, 'fit', lambda self, *args, **kwargs: (
+        fitted.append(self.fname), fit(self, *args, **kwargs))[1])
+    spectra.apply_model(model.save(), show_progressbar=False, checkpoint=tmp_path, resume=True)
+    assert list(dict.fromkeys(fitted)) == [spectra.fnames[i] for i in [0, 4, 5]]
+    assert list(spectra.get_results()['m01_x0']) == approx(list(results['m01_x0']), abs=1e-3)
+    assert not spectra_map.is_materialized(spectra.fnames[2])
+    assert spectra_map[2].result_fit.success
+    assert spectra_map[2].peak_models[0].param_hints['x0']['value'] == approx(42, abs=1e-3)
+    assert len((tmp_path / 'journal.jsonl').read_text().splitlines()) == 4 + 1 + 3
+
+    # weights and outliers limit are part of the raw data
+    spectrum = Spectrum()
+    spectrum.x0, spectrum.y0 = x, x
+    data_hash = hash_data(spectrum)
+    spectrum.weights0 = np.ones_like(x)
+    assert hash_data(spectrum) != data_hash
+    spectrum.weights0, spectrum.outliers_limit = None, np.ones_like(x)
+    assert hash_data(spectrum) != data_hash
+
+    # other model: all the spectra are fitted
+    fitted.clear()
+    model.peak_models[0].set_param_hint('fwhm', value=4)
+    spectra.apply_model(model.save(), show_progressbar=False, checkpoint=tmp_path, resume=True)
+    assert list(dict.fromkeys(fitted)) == spectra.fnames
@@ -0,0 +1,90 @@
+"""
+tests suite related to the fits based on a fit plan
+"""
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from pytest import approx
+
+from fitspy.core.spectrum import Spectrum
+from fitspy.core.fit_plan import FitPlan
+from fitspy.core.batch_fit import BatchFit, MESSAGES, STALLED
+from fitspy.core.models import gaussian
+
+
+def test_fit_plan(basic_spectrum2):
+    basic_spectrum2.peak_models[1].param_hints['ampli']['expr'] = 'm01_ampli*1.5'
+    model_dict = basic_spectrum2.save()
+    fit_plan = FitPlan(model_dict)
+
+    spectrum = Spectrum()
+    spectrum.x0, spectrum.y0 = basic_spectrum2.x0, basic_spectrum2.y0
+    fit_plan.set_attributes(spectrum)
+    spectrum.load_profile(None)
+    assert fit_plan.is_compatible(spectrum)
+    assert spectrum.peak_models[0].param_hints is not fit_plan.peak_models[0].param_hints
+
+    spectrum.fit(fit_plan=fit_plan)
+    basic_spectrum2.fit()
+
+    for model, model_ref in zip(spectrum.peak_models, basic_spectrum2.peak_models):
+        for key in ['ampli', 'fwhm', 'x0']:
+            assert model.param_hints[key]['value'] == \
+                   approx(model_ref.param_hints[key]['value'], rel=1e-6)
+    assert spectrum.peak_models[1].param_hints['ampli']['value'] == \
+           approx(1.5 * spectrum.peak_models[0].param_hints['ampli']['value'])
+
+    # template params left unchanged, no expression kept from one spectrum to another and
+    # params copied per thread
+    del spectrum.peak_models[1].param_hints['ampli']['expr']
+    params = fit_plan.make_params(spectrum)
+    assert params['m02_ampli'].expr is None and params['m02_ampli'].vary
+    assert fit_plan.params['m02_ampli'].expr == 'm01_ampli*1.5'
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(fit_plan.make_params, spectrum).result() is not params
+
+
+def test_apply_model_batch_solver(basic_spectrum2, make_spectra):
+    model_dict = basic_spectrum2.save()
+
+    def profile(k):
+        return gaussian(x, ampli=20 + k, fwhm=20, x0=40) + \
+               gaussian(x, ampli=30, fwhm=10 + k, x0=60)
+
+    x = basic_spectrum2.x0
+    spectra_list = {}
+    for solver in ['lmfit', 'batch']:
+        spectra_list[solver] = make_spectra(profile, nspectra=5, x=x)
+        spectra_list[solver].apply_model(model_dict, show_progressbar=False, solver=solver)
+
+    for spectrum, spectrum_ref in zip(spectra_list['batch'], spectra_list['lmfit']):
+        assert spectrum.result_fit.success
+        assert spectrum.result_fit.method == 'batch_lm'
+        for model, model_ref in zip(spectrum.peak_models, spectrum_ref.peak_models):
+            for key in ['ampli', 'fwhm', 'x0']:
+                assert model.param_hints[key]['value'] == \
+                       approx(model_ref.param_hints[key]['value'], rel=1e-3)
+
+    # non-converging spectrum (no descent step found) reported as failed
+    spectra = spectra_list['batch'][:2]
+    spectra[1].y0[50] = np.nan
+    fit_plan = FitPlan(model_dict)
+    for spectrum in spectra:
+        fit_plan.set_attributes(spectrum)
+        spectrum.preprocess()
+    BatchFit(fit_plan).fit(spectra)
+    result, result_failed = spectra[0].result_fit, spectra[1].result_fit
+    assert result.success
+    assert result.rsquared == approx(1, abs=1e-6)
+    ampli_init = model_dict['peak_models'][0]['Gaussian']['ampli']['value']
+    assert result.init_values['m01_ampli'] == approx(ampli_init)
+    assert result.best_values['m01_ampli'] == approx(20, abs=1e-3)
+    assert not result_failed.success
+    assert result_failed.message == MESSAGES[STALLED]
+
+    # fit parameters not handled by the batch solver
+    for key, value in [('method', 'least_squares'), ('independent_models', True)]:
+        model_dict['fit_params'][key] = value
+        with pytest.raises(ValueError, match="not handled by the 'batch' solver"):
+            spectra_list['batch'].apply_model(model_dict, show_progressbar=False, solver='batch')
+        model_dict['fit_params'].update(method='leastsq', independent_models=False)
@@ -0,0 +1,91 @@
+"""
+tests suite related to the fit results
+"""
+import threading
+import h5py
+import numpy as np
+import pandas as pd
+from pytest import approx
+
+from fitspy.core.models import gaussian
+from fitspy.core.fit_results import CompactResult
+
+
+def test_fit_results_store(basic_spectrum2, make_spectra):
+    model_dict = basic_spectrum2.save()
+    x = basic_spectrum2.x0
+
+    # small ripple added for the parameters standard errors to be estimated
+    spectra = make_spectra(lambda k: gaussian(x, ampli=20 + k, fwhm=20, x0=40) +
+                           gaussian(x, ampli=30, fwhm=10, x0=60) + 1e-3 * np.cos(3 * x),
+                           nspectra=3, x=x)
+    spectra.apply_model(model_dict, show_progressbar=False)
+
+    results = spectra.results
+    assert len(results) == 3
+    assert results.data['success'].all()
+    assert results.data['values'].shape == (3, len(results.param_names))
+
+    spectrum = spectra[1]
+    result_fit = spectrum.result_fit
+    assert isinstance(result_fit, CompactResult)
+    assert result_fit.best_values['m01_ampli'] == approx(21, abs=1e-2)
+    assert result_fit.params['m01_ampli'].stderr is not None
+
+    # full ModelResult rebuilt on demand
+    mask = result_fit.best_fit != 0
+    assert result_fit.best_fit.shape == spectrum.x.shape
+    assert result_fit.best_fit[mask] == approx(spectrum.y[mask], abs=1e-3)
+    assert '[[Fit Statistics]]' in result_fit.fit_report()
+
+    dfr = spectra.get_results()
+    assert list(dfr['name']) == ['spectrum_0', 'spectrum_1', 'spectrum_2']
+    assert list(dfr['m01_ampli']) == approx([20, 21, 22], abs=1e-2)
+
+
+def test_save_results_bulk(tmp_path, make_spectra, make_model):
+    x = np.linspace(0, 100, 201)
+    spectra = make_spectra(lambda k: gaussian(x, ampli=50, fwhm=8, x0=30 + k) + 1,
+                           nspectra=3, x=x)
+    model = make_model(spectra[0].y0, [30], bkg_name='Constant', x=x)
+    spectra.apply_model(model.save(), show_progressbar=False)
+
+    spectra.save_results(tmp_path / 'files')
+    spectra.save_results(tmp_path / 'bulk', layout='bulk')
+    assert sorted(path.name for path in (tmp_path / 'bulk').iterdir()) == \
+        ['params.csv', 'profiles.h5', 'results.csv', 'stats.csv']
+
+    params = pd.read_csv(tmp_path / 'bulk' / 'params.csv', sep=';')
+    assert list(params['x0']) == approx([30, 31, 32], abs=1e-3)
+    stats = pd.read_csv(tmp_path / 'bulk' / 'stats.csv', sep=';')
+    assert list(stats['success']) == [True] * 3
+    with h5py.File(tmp_path / 'bulk' / 'profiles.h5') as h5:
+        profiles = pd.read_csv(tmp_path / 'files' / 'spectrum_1_profiles.csv', sep=';')
+        for key in ['x', 'y_raw', 'y_fit', 'bkg']:
+            assert h5[key][1] == approx(profiles[key].values)
+        assert h5['peaks'][1, 0] == approx(profiles['1'].values)
+        assert list(h5['peak_labels'].asstr()[1]) == ['1']
+
+
+def test_submit_model(make_spectra, make_model):
+    x = np.linspace(0, 100, 101)
+    spectra = make_spectra(lambda k: gaussian(x, ampli=50, fwhm=8, x0=30 + k), nspectra=6)
+    model = make_model(spectra[0].y0, [30])
+
+    fnames = []
+    handle = spectra.submit_model(model.save(), callback=lambda fname, _: fnames.append(fname))
+    items = list(handle)
+    assert handle.done and handle.wait()
+    assert [fname for fname, _ in items] == fnames == spectra.fnames
+    assert items[3][1].best_values['m01_x0'] == approx(33, abs=1e-3)
+    assert (handle.ndone, handle.nsuccess, handle.nfailed, handle.npending) == (6, 6, 0, 0)
+    assert spectra[3].result_fit is items[3][1]
+
+    # cancellation after the first fitted spectrum
+    handles, ready = [], threading.Event()
+    handle = spectra.submit_model(model.save(),
+                                  callback=lambda *_: ready.wait() and handles[0].cancel())
+    handles.append(handle)
+    ready.set()
+    assert len(list(handle)) == 1
+    assert handle.cancelled and handle.ndone == 1 and handle.npending == 5
@@ -0,0 +1,97 @@
+"""
+tests suite related to the fit solvers options
+"""
+from copy import deepcopy
+import numpy as np
+from pytest import approx
+
+from fitspy.core.models import gaussian, pseudovoigt, pseudovoigt_jac
+from fitspy.core.varpro import get_linear_params
+from fitspy.core.warm_start import serpentine_order, hilbert_order
+
+
+def test_analytic_jacobian(basic_spectrum2):
+    x = np.linspace(0, 100, 201)
+    params = {'ampli': 3, 'fwhm': 7, 'x0': 41.3, 'alpha': 0.3}
+    jac = pseudovoigt_jac(x, **params)
+    for key, val in params.items():
+        params_p, params_m = params.copy(), params.copy()
+        params_p[key] += 1e-6
+        params_m[key] -= 1e-6
+        jac_num = (pseudovoigt(x, **params_p) - pseudovoigt(x, **params_m)) / 2e-6
+        assert jac[key] == approx(jac_num, abs=1e-6)
+
+    spectrum = deepcopy(basic_spectrum2)
+    spectrum.fit(analytic_jac=False)
+
+    basic_spectrum2.fit(analytic_jac=True)
+    assert basic_spectrum2.peak_models[0].param_hints['ampli']['value'] == approx(20, abs=1)
+    assert basic_spectrum2.peak_models[1].param_hints['ampli']['value'] == approx(30, abs=1)
+    assert basic_spectrum2.result_fit.nfev < spectrum.result_fit.nfev
+
+
+def test_apply_model_warm_start(basic_spectrum2, make_spectra):
+    assert list(serpentine_order((2, 3))) == [0, 1, 2, 5, 4, 3]
+    inds = hilbert_order((8, 8))
+    steps = np.abs(np.diff(inds // 8)) + np.abs(np.diff(inds % 8))
+    assert sorted(inds) == list(range(64))
+    assert np.all(steps == 1)
+
+    model_dict = basic_spectrum2.save()
+    x = basic_spectrum2.x0
+
+    def profile(i, j):
+        # peak position drifting along X and Y
+        return gaussian(x, ampli=20, fwhm=20, x0=40) + \
+               gaussian(x, ampli=30, fwhm=10, x0=60 + 2 * i + 2 * j)
+
+    nfev = {}
+    for warm_start in [None, 'serpentine', 'hilbert']:
+        spectra = make_spectra(profile, shape=(4, 5), x=x)
+        spectra.apply_model(model_dict, show_progressbar=False, warm_start=warm_start)
+
+        spectra_map = spectra.spectra_maps[0]
+        nfev[warm_start] = 0
+        for spectrum in spectra_map:
+            i, j = spectra_map.spectrum_indices(spectrum)
+            params = spectrum.peak_models[1].param_hints
+            assert params['x0']['value'] == approx(60 + 2 * i + 2 * j, abs=1e-3)
+            nfev[warm_start] += spectrum.result_fit.nfev
+
+    assert nfev['serpentine'] < nfev[None]
+    assert nfev['hilbert'] < nfev[None]
+
+
+def test_varpro(basic_spectrum2):
+    assert get_linear_params(basic_spectrum2.peak_models[0]) == ('ampli',)
+
+    spectrum = deepcopy(basic_spectrum2)
+    for model in spectrum.peak_models:
+        model.param_hints['ampli']['value'] = 1.e4
+    spectrum.fit(varpro=True, reinit_guess=False)
+    assert spectrum.result_fit.success
+    assert spectrum.peak_models[0].param_hints['ampli']['value'] == approx(20, abs=1e-3)
+    assert spectrum.peak_models[1].param_hints['ampli']['value'] == approx(30, abs=1e-3)
+
+    # without refinement
+    spectrum_2 = deepcopy(basic_spectrum2)
+    spectrum_2.fit(varpro=True, varpro_refine=False)
+    result_fit = spectrum_2.result_fit
+    assert result_fit.success
+    assert result_fit.nfev < spectrum.result_fit.nfev
+    assert result_fit.rsquared == approx(1)
+    assert result_fit.params['m01_ampli'].stderr is not None
+    for model, model_ref in zip(spectrum_2.peak_models, spectrum.peak_models):
+        for key in ['ampli', 'fwhm', 'x0']:
+            assert model.param_hints[key]['value'] == \
+                   approx(model_ref.param_hints[key]['value'], rel=1e-4)
+
+    # fixed parameters
+    basic_spectrum2.peak_models[0].param_hints['ampli']['vary'] = False
+    spectrum = deepcopy(basic_spectrum2)
+    spectrum.fit(varpro=True)
+    basic_spectrum2.fit()
+    for model, model_ref in zip(spectrum.peak_models, basic_spectrum2.peak_models):
+        for key in ['ampli', 'fwhm', 'x0']:
+            assert model.param_hints[key]['value'] == \
+                   approx(model_ref.param_hints[key]['value'], rel=1e-3)
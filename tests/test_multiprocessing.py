@@ -0,0 +1,116 @@
+"""
+tests suite related to the multiprocessing
+"""
+import os
+import signal
+import dill
+import numpy as np
+from pytest import approx
+from matplotlib.image import imread
+
+from fitspy.core.models import gaussian
+from fitspy.core.utils_mp import WORKER_POOL, get_pool_state, shutdown_pool
+from fitspy.core.utils_mp import SharedArrays, FigureRenderer, dumps_light, get_map_row
+
+
+def test_persistent_worker_pool(basic_spectrum2, make_spectra):
+    model_dict = basic_spectrum2.save()
+    x = basic_spectrum2.x0
+
+    executors = []
+    for ncpus in [2, 2, 3]:
+        spectra = make_spectra(lambda k: gaussian(x, ampli=20 + k, fwhm=20, x0=40) +
+                               gaussian(x, ampli=30, fwhm=10, x0=60), nspectra=4, x=x)
+        spectra.apply_model(model_dict, ncpus=ncpus, show_progressbar=False)
+
+        for i, spectrum in enumerate(spectra):
+            assert spectrum.peak_models[0].param_hints['ampli']['value'] == approx(20 + i)
+        state = get_pool_state()
+        assert state['ncpus'] == ncpus
+        assert state['queue_depth'] == 0
+        assert 0 < state['live_workers'] <= ncpus
+        executors.append(WORKER_POOL.executor)
+
+    assert executors[0] is executors[1]  # pool reused
+    assert executors[1] is not executors[2]  # pool resized
+
+    # workers terminated abruptly
+    os.kill(next(iter(WORKER_POOL.pids)), signal.SIGKILL)
+    spectra.apply_model(model_dict, ncpus=3, show_progressbar=False)
+    assert WORKER_POOL.executor is not executors[2]  # pool restarted
+    assert 0 < get_pool_state()['live_workers'] <= 3
+
+    shutdown_pool()
+    assert get_pool_state() == {'ncpus': 0, 'live_workers': 0, 'queue_depth': 0}
+
+
+def test_shared_arrays(basic_spectrum2):
+    shared = SharedArrays({'x0': 3, 'y0': 5})
+    shared.arrays['y0'][:] = np.arange(5)
+    shm, arrays = SharedArrays.attach(shared.layout)
+    assert np.all(arrays['y0'] == np.arange(5))
+    del arrays
+    shm.close()
+    shared.release()
+
+    spectrum = dill.loads(dumps_light(basic_spectrum2))
+    assert spectrum.x0 is None and spectrum.y0 is None
+    assert basic_spectrum2.x0 is not None and basic_spectrum2.y0 is not None
+    assert len(spectrum.peak_models) == 2
+
+
+def test_shared_map(basic_spectrum2, make_spectra):
+    model_dict = basic_spectrum2.save()
+    x = basic_spectrum2.x0
+
+    results = []
+    for ncpus in [1, 2]:
+        spectra = make_spectra(lambda i, j: gaussian(x, ampli=20 + i, fwhm=20, x0=40) +
+                               gaussian(x, ampli=30, fwhm=10 + j, x0=60), shape=(2, 3), x=x)
+        spectra_map = spectra.spectra_maps[0]
+        spectra.outliers_limit_calculation(nmax=2)
+        spectra_map[4].y0 = spectra_map[4].y0 + 1  # raw data modified (not read from the map)
+        spectra.apply_model(model_dict, ncpus=ncpus, show_progressbar=False)
+        results.append(spectra.get_results())
+
+    # map arrays placed once in shared memory and reused from one fit to another
+    _, shared, _ = spectra_map.shared
+    assert get_map_row(spectra_map[1], spectra_map) == 1
+    assert get_map_row(spectra_map[4], spectra_map) is None
+    spectra.apply_model(model_dict, ncpus=2, show_progressbar=False)
+    assert spectra_map.shared[1] is shared
+    for key in ['m01_ampli', 'm02_fwhm']:
+        assert results[1][key].tolist() == approx(results[0][key].tolist())
+
+
+def test_save_figures(tmp_path, make_spectra):
+    x = np.linspace(0, 100, 101)
+    spectra = make_spectra(lambda k: gaussian(x, ampli=50, fwhm=8, x0=30 + k), nspectra=5)
+    for spectrum in spectra:
+        spectrum.preprocess()
+
+    for ncpus in [1, 2]:
+        counts = []
+        dirname = tmp_path / str(ncpus)
+        spectra.save_figures(dirname, ncpus=ncpus, chunksize=2,
+                             progress=lambda count, ntot: counts.append((count, ntot)))
+        assert sorted(path.name for path in dirname.iterdir()) == \
+            [f'spectrum_{k}.png' for k in range(5)]
+        assert counts[-1] == (5, 5)
+
+
+def test_figure_renderer(tmp_path, make_spectra):
+    x = np.linspace(0, 100, 101)
+    spectra = make_spectra(lambda k: gaussian(x, ampli=50 + 20 * k, fwhm=8, x0=30 + 10 * k) -
+                           5 * k, nspectra=3)
+    for spectrum in spectra:
+        spectrum.preprocess()
+
+    renderer = FigureRenderer()
+    renderer.save(spectra[0], tmp_path / 'fig_0.png')
+    lines = list(renderer.ax.lines)
+    for k, bounds in [(1, None), (2, ((0, 50), (0, 30))), (1, None)]:
+        renderer.save(spectra[k], tmp_path / 'fig.png', bounds=bounds)
+        assert list(renderer.ax.lines) == lines  # artists reused
+        FigureRenderer().save(spectra[k], tmp_path / 'fig_ref.png', bounds=bounds)
+        assert np.array_equal(imread(tmp_path / 'fig.png'), imread(tmp_path / 'fig_ref.png'))
@@ -0,0 +1,137 @@
+"""
+tests suite related to the files reading and writing
+"""
+import numpy as np
+import pytest
+from pytest import approx
+from rsciio.hspy import file_writer
+
+from fitspy.core import utils
+from fitspy.core.utils import get_1d_profile, read_ascii_tolerant, save_to_json, load_from_json
+from fitspy.core.spectra import Spectra
+from fitspy.core.project_h5 import LazyDataset
+from fitspy.core.models import gaussian
+
+
+def test_get_1d_profile_ascii(tmp_path):
+    fname = tmp_path / 'spectrum.txt'
+    fname.write_text('# x, y, weights\n\n1.5, 2.25, 1\n3e-3,4,0.5\n5, 6, 0.25\n')
+    x0, y0, weights = get_1d_profile(fname)
+    assert list(x0) == [1.5, 3e-3, 5]
+    assert list(y0) == [2.25, 4, 6]
+    assert list(weights) == [1, 0.5, 0.25]
+
+    # fast path failure (missing value) handled by the tolerant reader
+    fname = tmp_path / 'spectrum2.txt'
+    fname.write_text('x y\n1 2\n3\n4 5\nEND\n')
+    x0, y0, weights = get_1d_profile(fname)
+    dfr = read_ascii_tolerant(fname)
+    assert np.array_equal(x0, dfr[0]) and x0.dtype == dfr[0].dtype
+    assert np.array_equal(y0, dfr[1]) and weights is None
+
+
+def test_spectra_load_profiles(tmp_path):
+    fnames = []
+    for i in range(5):
+        fname = tmp_path / f'spectrum_{i}.txt'
+        fname.write_text(f'0 {i}\n1 {2 * i}\n')
+        fnames.append(str(fname))
+    fnames.insert(2, str(tmp_path / 'missing.txt'))
+
+    calls = []
+    spectra = Spectra()
+    failures = spectra.load_profiles(fnames, preprocess=True, max_workers=3,
+                                     progress=lambda count, total: calls.append((count, total)))
+    assert list(failures) == [fnames[2]]
+    assert spectra.fnames == fnames[:2] + fnames[3:]
+    assert [spectrum.y[1] for spectrum in spectra] == [0, 2, 4, 6, 8]
+    assert calls[-1] == (6, 6)
+
+
+def test_probe(tmp_path):
+    axes = [{'name': 'x', 'size': 50, 'offset': 100, 'scale': 2, 'units': '', 'navigate': False},
+            {'name': 'i', 'size': 3, 'offset': 0, 'scale': 1, 'units': '', 'navigate': True},
+            {'name': 'j', 'size': 4, 'offset': 0, 'scale': 1, 'units': '', 'navigate': True}]
+    signal = {'data': np.random.rand(50, 3, 4), 'axes': axes, 'original_metadata': {},
+              'metadata': {'General': {'title': ''}, 'Signal': {'signal_type': ''}},
+              'attributes': {'_lazy': False}, 'tmp_parameters': {},
+              'package_info': {'name': 'fitspy', 'version': ''},
+              'learning_results': {}, 'models': {}}
+    fname = str(tmp_path / 'map.hspy')
+    file_writer(fname, signal)
+
+    metadata = utils.probe(fname)
+    assert metadata['dim'] == 2
+    assert metadata['shape'] == (50, 3, 4)
+    assert metadata['axis'] == {'offset': 100, 'scale': 2, 'size': 50}
+    assert len(utils.PAYLOADS.items) == 0  # lazy reading
+
+    # decoded payload reused
+    x, data = utils.get_x_data_from_rsciio(fname)
+    utils.PAYLOADS.put(fname, (x, data))
+    assert utils.get_x_data_from_rsciio(fname)[1] is data
+    utils.PAYLOADS.ttl = 0
+    assert utils.get_x_data_from_rsciio(fname)[1] is not data
+    utils.PAYLOADS.ttl = 30.
+    utils.PAYLOADS.clear()
+    assert utils.get_2d_map(fname).shape == (13, 52)
+
+
+def test_project_h5(tmp_path, make_spectra, make_model):
+    x = np.linspace(0, 100, 101)
+    spectra = make_spectra(lambda i, j: gaussian(x, ampli=100 + 10 * i, fwhm=5, x0=40 + j),
+                           shape=(2, 3))
+    spectra_map = spectra.spectra_maps[0]
+    spectra.extend(make_spectra(lambda k: gaussian(x, ampli=50, fwhm=8, x0=30 + k), nspectra=2))
+
+    model = make_model(spectra_map[0].y0, [40])
+    spectra.apply_model(model.save(), fnames=spectra.fnames[:6], show_progressbar=False)
+    spectra_map[5].set_attributes({**model.save(), 'fname': 'map  X=2.0 Y=1.0'})
+    spectra_map[5].peak_models[0].param_hints['x0']['value'] = 50.
+    results = spectra.get_results()
+
+    fname = tmp_path / 'project.h5'
+    spectra.save(fname, save_data=True)
+    spectra2 = Spectra.load(fname)
+    spectra_map2 = spectra2.spectra_maps[0]
+    assert isinstance(spectra_map2.intensity, LazyDataset)
+    assert not spectra_map2.is_materialized('map  X=0.0 Y=0.0')
+    assert spectra2.fnames == spectra.fnames
+    assert spectra2[1].y0 == approx(spectra[1].y0)
+    assert spectra2[1].result_fit.success
+    assert spectra2.get_results()['m01_x0'].tolist() == approx(results['m01_x0'].tolist())
+    assert spectra_map2[5].peak_models[0].param_hints['x0']['value'] == 50.
+    assert spectra_map2[2].y0 == approx(spectra_map[2].y0)
+
+    # partial loading
+    spectra3 = Spectra.load(fname, fnames=['spectrum_1', 'map  X=2.0 Y=0.0'])
+    assert spectra3.fnames[0] == 'spectrum_1'
+    spectrum = spectra3.get_objects('map  X=2.0 Y=0.0')[0]
+    assert spectrum.peak_models[0].param_hints['x0']['value'] == approx(42, abs=1e-3)
+    assert spectrum.result_fit.success
+    assert spectra3.spectra_maps[0].template_inds.tolist().count(-1) == 5
+    with pytest.raises(KeyError, match='unknown'):
+        Spectra.load(fname, fnames=['spectrum_1', 'unknown'])
+
+    # resaving to the same path (with the maps intensities read on demand from the file)
+    spectra2.save(fname, save_data=True)
+    assert isinstance(spectra_map2.intensity, LazyDataset)
+    assert spectra_map2[2].y0 == approx(spectra_map[2].y0)
+    assert Spectra.load(fname).spectra_maps[0][3].y0 == approx(spectra_map[3].y0)
+    spectra2.save(fname)
+    assert spectra_map2[4].y0 == approx(spectra_map[4].y0)
+
+
+def test_save_to_json(tmp_path):
+    dictionary = {0: {'fname': 'a', 'outliers_inds': [1, 2], 'empty': {},
+                      'bkg_models': [{'id': 0, 'param_hints': {'a': {'value': 1.5}}}],
+                      'baseline': {'points': [[1., 2.], [3., 4.]], 'empty': [[], []]}}}
+    fname = tmp_path / 'test.json'
+    save_to_json(fname, dictionary)
+    assert fname.read_text() == \
+        '{\n   "0": {\n      "fname": "a",\n      "outliers_inds": [1, 2],\n' \
+        '      "empty": {},\n' \
+        '      "bkg_models": [{"id": 0, "param_hints": {"a": {"value": 1.5}}}],\n' \
+        '      "baseline": {\n         "points": [[1.0, 2.0],\n            [3.0, 4.0]],\n' \
+        '         "empty": [[], []]\n      }\n   }\n}'
+    assert load_from_json(fname) == dictionary
@@ -0,0 +1,155 @@
+"""
+tests suite related to the Spectra and SpectraMap containers
+"""
+import numpy as np
+from pytest import approx
+
+from fitspy.core import map_cache
+from fitspy.core.spectrum import Spectrum
+from fitspy.core.spectra import Spectra
+from fitspy.core.spectra_map import SpectraMap
+from fitspy.core.models import gaussian
+
+
+def test_spectra_index():
+    spectra = Spectra()
+    for i in range(3):
+        spectrum = Spectrum()
+        spectrum.fname = f"spectrum_{i}"
+        spectra.append(spectrum)
+    assert spectra.fnames == ['spectrum_0', 'spectrum_1', 'spectrum_2']
+
+    spectrum = Spectrum()
+    spectrum.fname = "spectrum_3"
+    spectra.insert(0, spectrum)
+    spectra.remove(spectra[2])
+    assert spectra.fnames == ['spectrum_3', 'spectrum_0', 'spectrum_2']
+    assert spectra.get_objects('spectrum_2') == (spectra[2], spectra)
+
+    arr0 = np.array([[0, 0, 1, 2], [0, 0, 3, 4], [0, 1, 5, 6]], dtype=float)
+    spectra_map = SpectraMap()
+    spectra_map.create_map('map', arr0=arr0)
+    spectra.spectra_maps.append(spectra_map)
+    assert spectra.fnames[3:] == ['map  X=0.0 Y=0.0', 'map  X=1.0 Y=0.0']
+    spectrum, parent = spectra.get_objects('map  X=1.0 Y=0.0')
+    assert not spectra_map.is_materialized('map  X=0.0 Y=0.0')
+    assert len(spectra.all) == 5
+    assert parent is spectra_map and spectrum is spectra_map[1]
+
+    spectra_map.pop(0)
+    assert spectra.fnames[3:] == ['map  X=1.0 Y=0.0']
+    spectra.spectra_maps.remove(spectra_map)
+    assert len(spectra.all) == 3
+
+    spectra += [Spectrum()]
+    spectra[3].fname = 'spectrum_5'
+    spectra.invalidate()
+    assert spectra.fnames[-1] == 'spectrum_5'
+    del spectra[3]
+    assert len(spectra.fnames) == 3
+
+    # fname modified in place
+    spectra[0].fname = 'spectrum_4'
+    assert spectra.get_spectrum('spectrum_4') is spectra[0]
+    spectra.invalidate()
+    assert spectra.fnames[0] == 'spectrum_4'
+
+
+def test_spectra_map_lazy(make_spectra, make_model):
+    x = np.linspace(0, 100, 101)
+    spectra = make_spectra(lambda i, j: gaussian(x, ampli=100 + 10 * i, fwhm=5, x0=40 + j),
+                           shape=(2, 3))
+    spectra_map = spectra.spectra_maps[0]
+    assert not spectra_map.is_materialized('map  X=2.0 Y=1.0')
+    assert spectra.fnames[-1] == 'map  X=2.0 Y=1.0'
+
+    spectrum = spectra_map[5]
+    assert spectra_map.is_materialized('map  X=2.0 Y=1.0')
+    assert spectrum.y0 == approx(gaussian(x, ampli=110, fwhm=5, x0=42))
+
+    model = make_model(spectrum.y0, [40])
+    spectra.apply_model(model.save(), fnames=spectra.fnames[:4], show_progressbar=False)
+
+    # the spectra created for the fit are released, the others are kept
+    assert not spectra_map.is_materialized('map  X=0.0 Y=0.0')
+    assert spectra_map.is_materialized('map  X=2.0 Y=1.0')
+    assert np.isnan(spectra_map.get_param_map('1', 'x0')[1, 2])
+    assert spectra_map.get_param_map('1', 'x0')[0] == approx([40, 41, 42], abs=1e-3)
+    assert list(spectra.get_results()['m01_x0']) == approx([40, 41, 42, 40], abs=1e-3)
+
+    # pixel by pixel update of the parameters map (released, created and unfitted spectra)
+    inds, values = spectra_map.get_param_values(spectra.fnames[2:5] + ['other'], '1', 'x0')
+    assert list(inds) == [2, 3, 4]
+    assert values[:2] == approx([42, 40], abs=1e-3) and np.isnan(values[2])
+    assert values == approx(spectra_map.get_param_map('1', 'x0').ravel()[inds], nan_ok=True)
+
+    # spectra recreated from the model and the fit results
+    spectrum = spectra_map[2]
+    assert spectrum.result_fit.success
+    assert spectrum.peak_models[0].param_hints['x0']['value'] == approx(42, abs=1e-3)
+    assert spectrum.result_fit.best_fit.max() == approx(100, abs=1e-2)
+
+    # spectra modified within a transient context are kept (not recreated identically)
+    with spectra_map.transient():
+        spectra_map[0].range_min = 10.
+        spectra_map[1].y[:] = 0.
+        spectra_map[3].baseline.mode = 'Linear'
+    assert [spectra_map.is_materialized(fname) for fname in spectra.fnames[:4]] == \
+           [True, False, True, True]
+    assert spectra_map[0].range_min == 10. and spectra_map[3].baseline.mode == 'Linear'
+    assert spectra_map[1].y0.max() == approx(100, abs=1e-2)
+
+
+def test_spectra_map_storage():
+    x = np.linspace(0, 100, 101)
+    rows = [[0, 0, *x]] + [[i, j, *(x * (i + j))] for i in range(2) for j in range(3)]
+    arr0 = np.array(rows, dtype=float)
+    spectra_map = SpectraMap()
+    spectra_map.create_map('map', arr0=arr0)
+
+    # single storage of the intensities, shared by the spectra
+    spectrum = spectra_map[4]
+    assert np.shares_memory(spectra_map.intensity, arr0)
+    assert np.shares_memory(spectrum.y0, spectra_map.intensity)
+    assert spectrum.x0 is spectra_map.x0
+    spectrum.preprocess()
+    assert np.shares_memory(spectrum.x, spectra_map.x0)
+    assert spectrum.y == approx(x * 2)
+
+    assert spectra_map.coords.tolist()[4] == [1, 1]
+    assert np.array_equal(spectra_map.arr0, arr0)
+
+    # export of the rebuilt 'arr0'
+    spectra = Spectra()
+    spectra.spectra_maps.append(spectra_map)
+    dict_spectra = spectra.save(save_data=True)
+    spectra = Spectra.load(dict_spectra=dict_spectra)
+    assert np.array_equal(spectra.spectra_maps[0].arr0, arr0)
+
+
+def test_map_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(map_cache, 'CACHE_DIR', tmp_path / 'cache')
+    x = np.linspace(100, 0, 11)  # unsorted wavelengths
+    fname = tmp_path / 'map.txt'
+    lines = ['\t\t' + '\t'.join(map(str, x))]
+    for i in range(2):
+        for j in range(3):
+            lines.append('\t'.join(map(str, [i, j, *(x * (i + j))])))
+    fname.write_text('\n'.join(lines))
+
+    arr0 = map_cache.load_2d_map(fname)
+    assert isinstance(arr0, np.memmap)
+    assert list(arr0[0, 2:]) == sorted(x)
+    assert len(list((tmp_path / 'cache').glob('*.npy'))) == 1
+
+    spectra_map = SpectraMap()
+    spectra_map.create_map(str(fname))
+    assert isinstance(spectra_map.intensity.base, np.memmap)
+    assert spectra_map[5].y0 == approx(np.sort(x) * 3)
+
+    # cache entry replaced when the file changes
+    fname.write_text('\n'.join(lines[:-1]))
+    spectra_map = SpectraMap()
+    spectra_map.create_map(str(fname))
+    assert len(spectra_map) == 5
+    assert len(list((tmp_path / 'cache').glob('*.npy'))) == 1